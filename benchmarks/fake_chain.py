@@ -0,0 +1,38 @@
+"""
+In-process eth-tester chain with the Minty contract deployed and a funded minting
+account. Needs eth-tester and py-evm (pip install "web3[tester]").
+"""
+from web3 import AsyncWeb3
+from web3.providers.eth_tester import AsyncEthereumTesterProvider
+
+from minty_py.contracts.minty_py_contract import CONTRACT_ABI, CONTRACT_BYTECODE
+
+# a throwaway key, only ever funded on the in-process chain
+MINTER_KEY = "0x" + "11" * 32
+
+
+async def make_chain(token_name: str = "Bench", token_symbol: str = "BNCH"):
+    """Returns (w3, private key of the minting account, deployment info)."""
+    w3 = AsyncWeb3(AsyncEthereumTesterProvider())
+    funder = (await w3.eth.accounts)[0]
+    minter = w3.eth.account.from_key(MINTER_KEY)
+
+    tx_hash = await w3.eth.send_transaction(
+        {"from": funder, "to": minter.address, "value": 10**21}
+    )
+    await w3.eth.wait_for_transaction_receipt(tx_hash)
+
+    contract = w3.eth.contract(abi=CONTRACT_ABI, bytecode=CONTRACT_BYTECODE)
+    tx_hash = await contract.constructor(
+        tokenName=token_name, symbol=token_symbol
+    ).transact({"from": funder})
+    receipt = await w3.eth.wait_for_transaction_receipt(tx_hash)
+
+    deploy_info = {
+        "contract_address": receipt["contractAddress"],
+        "token_name": token_name,
+        "token_symbol": token_symbol,
+        "abi": CONTRACT_ABI,
+        "tx_receipt": {"blockNumber": receipt["blockNumber"]},
+    }
+    return w3, MINTER_KEY, deploy_info
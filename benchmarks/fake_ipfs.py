@@ -0,0 +1,161 @@
+"""
+In-process stand-in for an IPFS node: the parts of the HTTP API minty uses
+(add, cat, pin/add, pin/ls) plus a path gateway under /ipfs/. CIDs are computed
+with minty_py.cid, so they match what minty verifies uploads against.
+latency (seconds) is added to every request to mimic a remote node.
+"""
+import asyncio
+import json
+import os
+import tempfile
+
+from aiohttp import web
+
+from minty_py.car import read_car
+from minty_py.cid import (
+    CODEC_RAW,
+    build_directory,
+    build_file,
+    cid_from_str,
+    cid_to_str,
+    decode_links,
+    split_chunks,
+)
+
+
+class FakeIPFS:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.files = {}  # "<directory cid>/<name>" and "<file cid>" -> content
+        self.blocks = {}  # cid -> block, from dag/import or directories added
+        self.pins = set()
+        self.pin_adds = []  # the CID of every pin/add request, in order
+        self.requests = 0
+        self._runner = None
+
+    @property
+    def api_endpoint(self):
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def gateway_url(self):
+        return f"http://{self.host}:{self.port}/ipfs/"
+
+    async def start(self):
+        app = web.Application(client_max_size=2**31, middlewares=[self._delay])
+        app.router.add_post("/api/v0/add", self.add)
+        app.router.add_post("/api/v0/dag/import", self.dag_import)
+        app.router.add_post("/api/v0/cat", self.cat)
+        app.router.add_post("/api/v0/pin/add", self.pin_add)
+        app.router.add_post("/api/v0/pin/ls", self.pin_ls)
+        app.router.add_get("/ipfs/{path:.*}", self.gateway)
+
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        # port 0 picks a free port, so read back the one that was bound
+        self.port = site._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    @web.middleware
+    async def _delay(self, request, handler):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return await handler(request)
+
+    async def add(self, request):
+        # every file in one request goes in the same wrapping directory
+        cid_version = int(request.query.get("cid-version", 0))
+        files = []
+        async for part in await request.multipart():
+            content = await part.read()
+            node = build_file(split_chunks(content), cid_version)
+            files.append((part.filename, node, content))
+
+        directory = cid_to_str(
+            build_directory(
+                [(name, node) for name, node, _ in files],
+                cid_version,
+                on_block=lambda cid, block: self.blocks.update({cid_to_str(cid): block}),
+            ).cid
+        )
+        entries = []
+        for name, node, content in files:
+            self.files[f"{directory}/{name}"] = content
+            self.files[cid_to_str(node.cid)] = content
+            entries.append({"Name": name, "Hash": cid_to_str(node.cid)})
+        entries.append({"Name": "", "Hash": directory})
+        return web.Response(text="".join(json.dumps(e) + "\n" for e in entries))
+
+    async def dag_import(self, request):
+        fd, path = tempfile.mkstemp(suffix=".car")
+        try:
+            async for part in await request.multipart():
+                with os.fdopen(fd, "wb") as f:
+                    while chunk := await part.read_chunk():
+                        f.write(chunk)
+            root, blocks = read_car(path)
+            for cid, block in blocks:
+                self.blocks[cid_to_str(cid)] = block
+        finally:
+            os.remove(path)
+        root = cid_to_str(root)
+        self.pins.add(root)
+        return web.json_response({"Root": {"Cid": {"/": root}, "PinErrorMsg": ""}})
+
+    async def cat(self, request):
+        content = self._content(request.query["arg"])
+        if content is None:
+            return web.Response(status=500, text="not found")
+        return web.Response(body=content)
+
+    async def pin_add(self, request):
+        self.pin_adds.append(request.query["arg"])
+        self.pins.add(request.query["arg"])
+        return web.json_response({"Pins": [request.query["arg"]]})
+
+    async def pin_ls(self, request):
+        return web.json_response(
+            {"Keys": {cid: {"Type": "recursive"} for cid in self.pins}}
+        )
+
+    async def gateway(self, request):
+        if request.query.get("format") == "raw":
+            block = self.blocks.get(request.match_info["path"])
+            if block is None:
+                return web.Response(status=404)
+            return web.Response(body=block)
+
+        content = self._content(request.match_info["path"])
+        if content is None:
+            return web.Response(status=404)
+        if "Range" in request.headers:
+            return web.Response(status=206, body=content[request.http_range])
+        return web.Response(body=content)
+
+    def _content(self, path):
+        if path in self.files:
+            return self.files[path]
+        # otherwise walk the imported blocks, as a real node would
+        cid, *names = path.split("/")
+        try:
+            for name in names:
+                cid = dict(decode_links(self.blocks[cid]))[name]
+            return self._file_content(cid)
+        except KeyError:
+            return None
+
+    def _file_content(self, cid):
+        block = self.blocks[cid]
+        if cid_from_str(cid)[1] == CODEC_RAW:
+            return block
+        return b"".join(self._file_content(child) for _, child in decode_links(block))
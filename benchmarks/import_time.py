@@ -0,0 +1,58 @@
+"""
+Startup budget for the CLI. Imports minty_py.index under `python -X importtime`
+and fails if that takes longer than the budget or pulls in one of the heavy
+dependencies that only some commands need.
+
+Run from the repository root:
+    python benchmarks/import_time.py
+"""
+import subprocess
+import sys
+
+BUDGET_MS = 150
+HEAVY_MODULES = (
+    "aiohttp",
+    "minty_py.contracts.minty_py_contract",
+    "requests",
+    "web3",
+)
+
+
+def measure(module="minty_py.index"):
+    """Returns ({imported module: cumulative microseconds}, total microseconds)."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    imported = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        imported[name.strip()] = int(cumulative)
+    return imported, imported[module]
+
+
+def main():
+    imported, total_us = measure()
+    failures = []
+
+    if total_us > BUDGET_MS * 1000:
+        failures.append(
+            f"importing minty_py.index took {total_us / 1000:.1f}ms, "
+            f"the budget is {BUDGET_MS}ms"
+        )
+    for module in HEAVY_MODULES:
+        if module in imported:
+            failures.append(f"importing minty_py.index imported {module}")
+
+    print(f"minty_py.index imported in {total_us / 1000:.1f}ms")
+    for failure in failures:
+        print("FAIL:", failure)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+"""
+Throughput and latency of the mint, batch mint, show and pin paths, run against an
+in-process eth-tester chain (fake_chain.py) and a local fake IPFS node
+(fake_ipfs.py), plus the CLI startup time from import_time.py.
+
+Results are written as JSON and compared with a stored baseline. A scenario whose
+throughput drops, or whose p95 latency grows, by more than the tolerance fails the
+run. Baselines are machine specific, and only compared when they were taken with
+the same settings. Refresh one with --save-baseline.
+
+Run from the repository root:
+    python benchmarks/run.py
+    python benchmarks/run.py --count 200 --sizes uniform:1024-4194304 -c 1,16,64
+"""
+import asyncio
+import itertools
+import json
+import math
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+
+import click
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import import_time  # noqa: E402
+from fake_chain import make_chain  # noqa: E402
+from fake_ipfs import FakeIPFS  # noqa: E402
+
+from minty_py.ipfs_client import IPFSClient  # noqa: E402
+from minty_py.metrics import METRICS  # noqa: E402
+from minty_py.minty import Minty  # noqa: E402
+from minty_py.minty_types import NFTOptions  # noqa: E402
+from minty_py.pinning import pin_tokens  # noqa: E402
+
+DEFAULT_BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+
+@click.command()
+@click.option("-n", "--count", default=40, show_default=True, help="Assets per batch")
+@click.option(
+    "--single",
+    default=5,
+    show_default=True,
+    help="How many NFTs to mint one at a time",
+)
+@click.option(
+    "-s",
+    "--sizes",
+    default="lognormal:65536,1.0",
+    show_default=True,
+    help="Asset size distribution: fixed:N, uniform:MIN-MAX or lognormal:MEDIAN,SIGMA",
+)
+@click.option(
+    "-c",
+    "--concurrency",
+    default="1,8,32",
+    show_default=True,
+    help="Comma separated upload concurrency levels for batch mints",
+)
+@click.option(
+    "--repeat", default=3, show_default=True, help="Runs of the bulk show"
+)
+@click.option(
+    "--ipfs-latency",
+    default=0.0,
+    show_default=True,
+    help="Seconds the fake IPFS node waits before answering each request",
+)
+@click.option("--seed", default=0, show_default=True, help="Seed for asset content")
+@click.option("-o", "--output", default=None, help="Write the results to this file")
+@click.option(
+    "-b",
+    "--baseline",
+    default=DEFAULT_BASELINE_PATH,
+    show_default=True,
+    help="Baseline to compare against",
+)
+@click.option(
+    "--save-baseline", is_flag=True, help="Store these results as the baseline"
+)
+@click.option(
+    "-t",
+    "--tolerance",
+    default=0.3,
+    show_default=True,
+    help="Allowed regression as a fraction of the baseline",
+)
+def main(
+    count,
+    single,
+    sizes,
+    concurrency,
+    repeat,
+    ipfs_latency,
+    seed,
+    output,
+    baseline,
+    save_baseline,
+    tolerance,
+):
+    settings = {
+        "count": count,
+        "single": single,
+        "sizes": sizes,
+        "concurrency": [int(c) for c in concurrency.split(",")],
+        "repeat": repeat,
+        "ipfs_latency": ipfs_latency,
+        "seed": seed,
+    }
+    results = {
+        "settings": settings,
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "scenarios": asyncio.run(run_suite(settings)),
+    }
+    print_results(results["scenarios"])
+
+    if output:
+        write_json(output, results)
+    if save_baseline:
+        write_json(baseline, results)
+        print(f"Saved the baseline to {baseline}")
+        return
+
+    failures = compare(results, baseline, tolerance)
+    for failure in failures:
+        print("FAIL:", failure)
+    sys.exit(1 if failures else 0)
+
+
+async def run_suite(settings):
+    scenarios = {"cli_import": bench_import()}
+
+    ipfs_node = await FakeIPFS(latency=settings["ipfs_latency"]).start()
+    w3, private_key, deploy_info = await make_chain()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        rng = random.Random(settings["seed"])
+        size_of = parse_sizes(settings["sizes"])
+        asset_numbers = itertools.count()
+
+        def make_minty():
+            return Minty(
+                w3=w3,
+                ipfs=IPFSClient("", "", ipfs_node.api_endpoint),
+                deploy_info=deploy_info,
+                private_key=private_key,
+                use_cache=False,
+                index_path=os.path.join(work_dir, f"index-{time.time_ns()}.sqlite"),
+                gateway_urls=[ipfs_node.gateway_url],
+            )
+
+        def make_options(n):
+            options = []
+            for _ in range(n):
+                path = os.path.join(work_dir, f"asset-{next(asset_numbers)}.bin")
+                with open(path, "wb") as f:
+                    f.write(rng.randbytes(size_of(rng)))
+                options.append(
+                    NFTOptions(
+                        name="Bench",
+                        description="benchmark asset",
+                        owner=None,
+                        image_path=path,
+                    )
+                )
+            return options
+
+        minty = await make_minty()
+        scenarios["single_mint"] = await bench(
+            minty.create_nft_from_asset_file, make_options(settings["single"])
+        )
+        await minty.close()
+
+        token_ids = []
+        for concurrency in settings["concurrency"]:
+            minty = await make_minty()
+            options = make_options(settings["count"])
+            result = await bench_batch(minty.create_nfts, options, concurrency)
+            token_ids += result.pop("tokenIds")
+            scenarios[f"batch_mint_c{concurrency}"] = result
+            await minty.close()
+
+        # a fresh Minty each run, so nothing is served from its caches
+        latencies = []
+        for _ in range(settings["repeat"]):
+            minty = await make_minty()
+            METRICS.reset()
+            started_at = time.perf_counter()
+            await minty.get_nfts(token_ids)
+            latencies.append(time.perf_counter() - started_at)
+            await minty.close()
+        scenarios["bulk_show"] = summarize(len(token_ids) * len(latencies), latencies)
+
+        ipfs_node.pins.clear()
+        minty = await make_minty()
+        METRICS.reset()
+        started_at = time.perf_counter()
+        await pin_tokens(minty, token_ids, [minty.ipfs])
+        elapsed = time.perf_counter() - started_at
+        scenarios["pin"] = summarize(len(token_ids), [elapsed])
+        await minty.close()
+
+    await ipfs_node.stop()
+    return scenarios
+
+
+def bench_import():
+    _, total_us = import_time.measure()
+    return summarize(1, [total_us / 1e6])
+
+
+async def bench(fn, options_list):
+    """Runs fn on each of options_list one at a time, timing each call."""
+    METRICS.reset()
+    latencies = []
+    for options in options_list:
+        started_at = time.perf_counter()
+        await fn(options)
+        latencies.append(time.perf_counter() - started_at)
+    return summarize(len(latencies), latencies)
+
+
+async def bench_batch(create_nfts, options_list, concurrency):
+    METRICS.reset()
+    started_at = time.perf_counter()
+    nfts = await create_nfts(options_list, concurrency=concurrency)
+    elapsed = time.perf_counter() - started_at
+    # one batch has no per-token latency, so only throughput is compared
+    result = summarize(len(nfts), [elapsed])
+    result["latency"] = None
+    result["tokenIds"] = [nft["tokenId"] for nft in nfts]
+    return result
+
+
+def summarize(ops, latencies):
+    latencies = sorted(latencies)
+    total = sum(latencies)
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))]
+
+    return {
+        "ops": ops,
+        "seconds": total,
+        "throughput": ops / total if total else None,
+        "latency": {
+            "p50": percentile(0.5),
+            "p95": percentile(0.95),
+            "p99": percentile(0.99),
+            "max": latencies[-1],
+        },
+        "stages": {
+            stage: {"count": timing["count"], "total": timing["total"]}
+            for stage, timing in METRICS.summary().items()
+        },
+    }
+
+
+def compare(results, baseline_path, tolerance):
+    """Returns a description of every regression against the baseline."""
+    if not os.path.exists(baseline_path):
+        print(f"No baseline at {baseline_path}, run with --save-baseline to store one")
+        return []
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    if baseline["settings"] != results["settings"]:
+        print(f"{baseline_path} was taken with other settings, not comparing")
+        return []
+
+    failures = []
+    for name, result in results["scenarios"].items():
+        base = baseline["scenarios"].get(name)
+        if base is None:
+            continue
+        if base["throughput"] and result["throughput"] < base["throughput"] * (
+            1 - tolerance
+        ):
+            failures.append(
+                f"{name} throughput {result['throughput']:.2f}/s is below the "
+                f"baseline {base['throughput']:.2f}/s"
+            )
+        if base["latency"] and result["latency"]:
+            p95, base_p95 = result["latency"]["p95"], base["latency"]["p95"]
+            if p95 > base_p95 * (1 + tolerance):
+                failures.append(
+                    f"{name} p95 latency {p95 * 1000:.1f}ms is above the baseline "
+                    f"{base_p95 * 1000:.1f}ms"
+                )
+    return failures
+
+
+def parse_sizes(spec):
+    """Returns a function drawing an asset size in bytes from a random.Random."""
+    kind, _, args = spec.partition(":")
+    if kind == "fixed":
+        size = int(args)
+        return lambda rng: size
+    if kind == "uniform":
+        low, high = (int(arg) for arg in args.split("-"))
+        return lambda rng: rng.randint(low, high)
+    if kind == "lognormal":
+        median, sigma = args.split(",")
+        mu = math.log(float(median))
+        return lambda rng: max(1, int(rng.lognormvariate(mu, float(sigma))))
+    raise ValueError(f"Unknown size distribution: {spec}")
+
+
+def print_results(scenarios):
+    print(f"{'scenario':<20}{'ops':>6}{'ops/s':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for name, result in scenarios.items():
+        latency = result["latency"] or {}
+        p50 = f"{latency['p50'] * 1000:.1f}" if latency else "-"
+        p95 = f"{latency['p95'] * 1000:.1f}" if latency else "-"
+        print(
+            f"{name:<20}{result['ops']:>6}{result['throughput']:>10.2f}"
+            f"{p50:>10}{p95:>10}"
+        )
+
+
+def write_json(path, results):
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,2 +1,14 @@
-from minty_py.deploy import deploy_contract, load_deployment_info
-from minty_py.minty import Minty, make_minty
+# web3 and aiohttp take most of a second to import, so the public names are loaded
+# on first use rather than whenever anything in the package is imported
+
+
+def __getattr__(name):
+    if name in ("deploy_contract", "load_deployment_info"):
+        from minty_py import deploy
+
+        return getattr(deploy, name)
+    if name in ("Minty", "make_minty"):
+        from minty_py import minty
+
+        return getattr(minty, name)
+    raise AttributeError(f"module 'minty_py' has no attribute '{name}'")
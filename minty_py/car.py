@@ -0,0 +1,153 @@
+"""
+Writes (and reads back) CARv1 files, the format `ipfs dag import` takes: a
+dag-cbor header naming the root CID, followed by every block as
+varint(length) + CID + data.
+"""
+from minty_py.cid import (
+    CODEC_DAG_PB,
+    DagNode,
+    _varint,
+    build_directory,
+    build_file,
+    cid_to_str,
+    read_chunks,
+    split_chunks,
+)
+
+# kubo rejects blocks over 1MiB on import, and a directory is a single block, as
+# directories aren't HAMT sharded the way kubo shards large ones; with names like
+# 12345.json that's about 18,000 entries
+MAX_BLOCK_SIZE = 1024 * 1024
+
+# the root isn't known until the last block is written, so the header is written
+# with a placeholder CID of the same length and patched in place at the end
+PLACEHOLDER_ROOT = bytes([1, CODEC_DAG_PB, 0x12, 32]) + bytes(32)
+
+
+class CARWriter:
+    """
+    Streams blocks into a CARv1 file at path as they are built, so a collection
+    never has to fit in memory. Blocks that were already written are skipped.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.blocks = 0
+        self._written = set()
+        self._file = open(path, "wb")
+        self._file.write(_encode_header(PLACEHOLDER_ROOT))
+
+    def add_block(self, cid: bytes, block: bytes):
+        if cid in self._written:
+            return
+        if len(block) > MAX_BLOCK_SIZE:
+            raise ValueError(
+                f"Block {cid_to_str(cid)} is {len(block)} bytes, over the "
+                f"{MAX_BLOCK_SIZE} byte limit. Split the collection into smaller ones"
+            )
+        self._written.add(cid)
+        self._file.write(_varint(len(cid) + len(block)) + cid + block)
+        self.blocks += 1
+
+    def add_file(self, local_path) -> DagNode:
+        with open(local_path, "rb") as f:
+            return build_file(read_chunks(f), on_block=self.add_block)
+
+    def add_bytes(self, content: bytes) -> DagNode:
+        return build_file(split_chunks(content), on_block=self.add_block)
+
+    def add_directory(self, entries) -> DagNode:
+        """Adds a directory of (name, DagNode) pairs already in the CAR."""
+        return build_directory(entries, on_block=self.add_block)
+
+    def check_directory(self, names):
+        """
+        Raises if a directory of files named names would likely be too large a
+        block, so it fails before the files are packed rather than after.
+        """
+        size = sum(_link_size(name) for name in names)
+        if size > MAX_BLOCK_SIZE:
+            raise ValueError(
+                f"A directory of {len(names)} files would be about {size} bytes, "
+                f"over the {MAX_BLOCK_SIZE} byte block limit, as directories aren't "
+                "sharded. Split the collection into smaller ones"
+            )
+
+    def close(self, root: bytes = None):
+        """
+        Writes the real root into the header and closes the file. Without a root
+        the file is just closed, e.g. when packing failed part way.
+        """
+        try:
+            if root is not None:
+                if len(root) != len(PLACEHOLDER_ROOT):
+                    raise ValueError("The root must be a sha2-256 dag-pb CIDv1")
+                self._file.seek(0)
+                self._file.write(_encode_header(root))
+        finally:
+            self._file.close()
+
+
+def read_car(path):
+    """
+    Returns (root CID, iterator over (CID, block)) for the CARv1 at path. The file
+    is only open while the iterator is being read.
+    """
+    with open(path, "rb") as f:
+        header = f.read(_read_varint(f))
+        blocks_start = f.tell()
+    # the root is the only tagged (CID) value in the header
+    start = header.index(b"\xd8\x2a") + 2
+    length = header[start + 1]  # 0x58 <length> 0x00 <cid>
+    root = header[start + 3 : start + 2 + length]
+
+    def blocks():
+        with open(path, "rb") as f:
+            f.seek(blocks_start)
+            while True:
+                try:
+                    length = _read_varint(f)
+                except EOFError:
+                    return
+                data = f.read(length)
+                cid_length = 2 if data[0] == 0x12 else 4  # CIDv0 or CIDv1 prefix
+                cid_length += data[cid_length - 1]
+                yield data[:cid_length], data[cid_length:]
+
+    return root, blocks()
+
+
+# --- helpers --- #
+
+
+def _link_size(name):
+    # a dag-pb link to a CIDv1, with a Tsize of up to 1TiB, as encoded in the block
+    link = 2 + 36 + 2 + len(name.encode()) + 1 + 6
+    return len(_varint(link)) + 1 + link
+
+
+def _encode_header(root: bytes):
+    # dag-cbor {"roots": [root], "version": 1}, keys in canonical order; a CID is
+    # tag 42 around its bytes with a leading 0x00 (the identity multibase)
+    cid = b"\x00" + root
+    header = (
+        b"\xa2"
+        + b"\x65roots"
+        + b"\x81\xd8\x2a\x58"
+        + bytes([len(cid)])
+        + cid
+        + b"\x67version\x01"
+    )
+    return _varint(len(header)) + header
+
+
+def _read_varint(f):
+    value = shift = 0
+    while True:
+        byte = f.read(1)
+        if not byte:
+            raise EOFError
+        value |= (byte[0] & 0x7F) << shift
+        if byte[0] < 0x80:
+            return value
+        shift += 7
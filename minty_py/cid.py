@@ -0,0 +1,302 @@
+"""
+Computes IPFS CIDs locally, laid out the same way `ipfs add` does by default:
+fixed size 256KiB chunks in a balanced dag-pb DAG with at most 174 links per node.
+CIDv1 uses raw leaves, as `ipfs add --cid-version=1` does.
+"""
+import hashlib
+from collections import namedtuple
+
+DEFAULT_CHUNK_SIZE = 262144
+MAX_LINKS = 174
+
+CODEC_RAW = 0x55
+CODEC_DAG_PB = 0x70
+SHA2_256 = 0x12
+
+UNIXFS_RAW = 0
+UNIXFS_DIRECTORY = 1
+UNIXFS_FILE = 2
+
+BASE32_ALPHABET = "abcdefghijklmnopqrstuvwxyz234567"
+BASE58_ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+
+# cid - binary CID of the node
+# size - cumulative size of the node and everything below it, as used in link Tsize
+# file_size - number of content bytes below the node
+DagNode = namedtuple("DagNode", ["cid", "size", "file_size"])
+
+
+def file_cid(content: bytes, cid_version: int = 1, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Returns the CID string `ipfs add` gives content."""
+    return cid_to_str(build_file(split_chunks(content, chunk_size), cid_version).cid)
+
+
+def wrapped_file_cid(name: str, content: bytes, cid_version: int = 1):
+    """
+    Returns the CID string `ipfs add --wrap-with-directory` gives content saved as name.
+    """
+    node = build_file(split_chunks(content), cid_version)
+    return cid_to_str(build_directory([(name, node)], cid_version).cid)
+
+
+def wrapped_file_cid_from_path(name: str, local_path: str, cid_version: int = 1):
+    """Like wrapped_file_cid, but reads the content from local_path in chunks."""
+    with open(local_path, "rb") as f:
+        node = build_file(read_chunks(f), cid_version)
+    return cid_to_str(build_directory([(name, node)], cid_version).cid)
+
+
+def split_chunks(content: bytes, chunk_size=DEFAULT_CHUNK_SIZE):
+    return (content[i : i + chunk_size] for i in range(0, len(content), chunk_size))
+
+
+def read_chunks(f, chunk_size=DEFAULT_CHUNK_SIZE):
+    return iter(lambda: f.read(chunk_size), b"")
+
+
+def build_file(chunks, cid_version: int = 1, on_block=None):
+    """
+    Builds the UnixFS file DAG for an iterable of content chunks and returns its root
+    DagNode. on_block(cid, block) is called for every block as it is made, children
+    before their parents.
+    """
+    on_block = on_block or _ignore_block
+
+    nodes = []
+    for chunk in chunks:
+        nodes.append(_build_leaf(chunk, cid_version, on_block))
+    if not nodes:
+        nodes.append(_build_leaf(b"", cid_version, on_block))
+
+    # a balanced layout fills each subtree completely before starting the next,
+    # which is the same as grouping every level into runs of MAX_LINKS
+    while len(nodes) > 1:
+        nodes = [
+            _build_file_node(nodes[i : i + MAX_LINKS], cid_version, on_block)
+            for i in range(0, len(nodes), MAX_LINKS)
+        ]
+    return nodes[0]
+
+
+def build_directory(entries, cid_version: int = 1, on_block=None):
+    """
+    Builds a UnixFS directory from (name, DagNode) pairs and returns its DagNode.
+    """
+    on_block = on_block or _ignore_block
+
+    entries = sorted(entries, key=lambda entry: entry[0].encode())
+    links = [(node.cid, name, node.size) for name, node in entries]
+    block = _encode_pb_node(links, _encode_unixfs(UNIXFS_DIRECTORY))
+    cid = _make_cid(block, CODEC_DAG_PB, cid_version)
+    on_block(cid, block)
+    return DagNode(cid, len(block) + sum(node.size for _, node in entries), 0)
+
+
+def directory_links(cid: str, block: bytes):
+    """
+    Returns {name: CID string} for the links in a dag-pb directory block, after
+    checking the block hashes to cid.
+    """
+    cid_version = 0 if cid.startswith("Qm") else 1
+    if _make_cid(block, CODEC_DAG_PB, cid_version) != cid_from_str(cid):
+        raise ValueError(f"Block does not hash to {cid}")
+    return dict(decode_links(block))
+
+
+def file_block(cid: str, block: bytes):
+    """
+    Returns (data, child CID strings) for a block of a UnixFS file, however it was
+    chunked, after checking the block hashes to cid. The file's content is the data
+    followed by each child's content in order.
+    """
+    binary = cid_from_str(cid)
+    if binary[0] == SHA2_256:
+        # CIDv0 is always dag-pb
+        cid_version, codec = 0, CODEC_DAG_PB
+    else:
+        cid_version, position = _read_varint(binary, 0)
+        codec, _ = _read_varint(binary, position)
+    if _make_cid(block, codec, cid_version) != binary:
+        raise ValueError(f"Block does not hash to {cid}")
+    if codec == CODEC_RAW:
+        return block, []
+    if codec != CODEC_DAG_PB:
+        raise ValueError(f"{cid} is not a UnixFS block")
+
+    data = b""
+    for number, value in _decode_pb_fields(block):
+        if number == 1:
+            unixfs = dict(_decode_pb_fields(value))
+            if unixfs.get(1) not in (UNIXFS_RAW, UNIXFS_FILE):
+                raise ValueError(f"{cid} is not a UnixFS file")
+            data = unixfs.get(2, b"")
+    return data, [link_cid for _, link_cid in decode_links(block)]
+
+
+def decode_links(block: bytes):
+    """Returns the (name, CID string) links of a dag-pb block, in order."""
+    links = []
+    for number, link in _decode_pb_fields(block):
+        if number == 2:
+            fields = dict(_decode_pb_fields(link))
+            links.append((fields.get(2, b"").decode(), cid_to_str(fields[1])))
+    return links
+
+
+def cid_to_str(cid: bytes):
+    if cid[0] == SHA2_256:
+        return _base58_encode(cid)
+    return "b" + _base32_encode(cid)
+
+
+def cid_from_str(cid: str):
+    if cid.startswith("Qm"):
+        return _base58_decode(cid)
+    if cid.startswith("b"):
+        return _base32_decode(cid[1:])
+    raise ValueError(f"Unsupported CID encoding: {cid}")
+
+
+# --- blocks --- #
+
+
+def _ignore_block(cid, block):
+    pass
+
+
+def _build_leaf(chunk, cid_version, on_block):
+    if cid_version == 1:
+        block = chunk
+        cid = _make_cid(block, CODEC_RAW, cid_version)
+    else:
+        block = _encode_pb_node([], _encode_unixfs(UNIXFS_FILE, chunk, len(chunk)))
+        cid = _make_cid(block, CODEC_DAG_PB, cid_version)
+    on_block(cid, block)
+    return DagNode(cid, len(block), len(chunk))
+
+
+def _build_file_node(children, cid_version, on_block):
+    file_size = sum(child.file_size for child in children)
+    data = _encode_unixfs(
+        UNIXFS_FILE,
+        filesize=file_size,
+        blocksizes=[child.file_size for child in children],
+    )
+    block = _encode_pb_node([(child.cid, "", child.size) for child in children], data)
+    cid = _make_cid(block, CODEC_DAG_PB, cid_version)
+    on_block(cid, block)
+    return DagNode(cid, len(block) + sum(child.size for child in children), file_size)
+
+
+def _make_cid(block, codec, cid_version):
+    multihash = bytes([SHA2_256, 32]) + hashlib.sha256(block).digest()
+    if cid_version == 0:
+        return multihash
+    return _varint(1) + _varint(codec) + multihash
+
+
+# --- protobuf --- #
+
+
+def _encode_unixfs(data_type, data=b"", filesize=None, blocksizes=()):
+    out = _pb_varint_field(1, data_type)
+    if data:
+        out += _pb_bytes_field(2, data)
+    if filesize is not None:
+        out += _pb_varint_field(3, filesize)
+    for blocksize in blocksizes:
+        out += _pb_varint_field(4, blocksize)
+    return out
+
+
+def _encode_pb_node(links, data):
+    # dag-pb puts the links before the data, whatever the field numbers say
+    out = b""
+    for cid, name, tsize in links:
+        link = (
+            _pb_bytes_field(1, cid)
+            + _pb_bytes_field(2, name.encode())
+            + _pb_varint_field(3, tsize)
+        )
+        out += _pb_bytes_field(2, link)
+    return out + _pb_bytes_field(1, data)
+
+
+def _pb_varint_field(number, value):
+    return _varint(number << 3) + _varint(value)
+
+
+def _pb_bytes_field(number, value):
+    return _varint(number << 3 | 2) + _varint(len(value)) + value
+
+
+def _decode_pb_fields(data):
+    """Yields (field number, value) for each varint or length delimited field."""
+    position = 0
+    while position < len(data):
+        key, position = _read_varint(data, position)
+        value, position = _read_varint(data, position)
+        if key & 7 == 2:
+            value, position = data[position : position + value], position + value
+        yield key >> 3, value
+
+
+def _read_varint(data, position):
+    value = shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, position
+        shift += 7
+
+
+def _varint(value):
+    out = bytearray()
+    while value > 0x7F:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+# --- multibase --- #
+
+
+def _base32_encode(data):
+    bits = int.from_bytes(data, "big")
+    bit_count = len(data) * 8
+    padding = -bit_count % 5
+    bits <<= padding
+    return "".join(
+        BASE32_ALPHABET[(bits >> shift) & 31]
+        for shift in range(bit_count + padding - 5, -1, -5)
+    )
+
+
+def _base32_decode(text):
+    bits = 0
+    for char in text:
+        bits = bits << 5 | BASE32_ALPHABET.index(char)
+    extra = len(text) * 5 % 8
+    return (bits >> extra).to_bytes(len(text) * 5 // 8, "big")
+
+
+def _base58_encode(data):
+    number = int.from_bytes(data, "big")
+    out = ""
+    while number:
+        number, remainder = divmod(number, 58)
+        out = BASE58_ALPHABET[remainder] + out
+    leading_zeros = len(data) - len(data.lstrip(b"\0"))
+    return BASE58_ALPHABET[0] * leading_zeros + out
+
+
+def _base58_decode(text):
+    number = 0
+    for char in text:
+        number = number * 58 + BASE58_ALPHABET.index(char)
+    leading_zeros = len(text) - len(text.lstrip(BASE58_ALPHABET[0]))
+    data = number.to_bytes((number.bit_length() + 7) // 8, "big")
+    return b"\0" * leading_zeros + data
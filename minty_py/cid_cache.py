@@ -0,0 +1,142 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_PATH = os.path.join(
+    os.path.expanduser("~"), ".cache", "minty_py", "cids.sqlite"
+)
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# bumped whenever the tables change; older caches are dropped and rebuilt
+SCHEMA_VERSION = 2
+
+
+class CIDCache:
+    """
+    Persistent map from content hash to the CID IPFS returned when that content was
+    added, so unchanged assets don't have to be uploaded again. CIDs are kept per
+    IPFS API endpoint, since content added to one node isn't on any other.
+
+    Files are hashed once per (path, size, mtime); after that their digest is read
+    back from the cache. Once more than max_entries CIDs, or files, are stored the
+    least recently used ones are evicted.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_entries: int = 100_000):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        (version,) = self._db.execute("PRAGMA user_version").fetchone()
+        if version != SCHEMA_VERSION:
+            # it's only a cache, so an old layout is simply started over
+            self._db.executescript(
+                f"""
+                DROP TABLE IF EXISTS files;
+                DROP TABLE IF EXISTS cids;
+                PRAGMA user_version = {SCHEMA_VERSION};
+                """
+            )
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                digest TEXT NOT NULL,
+                last_used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS files_last_used ON files (last_used);
+            CREATE TABLE IF NOT EXISTS cids (
+                endpoint TEXT NOT NULL,
+                digest TEXT NOT NULL,
+                name TEXT NOT NULL,
+                cid TEXT NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (endpoint, digest, name)
+            );
+            CREATE INDEX IF NOT EXISTS cids_last_used ON cids (last_used);
+            """
+        )
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def file_digest(self, local_path):
+        """
+        Returns the sha256 hex digest of local_path, only reading the file if its
+        size or mtime changed since it was last hashed.
+        """
+        local_path = os.path.abspath(local_path)
+        stat = os.stat(local_path)
+
+        with self._lock, self._db:
+            row = self._db.execute(
+                "SELECT size, mtime_ns, digest FROM files WHERE path = ?",
+                (local_path,),
+            ).fetchone()
+            if row and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+                self._db.execute(
+                    "UPDATE files SET last_used = ? WHERE path = ?",
+                    (time.time(), local_path),
+                )
+                return row[2]
+
+        sha256 = hashlib.sha256()
+        with open(local_path, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                sha256.update(chunk)
+        digest = sha256.hexdigest()
+
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)",
+                (local_path, stat.st_size, stat.st_mtime_ns, digest, time.time()),
+            )
+            self._evict("files")
+        return digest
+
+    def get(self, endpoint, digest, name):
+        """Returns the CID content with digest was given as name on endpoint."""
+        key = (endpoint, digest, name)
+        with self._lock, self._db:
+            row = self._db.execute(
+                "SELECT cid FROM cids WHERE endpoint = ? AND digest = ? AND name = ?",
+                key,
+            ).fetchone()
+            if row:
+                self._db.execute(
+                    "UPDATE cids SET last_used = ? "
+                    "WHERE endpoint = ? AND digest = ? AND name = ?",
+                    (time.time(), *key),
+                )
+        return row[0] if row else None
+
+    def put(self, endpoint, digest, name, cid):
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO cids VALUES (?, ?, ?, ?, ?)",
+                (endpoint, digest, name, cid, time.time()),
+            )
+            self._evict("cids")
+
+    # --- helpers --- #
+
+    def _evict(self, table):
+        # called with the lock held, inside a transaction
+        (count,) = self._db.execute(f"SELECT COUNT(*) FROM {table}").fetchone()
+        if count > self.max_entries:
+            self._db.execute(
+                f"""
+                DELETE FROM {table} WHERE rowid IN (
+                    SELECT rowid FROM {table} ORDER BY last_used LIMIT ?
+                )
+                """,
+                (count - self.max_entries,),
+            )
@@ -0,0 +1,62 @@
+import json
+import os
+
+DEFAULT_SOCKET_PATH = os.path.join(
+    os.path.expanduser("~"), ".cache", "minty_py", "minty.sock"
+)
+
+# a mint can take as long as the chain does to confirm it, so only connecting to
+# the daemon is timed out
+CONNECT_TIMEOUT = 10
+
+
+async def call_daemon(
+    method, path, body=None, socket_path: str = DEFAULT_SOCKET_PATH
+):
+    """
+    Sends a request to a running `minty serve` and returns the decoded response,
+    or None if no daemon is listening on socket_path.
+    """
+    if not os.path.exists(socket_path):
+        return None
+
+    # only paid for when there is a daemon to talk to
+    import asyncio
+
+    import aiohttp
+
+    connector = aiohttp.UnixConnector(path=socket_path)
+    timeout = aiohttp.ClientTimeout(total=None, connect=CONNECT_TIMEOUT)
+    try:
+        async with aiohttp.ClientSession(
+            connector=connector, timeout=timeout
+        ) as session:
+            async with session.request(
+                method, "http://minty" + path, json=body
+            ) as response:
+                content = await response.read()
+    except (aiohttp.ClientConnectorError, FileNotFoundError, ConnectionRefusedError):
+        # a socket left behind by a daemon that is no longer running
+        return None
+    except asyncio.TimeoutError as e:
+        raise Exception(
+            f"The Minty daemon on {socket_path} didn't accept the connection"
+        ) from e
+    except aiohttp.ClientError as e:
+        # the request reached the daemon, which may have acted on it, so it isn't
+        # safe to do it again locally
+        raise Exception(f"Lost the connection to the Minty daemon: {e}") from e
+
+    try:
+        result = json.loads(content)
+    except ValueError:
+        result = None
+    if response.status != 200:
+        error = result.get("error") if isinstance(result, dict) else None
+        if error is None:
+            text = content.decode(errors="replace")
+            error = f"Minty daemon returned HTTP {response.status}: {text}"
+        raise Exception(error)
+    if result is None:
+        raise Exception(f"Minty daemon returned a response that isn't JSON: {content}")
+    return result
@@ -1,12 +1,22 @@
 import asyncio
+import hashlib
 import importlib
 import json
 import os.path
+import pickle
 
-from web3 import AsyncHTTPProvider, AsyncWeb3
+from web3 import AsyncWeb3
 from web3.types import HexBytes
 
-from minty_py.config.local_info import INFURA_SEPOLIA_URL, SECRET_KEY
+from minty_py.config.local_info import SECRET_KEY
+from minty_py.metrics import METRICS, instrument_web3
+from minty_py.rpc_provider import RPC_URLS, MultiEndpointProvider
+from minty_py.tx_manager import TransactionManager
+
+DEFAULT_DEPLOYMENT_PATH = "minty_py/contracts/minty_py_deployment.json"
+DEPLOYMENT_CACHE_DIR = os.path.join(
+    os.path.expanduser("~"), ".cache", "minty_py", "deployments"
+)
 
 
 async def deploy_contract(
@@ -26,96 +36,91 @@ async def deploy_contract(
     abi = contract_info.CONTRACT_ABI
     bytecode = contract_info.CONTRACT_BYTECODE
 
-    w3 = AsyncWeb3(AsyncHTTPProvider(INFURA_SEPOLIA_URL))
-
-    is_connected = await w3.is_connected()
-
-    if is_connected:
-        print("connected to provider")
-        account = w3.eth.account.from_key(SECRET_KEY)
-        account_address = account.address
-
-        contract = w3.eth.contract(abi=abi, bytecode=bytecode)
-
-        # construct the deploy transaction
-        nonce = await w3.eth.get_transaction_count(account_address)
-        deploy_txn = await contract.constructor(
-            tokenName=token_name, symbol=token_symbol
-        ).build_transaction(
-            {
-                "from": account_address,
-                "nonce": nonce,
+    provider = MultiEndpointProvider(RPC_URLS)
+    w3 = AsyncWeb3(provider)
+    instrument_web3(w3)
+    try:
+        is_connected = await w3.is_connected()
+
+        if is_connected:
+            print("connected to provider")
+            account = w3.eth.account.from_key(SECRET_KEY)
+
+            contract = w3.eth.contract(abi=abi, bytecode=bytecode)
+
+            # send the deploy transaction and wait for receipt
+            print("sending transaction")
+            tx_manager = TransactionManager(w3, account)
+            try:
+                with METRICS.span("deploy"):
+                    tx_receipt = await tx_manager.transact(
+                        contract.constructor(tokenName=token_name, symbol=token_symbol)
+                    )
+            finally:
+                await tx_manager.close()
+            print("transaction completed")
+
+            # parse receipt
+            dict_receipt = dict(tx_receipt)
+            for key in dict_receipt.keys():
+                if isinstance(dict_receipt[key], HexBytes):
+                    dict_receipt[key] = dict_receipt[key].hex()
+
+            deployment_info = {
+                "chain_id": await w3.eth.chain_id,
+                "contract_address": dict_receipt["contractAddress"],
+                "token_name": token_name,
+                "token_symbol": token_symbol,
+                "abi": abi,
+                "tx_receipt": dict_receipt,
             }
-        )
-
-        # sign the deploy transaction
-        signed_txn = w3.eth.account.sign_transaction(deploy_txn, SECRET_KEY)
-
-        # send signed transaction and wait for receipt
-        print("sending transaction")
-        tx_hash = await w3.eth.send_raw_transaction(signed_txn.rawTransaction)
-        tx_receipt = await w3.eth.wait_for_transaction_receipt(tx_hash)
-        print("transaction completed")
-
-        # parse receipt
-        dict_receipt = dict(tx_receipt)
-        for key in dict_receipt.keys():
-            if isinstance(dict_receipt[key], HexBytes):
-                dict_receipt[key] = dict_receipt[key].hex()
-
-        deployment_info = {
-            "contract_address": dict_receipt["contractAddress"],
-            "token_name": token_name,
-            "token_symbol": token_symbol,
-            "abi": abi,
-            "tx_receipt": dict_receipt,
-        }
-
-        with open(output_file, "w") as f:
-            json.dump(dict(deployment_info), f, indent=4)
 
-        print(f"transaction receipt saved as {output_file}")
-        return
+            with open(output_file, "w") as f:
+                json.dump(dict(deployment_info), f, indent=4)
 
-    else:
-        print("Unable to connect to provider")
-        return
+            print(f"transaction receipt saved as {output_file}")
+            return
 
+        else:
+            print("Unable to connect to provider")
+            return
+    finally:
+        # its session and health checks would otherwise outlive the event loop
+        await provider.close()
 
-async def load_deployment_info():
-    filename = "minty_py/contracts/minty_py_deployment.json"
 
-    def file_exists():
-        return os.path.isfile(filename)
-
-    def load_json():
-        with open(filename, "r") as f:
-            return json.load(f)
-
-    def validate_keys(data):
-        required_keys = {
-            "contract_address",
-            "token_name",
-            "token_symbol",
-            "abi",
-            "tx_receipt",
-        }
-        keys = set(data.keys())
+async def load_deployment_info(filename: str = DEFAULT_DEPLOYMENT_PATH):
+    """
+    Loads and validates a deployment file written by deploy_contract.
 
-        missing_keys = required_keys - keys
-        extra_keys = keys - required_keys
+    The validated data is cached under ~/.cache/minty_py as a pickle, which loads
+    much faster than the JSON, keyed on the sha256 of the file's content so that any
+    change to it is read and validated again.
+    """
+    return await asyncio.to_thread(_load_deployment_info, filename)
 
-        return missing_keys, extra_keys
 
+def _load_deployment_info(filename):
     # Check if the file exists
-    if not await asyncio.to_thread(file_exists):
+    if not os.path.isfile(filename):
         raise FileNotFoundError(f"{filename} not found")
 
+    with open(filename, "rb") as f:
+        content = f.read()
+    cache_path = os.path.join(
+        DEPLOYMENT_CACHE_DIR, hashlib.sha256(content).hexdigest() + ".pickle"
+    )
+    try:
+        with open(cache_path, "rb") as f:
+            return pickle.load(f)
+    except (OSError, EOFError, pickle.PickleError):
+        pass
+
     # Load the JSON data
-    data = await asyncio.to_thread(load_json)
+    data = json.loads(content)
 
     # Validate the keys
-    missing_keys, extra_keys = validate_keys(data)
+    missing_keys, extra_keys = _validate_keys(data)
 
     if missing_keys or extra_keys:
         error_message = []
@@ -127,4 +132,30 @@ async def load_deployment_info():
 
         raise ValueError("; ".join(error_message))
 
+    try:
+        os.makedirs(DEPLOYMENT_CACHE_DIR, exist_ok=True)
+        with open(cache_path, "wb") as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+    except OSError:
+        # the cache is only an optimization
+        pass
+
     return data
+
+
+def _validate_keys(data):
+    required_keys = {
+        "contract_address",
+        "token_name",
+        "token_symbol",
+        "abi",
+        "tx_receipt",
+    }
+    # files written before chain ids were recorded don't have one
+    optional_keys = {"chain_id"}
+    keys = set(data.keys())
+
+    missing_keys = required_keys - keys
+    extra_keys = keys - required_keys - optional_keys
+
+    return missing_keys, extra_keys
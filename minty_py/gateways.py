@@ -0,0 +1,362 @@
+import asyncio
+import base64
+import time
+from collections import deque
+
+import aiohttp
+
+from minty_py.cid import directory_links, file_block, file_cid, wrapped_file_cid
+from minty_py.metrics import METRICS
+
+DEFAULT_CHUNK_SIZE = 256 * 1024
+DEFAULT_HEDGE_DELAY = 0.5  # used until a gateway has latency samples of its own
+MIN_HEDGE_DELAY = 0.05
+ERROR_PENALTY = 4  # an error counts as much as this many p50s of waiting
+
+
+class GatewayStats:
+    """
+    Rolling latency and error samples for one gateway. Only the last window samples
+    from the last max_age seconds count, so a gateway that recovers is trusted again.
+    """
+
+    def __init__(self, window: int = 200, max_age: float = 300):
+        self.max_age = max_age
+        self._samples = deque(maxlen=window)  # (recorded at, latency, error)
+
+    def record(self, latency: float, error: bool = False):
+        self._samples.append((time.monotonic(), latency, error))
+
+    def recent(self):
+        cutoff = time.monotonic() - self.max_age
+        while self._samples and self._samples[0][0] < cutoff:
+            self._samples.popleft()
+        return self._samples
+
+    def percentile(self, p):
+        latencies = sorted(latency for _, latency, error in self.recent() if not error)
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))]
+
+    @property
+    def error_rate(self):
+        samples = self.recent()
+        if not samples:
+            return 0
+        return sum(error for _, _, error in samples) / len(samples)
+
+    def score(self):
+        """Expected cost of a request, lower is better. Untried gateways score 0."""
+        samples = self.recent()
+        if not samples:
+            return 0
+        p50 = self.percentile(0.5)
+        if p50 is None:
+            p50 = max(latency for _, latency, _ in samples)
+        return p50 * (1 + ERROR_PENALTY * self.error_rate)
+
+
+class GatewayPool:
+    """
+    Reads content from a pool of IPFS HTTP gateways, ranked by their recent latency
+    and error rate. A read goes to the best gateway first; if it hasn't answered
+    within that gateway's p95 latency a backup request goes to the next best, and so
+    on, with the first good answer winning and the rest cancelled. Whole reads are
+    verified against the CID in their path, so a bad gateway can't serve wrong data.
+    gateways are base URLs ending in /ipfs/, e.g. https://ipfs.io/ipfs/
+
+    Content is checked against the CID `ipfs add` gives it by default. Content that
+    doesn't match is rejected if its root is in uploaded, the roots this tool added
+    and so laid out that way; anything else may have been added with other settings,
+    so its blocks are fetched and checked one by one instead.
+    """
+
+    def __init__(
+        self,
+        gateways,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        timeout: float = 60,
+        hedge_delay: float = DEFAULT_HEDGE_DELAY,
+    ):
+        self.gateways = list(gateways)
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self.hedge_delay = hedge_delay
+        self.stats = {gateway: GatewayStats() for gateway in self.gateways}
+        self.hedged = 0
+        self.uploaded = set()
+        self._directories = {}  # root CID -> task reading its {name: CID} links
+        self._session = None
+
+    @property
+    def session(self):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                # no total timeout, so large assets can stream for as long as they
+                # keep coming, but a gateway that stalls mid-body gives up
+                timeout=aiohttp.ClientTimeout(
+                    sock_connect=self.timeout, sock_read=self.timeout
+                )
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def ranked(self):
+        return sorted(self.gateways, key=lambda gateway: self.stats[gateway].score())
+
+    def best(self):
+        return self.ranked()[0]
+
+    async def fetch(self, path, verify: bool = True):
+        """Returns the content at an IPFS path, checked against its CID if verify."""
+
+        async def read(gateway):
+            async with self.session.get(gateway + path) as response:
+                _check_status(gateway + path, response)
+                content = await response.read()
+            if verify:
+                await self._verify(gateway, path, content)
+            return content
+
+        with METRICS.span("gateway.fetch"):
+            content, _ = await self._hedged(path, read)
+        return content
+
+    async def stream(self, path, start: int = None, end: int = None):
+        """
+        Yields the content at an IPFS path in chunks. start and end (inclusive)
+        select a byte range, which is requested with an HTTP Range header.
+        Streams can't be verified as they go, so this trusts the gateway.
+        """
+        headers = {}
+        if start is not None or end is not None:
+            headers["Range"] = f"bytes={start or 0}-{'' if end is None else end}"
+
+        async def open_response(gateway):
+            response = await self.session.get(gateway + path, headers=headers)
+            try:
+                _check_status(gateway + path, response)
+            except Exception:
+                response.release()
+                raise
+            return response
+
+        response, _ = await self._hedged(path, open_response, discard=_release)
+        try:
+            chunks = response.content.iter_chunked(self.chunk_size)
+            if headers and response.status == 200:
+                # the gateway ignored the Range header, so cut the range out ourselves
+                chunks = _slice_chunks(chunks, start or 0, end)
+            async for chunk in chunks:
+                yield chunk
+        finally:
+            response.release()
+
+    async def _verify(self, gateway, path, content):
+        parts = path.split("/")
+        if len(parts) > 2 or not parts[-1]:
+            # deeper paths are not checked
+            return
+        try:
+            verify_content(path, content)
+            return
+        except Exception as e:
+            mismatch = e
+
+        cid = parts[0]
+        if len(parts) == 2:
+            # <cid>/<name> may be in a directory holding other files as well, so
+            # check the content against the directory's own link to it
+            try:
+                cid = (await self._directory_links(gateway, parts[0]))[parts[1]]
+            except Exception:
+                raise mismatch
+            try:
+                verify_content(cid, content)
+                return
+            except Exception as e:
+                mismatch = e
+        if parts[0] in self.uploaded:
+            raise mismatch
+        # added with other settings than `ipfs add`'s defaults, e.g. another chunk
+        # size, so put the file back together from blocks that are each checked
+        if await self._read_blocks(gateway, cid) != content:
+            raise mismatch
+
+    async def _directory_links(self, gateway, root):
+        # every <root>/<name> read in a collection needs the same directory block,
+        # so it's only read once, by whichever read needs it first
+        task = self._directories.get(root)
+        if task is None:
+            task = asyncio.create_task(self._read_directory(gateway, root))
+            self._directories[root] = task
+        try:
+            return await asyncio.shield(task)
+        except Exception:
+            if self._directories.get(root) is task:
+                del self._directories[root]
+            raise
+
+    async def _read_directory(self, gateway, root):
+        return directory_links(root, await self._read_block(gateway, root))
+
+    async def _read_blocks(self, gateway, cid):
+        """Returns the content of the UnixFS file cid, checking every block's hash."""
+        data, children = file_block(cid, await self._read_block(gateway, cid))
+        parts = await asyncio.gather(
+            *(self._read_blocks(gateway, child) for child in children)
+        )
+        return data + b"".join(parts)
+
+    async def _read_block(self, gateway, cid):
+        async with self.session.get(
+            gateway + cid, params={"format": "raw"}
+        ) as response:
+            _check_status(gateway + cid, response)
+            return await response.read()
+
+    def metrics(self):
+        return {
+            "hedged": self.hedged,
+            "gateways": {
+                gateway: {
+                    "requests": len(stats.recent()),
+                    "latency_p50": stats.percentile(0.5),
+                    "latency_p99": stats.percentile(0.99),
+                    "error_rate": stats.error_rate,
+                }
+                for gateway, stats in self.stats.items()
+            },
+        }
+
+    async def _hedged(self, path, attempt, discard=None):
+        """
+        Runs attempt(gateway) on the ranked gateways, starting each backup after the
+        previous one's p95 latency or as soon as it fails. Returns (result, gateway).
+        """
+        waiting = self.ranked()
+        running = {}  # task -> (gateway, started at)
+        errors = []
+
+        def start_next():
+            gateway = waiting.pop(0)
+            task = asyncio.create_task(attempt(gateway))
+            running[task] = (gateway, time.monotonic())
+            return self._hedge_delay(gateway)
+
+        try:
+            delay = start_next()
+            while running:
+                done, _ = await asyncio.wait(
+                    running,
+                    timeout=delay if waiting else None,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if not done:
+                    self.hedged += 1
+                    METRICS.count("gateway_hedged_requests")
+                    delay = start_next()
+                    continue
+
+                winner = None
+                for task in done:
+                    gateway, started_at = running.pop(task)
+                    latency = time.monotonic() - started_at
+                    error = task.exception()
+                    self.stats[gateway].record(latency, error=error is not None)
+                    if error is not None:
+                        errors.append(error)
+                    elif winner is None:
+                        winner = (task.result(), gateway)
+                    elif discard:
+                        discard(task.result())
+                if winner is not None:
+                    return winner
+                if waiting:
+                    # something failed, so don't wait out the delay for a backup
+                    delay = start_next()
+        finally:
+            for task, (gateway, started_at) in running.items():
+                latency = time.monotonic() - started_at
+                if not task.done():
+                    task.cancel()
+                    # the loser took at least this long, which is worth knowing
+                    # when it's the gateway that would otherwise go first next time
+                    self.stats[gateway].record(latency)
+                elif not task.cancelled():
+                    error = task.exception()
+                    self.stats[gateway].record(latency, error=error is not None)
+                    if error is None and discard:
+                        discard(task.result())
+
+        raise Exception(
+            f"No gateway could serve {path}: {'; '.join(str(e) for e in errors)}"
+        )
+
+    def _hedge_delay(self, gateway):
+        p95 = self.stats[gateway].percentile(0.95)
+        return self.hedge_delay if p95 is None else max(MIN_HEDGE_DELAY, p95)
+
+
+def verify_content(path, content: bytes):
+    """
+    Checks content read from a gateway hashes to the CID in its path, either
+    <cid> for a bare file or <cid>/<name> for a file wrapped on its own in a
+    directory, as `ipfs add --wrap-with-directory` leaves it. Deeper paths are not
+    checked.
+    """
+    parts = path.split("/")
+    root = parts[0]
+    cid_version = 0 if root.startswith("Qm") else 1
+    if len(parts) == 1:
+        actual = file_cid(content, cid_version)
+    elif len(parts) == 2 and parts[1]:
+        actual = wrapped_file_cid(parts[1], content, cid_version)
+    else:
+        return
+    if actual != root:
+        raise Exception(f"Content served for {path} hashes to {actual}")
+
+
+async def encode_base64_stream(chunks):
+    """Base64 encodes an async iterator of byte chunks without joining them first."""
+    remainder = b""
+    async for chunk in chunks:
+        data = remainder + chunk
+        # only whole 3 byte groups can be encoded without padding
+        cut = len(data) - len(data) % 3
+        yield base64.b64encode(data[:cut])
+        remainder = data[cut:]
+    yield base64.b64encode(remainder)
+
+
+# --- helpers --- #
+
+
+def _check_status(url, response):
+    if response.status not in (200, 206):
+        raise Exception(f"{url} returned {response.status}")
+
+
+def _release(response):
+    response.release()
+
+
+async def _slice_chunks(chunks, start, end):
+    position = 0
+    async for chunk in chunks:
+        chunk_start, position = position, position + len(chunk)
+        if position <= start:
+            continue
+        chunk = chunk[max(0, start - chunk_start) :]
+        if end is not None and position > end + 1:
+            chunk = chunk[: len(chunk) - (position - end - 1)]
+        if chunk:
+            yield chunk
+        if end is not None and position > end:
+            return
@@ -1,14 +1,19 @@
 import asyncio
 import json
 import os
+import sys
+from dataclasses import asdict
 from functools import wraps
 
 import click
 
-from minty_py.deploy import deploy_contract
-from minty_py.minty import make_minty
+from minty_py.daemon import DEFAULT_SOCKET_PATH, call_daemon
+from minty_py.manifest import load_nft_options
 from minty_py.minty_types import NFTOptions
 
+# minty_py.minty, minty_py.deploy and minty_py.server pull in web3 and aiohttp, which
+# dominate startup time, so they are only imported by the commands that use them
+
 
 def coro(f):
     @wraps(f)
@@ -18,9 +23,49 @@ def coro(f):
     return wrapper
 
 
+def preprocess_options(f):
+    """Adds the image preprocessing options to a minting command."""
+    f = click.option(
+        "--thumbnail-size",
+        default=256,
+        show_default=True,
+        help="Longest side of the thumbnail in pixels",
+    )(f)
+    f = click.option(
+        "--max-size",
+        default=2048,
+        show_default=True,
+        help="Longest side of a preprocessed image in pixels",
+    )(f)
+    return click.option(
+        "--preprocess",
+        is_flag=True,
+        help="Re-encode images without EXIF, scaled to --max-size, and upload each "
+        "with a thumbnail and its metadata as one directory. Needs Pillow",
+    )(f)
+
+
 @click.group()
-def main():
-    pass
+@click.option(
+    "--profile",
+    is_flag=True,
+    help="Print how long each stage took when the command finishes",
+)
+@click.option(
+    "--metrics-file",
+    default=None,
+    help="Write metrics in the Prometheus text format to this file when the command "
+    "finishes, e.g. for node_exporter's textfile collector",
+)
+@click.pass_context
+def main(ctx, profile, metrics_file):
+    # work done by a `minty serve` daemon is measured there, see its /metrics
+    from minty_py.metrics import METRICS
+
+    if profile:
+        ctx.call_on_close(lambda: print(METRICS.report(), file=sys.stderr))
+    if metrics_file:
+        ctx.call_on_close(lambda: METRICS.write_textfile(metrics_file))
 
 
 ### MINT nft
@@ -43,23 +88,184 @@ def main():
     prompt="Owner Address",
     help="The Ethereum address that should own the NFT.",
 )
+@click.option(
+    "--no-cache",
+    is_flag=True,
+    help="Upload assets even if they were uploaded before",
+)
+@preprocess_options
 @coro
-async def mint(image_path, name, description, owner):
-    await create_nft(image_path, name, description, owner)
+async def mint(
+    image_path, name, description, owner, no_cache, preprocess, max_size, thumbnail_size
+):
+    preprocessing = (max_size, thumbnail_size) if preprocess else None
+    await create_nft(image_path, name, description, owner, no_cache, preprocessing)
+
+
+### MINT many nfts from a directory or manifest
+@main.command("mint-batch")
+@click.argument("source")
+@click.option(
+    "-d",
+    "--description",
+    default="",
+    help="Description for entries that don't have their own",
+)
+@click.option(
+    "-o",
+    "--owner",
+    default=None,
+    help="Owner address for entries that don't have their own. Defaults to the minting account.",
+)
+@click.option(
+    "-c",
+    "--concurrency",
+    default=8,
+    show_default=True,
+    help="How many uploads to run at once",
+)
+@click.option(
+    "--no-cache",
+    is_flag=True,
+    help="Upload assets even if they were uploaded before",
+)
+@preprocess_options
+@click.option(
+    "--car",
+    is_flag=True,
+    help="Pack every asset and metadata file into one CAR file and import it in a "
+    "single request. Token URIs become ipfs://<root>/<n>.json. Directories aren't "
+    "sharded, so a collection can have at most about 18,000 tokens",
+)
+@click.option("--car-file", default=None, help="Keep the CAR file --car writes here")
+@click.option(
+    "-j",
+    "--journal",
+    default=None,
+    help="File recording each token's progress, so an interrupted run can resume",
+)
+@click.option(
+    "-w",
+    "--signing-workers",
+    default=0,
+    help="Sign transactions in this many processes instead of inline",
+)
+@click.option(
+    "--unsigned",
+    default=None,
+    help="Don't mint, write the unsigned mint transactions to this file for "
+    "'minty sign-offline' instead",
+)
+@click.option(
+    "--from",
+    "from_address",
+    default=None,
+    help="With --unsigned, the address that will sign. Defaults to the configured "
+    "account",
+)
+@coro
+async def mint_batch(
+    source,
+    description,
+    owner,
+    concurrency,
+    no_cache,
+    preprocess,
+    max_size,
+    thumbnail_size,
+    car,
+    car_file,
+    journal,
+    signing_workers,
+    unsigned,
+    from_address,
+):
+    if car and preprocess:
+        raise click.UsageError("--car can't be combined with --preprocess")
+    if journal and (car or car_file):
+        raise click.UsageError("--journal can't be combined with --car")
+    if unsigned and (car or car_file or journal):
+        raise click.UsageError("--unsigned can't be combined with --car or --journal")
+    if from_address and not unsigned:
+        raise click.UsageError("--from is only used with --unsigned")
+    preprocessing = (max_size, thumbnail_size) if preprocess else None
+    await create_nfts(
+        source,
+        description,
+        owner,
+        concurrency,
+        no_cache,
+        preprocessing,
+        car=car or car_file is not None,
+        car_file=car_file,
+        journal_path=journal,
+        signing_workers=signing_workers,
+        unsigned_path=unsigned,
+        from_address=from_address,
+    )
 
 
 ### GET nft information
 @main.command()
-@click.argument("token_id")
+@click.argument("token_ids")
 @click.option(
     "-c",
     "--creation_info",
     is_flag=True,
     help="Include the creator address and block number the NFT was minted",
 )
+@click.option(
+    "--max-in-flight",
+    default=4,
+    show_default=True,
+    help="How many batched RPC requests to run at once when showing many tokens",
+)
 @coro
-async def show(token_id, creation_info):
-    await get_nft(token_id, creation_info)
+async def show(token_ids, creation_info, max_in_flight):
+    """Show one token, or a summary of many, e.g. 1-5000 or 1,4,10-20."""
+    token_ids = parse_token_ids(token_ids)
+    if len(token_ids) == 1:
+        await get_nft(token_ids[0], creation_info)
+    else:
+        await get_nfts(token_ids, max_in_flight)
+
+
+### FETCH the asset of an nft
+@main.command()
+@click.argument("token_id")
+@click.option("-o", "--output", default=None, help="File to write to. Defaults to stdout")
+@click.option(
+    "-r",
+    "--range",
+    "byte_range",
+    default=None,
+    help="Only fetch bytes START-END of the asset, e.g. 0-1023",
+)
+@click.option("--base64", "as_base64", is_flag=True, help="Write the asset base64 encoded")
+@coro
+async def fetch(token_id, output, byte_range, as_base64):
+    await fetch_asset(token_id, output, byte_range, as_base64)
+
+
+### INDEX transfers into the local token store
+@main.command("index")
+@coro
+async def index_transfers():
+    """Bring the local Transfer index up to date with the chain."""
+    await sync_index()
+
+
+### LIST the tokens an address owns
+@main.command("tokens-of")
+@click.argument("owner")
+@click.option(
+    "--no-sync",
+    is_flag=True,
+    help="Answer from the local index without catching up with the chain first",
+)
+@coro
+async def tokens_of(owner, no_sync):
+    await get_tokens_of(owner, no_sync)
 
 
 ### TRANSFER nft to an address
@@ -71,12 +277,117 @@ async def transfer(token_id, to_address):
     await transfer_nft(token_id, to_address)
 
 
+### TRANSFER many nfts, e.g. for an airdrop
+@main.command("transfer-batch")
+@click.argument("csv_path")
+@click.option(
+    "--batch-size",
+    default=500,
+    show_default=True,
+    help="How many rows to check ownership of and send at a time",
+)
+@click.option(
+    "-w",
+    "--signing-workers",
+    default=0,
+    help="Sign transactions in this many processes instead of inline",
+)
+@coro
+async def transfer_batch(csv_path, batch_size, signing_workers):
+    """
+    Transfer every token in a CSV with token_id and to_address columns. Rows whose
+    token already belongs to its recipient are skipped, so a rerun picks up where
+    an interrupted one stopped.
+    """
+    await transfer_many_nfts(csv_path, batch_size, signing_workers)
+
+
+### SIGN transactions written by --unsigned, e.g. on an offline machine
+@main.command("sign-offline")
+@click.argument("unsigned_path")
+@click.argument("signed_path")
+@click.option(
+    "-k",
+    "--key-file",
+    default=None,
+    help="File holding the 0x prefixed private key. Prompted for if not given",
+)
+@click.option(
+    "-w", "--workers", default=None, type=int, help="Signing processes, one per core"
+)
+def sign_offline(unsigned_path, signed_path, key_file, workers):
+    """Sign the transactions in UNSIGNED_PATH and write them to SIGNED_PATH."""
+    from minty_py.signing import sign_file
+
+    if key_file:
+        with open(key_file, "r") as f:
+            private_key = f.read().strip()
+    else:
+        private_key = click.prompt("Private key", hide_input=True)
+    count = sign_file(unsigned_path, signed_path, private_key, workers=workers)
+    print(f"🌿 Signed {count} transactions into {signed_path}")
+
+
+### SEND transactions signed by sign-offline
+@main.command("send-signed")
+@click.argument("signed_path")
+@coro
+async def send_signed(signed_path):
+    await send_signed_transactions(signed_path)
+
+
 ### PIN nft data to ipfs
 @main.command()
-@click.argument("token_id")
+@click.argument("token_id", required=False)
+@click.option(
+    "-a", "--all", "all_tokens", is_flag=True, help="Pin every token in the contract"
+)
+@click.option("-r", "--range", "token_range", help="Pin many tokens, e.g. 1-5000")
+@click.option(
+    "-j",
+    "--journal",
+    default=None,
+    help="File recording finished tokens, so an interrupted run can resume",
+)
+@click.option(
+    "--batch-size",
+    default=500,
+    show_default=True,
+    help="How many tokens to resolve and pin at a time",
+)
 @coro
-async def pin(token_id):
-    await pin_nft_data(token_id)
+async def pin(token_id, all_tokens, token_range, journal, batch_size):
+    if all_tokens or token_range:
+        await pin_many_nfts(all_tokens, token_range, journal, batch_size)
+    elif token_id:
+        await pin_nft_data(token_id)
+    else:
+        raise click.UsageError("Give a TOKEN_ID, --range or --all")
+
+
+### SERVE a long running minty for the other commands to use
+@main.command()
+@click.option(
+    "-s",
+    "--socket",
+    "socket_path",
+    default=DEFAULT_SOCKET_PATH,
+    show_default=True,
+    help="Unix socket to listen on",
+)
+@click.option(
+    "-m",
+    "--metrics-port",
+    default=None,
+    type=int,
+    help="Also serve /metrics for Prometheus on this port of localhost",
+)
+@coro
+async def serve(socket_path, metrics_port):
+    """Keep one warm Minty running. mint, show, transfer and pin will use it."""
+    from minty_py.server import run_server
+
+    await run_server(socket_path, metrics_port)
 
 
 ### DEPLOY new contract
@@ -102,20 +413,64 @@ async def pin(token_id):
 )
 @coro
 async def deploy(contract, output, name, symbol):
+    from minty_py.deploy import deploy_contract
+
     await deploy_contract(contract, output, name, symbol)
 
 
 # --- functions --- #
 
 
-async def create_nft(image_path, name, description, owner):
+async def make_minty(**kwargs):
+    from minty_py.minty import make_minty
+
+    return await make_minty(**kwargs)
+
+
+def make_preprocessor(preprocessing):
+    """Takes (max_size, thumbnail_size), or None for no preprocessing."""
+    if preprocessing is None:
+        return None
+    from minty_py.preprocess import Preprocessor
+
+    max_size, thumbnail_size = preprocessing
+    return Preprocessor(max_size=max_size, thumbnail_size=thumbnail_size)
+
+
+def make_signer(workers):
+    """
+    Returns a SigningPool of `workers` processes for Minty's main account, or None
+    to sign inline.
+    """
+    if not workers:
+        return None
+    from minty_py.minty import SECRET_KEYS
+    from minty_py.signing import SigningPool
+
+    return SigningPool(SECRET_KEYS[0], workers=workers)
+
+
+async def create_nft(
+    image_path, name, description, owner, no_cache=False, preprocessing=None
+):
     print("You called create_nft")
-    minty = await make_minty()
+    # the daemon resolves paths from its own working directory
+    image_path = os.path.abspath(image_path)
+    options = NFTOptions(
+        name=name, description=description, owner=owner, image_path=image_path
+    )
 
-    # breakpoint()
-    options = NFTOptions(name=name, description=description, owner=owner, image_path=image_path)
-    
-    nft = await minty.create_nft_from_asset_file(options)
+    # the daemon always uses the CID cache and never preprocesses, so --no-cache and
+    # --preprocess have to mint locally
+    nft = None
+    if not no_cache and not preprocessing:
+        nft = await call_daemon("POST", "/mint", asdict(options))
+    if nft is None:
+        minty = await make_minty(
+            use_cache=not no_cache, preprocessor=make_preprocessor(preprocessing)
+        )
+        nft = await minty.create_nft_from_asset_file(options)
+        await minty.close()
     print("🌿 Minted a new NFT: ")
 
     align_output(
@@ -131,13 +486,84 @@ async def create_nft(image_path, name, description, owner):
     print(json.dumps(nft["metadata"], indent=2))
 
 
-async def get_nft(token_id, creation_info):
-    print("You called get_nft")
-    minty = await make_minty()
+async def create_nfts(
+    source,
+    description,
+    owner,
+    concurrency,
+    no_cache=False,
+    preprocessing=None,
+    car=False,
+    car_file=None,
+    journal_path=None,
+    signing_workers=0,
+    unsigned_path=None,
+    from_address=None,
+):
+    print("You called create_nfts")
+    minty = await make_minty(
+        use_cache=not no_cache,
+        preprocessor=make_preprocessor(preprocessing),
+        signer=make_signer(signing_workers),
+        address=from_address,
+    )
+
+    options = load_nft_options(source, owner=owner, description=description)
+
+    if car:
+        nfts = await minty.create_collection(options, car_path=car_file)
+    elif unsigned_path:
+        nfts = await minty.create_nfts(
+            options, concurrency=concurrency, unsigned_path=unsigned_path
+        )
+        print(
+            f"🌿 Uploaded {len(nfts)} NFTs. Sign {unsigned_path} with "
+            "'minty sign-offline' and send it with 'minty send-signed'"
+        )
+        await minty.close()
+        return
+    elif journal_path:
+        from minty_py.mint_journal import MintJournal
+
+        journal = MintJournal(journal_path)
+        try:
+            nfts = await minty.create_nfts(
+                options, concurrency=concurrency, journal=journal
+            )
+        finally:
+            journal.close()
+    else:
+        nfts = await minty.create_nfts(options, concurrency=concurrency)
+    minted = [nft for nft in nfts if "tokenId" in nft]
+    print(f"🌿 Minted {len(minted)} new NFTs: ")
+
+    if minted:
+        align_output(
+            [[f"Token ID {nft['tokenId']}:", nft["metadataURI"]] for nft in minted]
+        )
+    failed = [nft for nft in nfts if "error" in nft]
+    if failed:
+        print(f"{len(failed)} failed to mint: ")
+        align_output([[nft["metadataURI"], nft["error"]] for nft in failed])
+
+    metrics = minty.minters.metrics()
+    if metrics["confirmed"]:
+        print(
+            f"Confirmation latency: p50 {metrics['latency_p50']:.1f}s, "
+            f"p95 {metrics['latency_p95']:.1f}s, max {metrics['latency_max']:.1f}s, "
+            f"{metrics['replaced']} transactions replaced"
+        )
+    await minty.close()
 
-    breakpoint()
 
-    nft = await minty.get_nft(token_id, creation_info)
+async def get_nft(token_id, creation_info):
+    print("You called get_nft")
+    query = "?creation_info=1" if creation_info else ""
+    nft = await call_daemon("GET", f"/nft/{token_id}{query}")
+    if nft is None:
+        minty = await make_minty()
+        nft = await minty.get_nft(token_id, {"fetchCreationInfo": creation_info})
+        await minty.close()
 
     output = [
         ["Token ID:", nft["tokenId"]],
@@ -156,24 +582,181 @@ async def get_nft(token_id, creation_info):
     print(json.dumps(nft["metadata"], indent=2))
 
 
-async def transfer_nft(token_id, to_address):
-    print("You called transfer_nft")
+async def get_nfts(token_ids, max_in_flight):
+    print("You called get_nfts")
+    minty = await make_minty(max_in_flight=max_in_flight)
+
+    nfts = await minty.get_nfts(token_ids, fetch_metadata=False)
+
+    output = []
+    for nft in nfts:
+        if "error" in nft:
+            output.append([f"Token ID {nft['tokenId']}:", nft["error"]])
+        else:
+            value = f"{nft['ownerAddress']} {nft['metadataURI']}"
+            output.append([f"Token ID {nft['tokenId']}:", value])
+    align_output(output)
+    await minty.close()
+
+
+async def fetch_asset(token_id, output, byte_range, as_base64):
+    from minty_py.gateways import encode_base64_stream
+
+    minty = await make_minty()
+    metadata, _ = await minty.get_nft_metadata(token_id)
+
+    start = end = None
+    if byte_range:
+        start, _, end = byte_range.partition("-")
+        start, end = int(start or 0), int(end) if end else None
+
+    chunks = minty.stream_ipfs(metadata["image"], start, end)
+    if as_base64:
+        chunks = encode_base64_stream(chunks)
+
+    out = open(output, "wb") if output else sys.stdout.buffer
+    async for chunk in chunks:
+        out.write(chunk)
+    out.flush()
+    if output:
+        out.close()
+        # status goes to stderr so it can't end up mixed into the asset on stdout
+        print(f"🌿 Wrote the asset of token {token_id} to {output}", file=sys.stderr)
+    await minty.close()
+
+
+async def sync_index():
+    print("You called sync_index")
+    minty = await make_minty()
+
+    def progress(block_number, head):
+        print(f"Indexed up to block {block_number} of {head}")
+
+    block_number = await minty.indexer.sync(progress)
+    print(f"🌿 Index is up to date at block {block_number}")
+    await minty.close()
+
+
+async def get_tokens_of(owner, no_sync):
+    print("You called get_tokens_of")
     minty = await make_minty()
 
-    await minty.transfer_token(token_id, to_address)
+    token_ids = await minty.get_tokens_of(owner, sync=not no_sync)
+    print(f"{owner} owns {len(token_ids)} tokens:")
+    for token_id in token_ids:
+        print(token_id)
+    await minty.close()
+
+
+async def transfer_nft(token_id, to_address):
+    print("You called transfer_nft")
+    body = {"token_id": token_id, "to_address": to_address}
+    if await call_daemon("POST", "/transfer", body) is None:
+        minty = await make_minty()
+        await minty.transfer_token(token_id, to_address)
+        await minty.close()
     print(f"🌿 Transferred token {token_id} to {to_address}")
 
 
+async def transfer_many_nfts(csv_path, batch_size, signing_workers):
+    from minty_py.transfers import read_transfers, transfer_tokens
+
+    print("You called transfer_many_nfts")
+    minty = await make_minty(signer=make_signer(signing_workers))
+
+    def progress(stats):
+        print(
+            f"{stats['rows']} rows done, {stats['transferred']} transferred, "
+            f"{stats['skipped']} already transferred, {len(stats['failed'])} failed"
+        )
+
+    stats = await transfer_tokens(
+        minty, read_transfers(csv_path), batch_size=batch_size, progress=progress
+    )
+    for line_number, error in stats["failed"].items():
+        print(f"Line {line_number} failed: {error}")
+    print(f"🌿 Transferred {stats['transferred']} tokens")
+    await minty.close()
+
+
+async def send_signed_transactions(signed_path):
+    print("You called send_signed_transactions")
+    minty = await make_minty()
+    receipts = await minty.send_signed_transactions(signed_path)
+
+    output = []
+    for receipt in receipts:
+        tx_hash = receipt["transactionHash"].hex()
+        if receipt["status"] != 1:
+            output.append([f"{tx_hash}:", "failed"])
+            continue
+        transfers = minty.contract.events.Transfer().process_receipt(receipt)
+        token_ids = [str(transfer["args"]["tokenId"]) for transfer in transfers]
+        output.append([f"{tx_hash}:", "token " + ", ".join(token_ids)])
+    await minty.close()
+    print(f"🌿 Sent {len(receipts)} signed transactions: ")
+    align_output(output)
+
+
 async def pin_nft_data(token_id):
     print("You called pin_nft_data")
-    minty = await make_minty()
-    asset_uri, metadata_uri = await minty.pin_token_data(token_id)
+    if await call_daemon("POST", "/pin", {"token_id": token_id}) is None:
+        minty = await make_minty()
+        asset_uri, metadata_uri = await minty.pin_token_data(token_id)
+        await minty.close()
     print(f"🌿 Pinned all data for token id {token_id}")
 
 
+async def pin_many_nfts(all_tokens, token_range, journal_path, batch_size):
+    from minty_py.pinning import PinJournal, make_pinning_clients, pin_tokens
+
+    print("You called pin_many_nfts")
+    minty = await make_minty()
+
+    if all_tokens:
+        await minty.indexer.sync()
+        token_ids = minty.indexer.token_ids()
+    else:
+        token_ids = parse_token_ids(token_range)
+
+    clients = make_pinning_clients(minty.ipfs)
+    journal = PinJournal(journal_path) if journal_path else None
+
+    def progress(stats):
+        print(
+            f"{stats['tokens']} tokens done, {stats['pinned']} CIDs pinned, "
+            f"{stats['skipped']} already pinned, {len(stats['failed'])} failed"
+        )
+
+    stats = await pin_tokens(
+        minty, token_ids, clients, journal, batch_size=batch_size, progress=progress
+    )
+    for token_id, error in stats["failed"].items():
+        print(f"Token {token_id} failed: {error}")
+    if stats["failed"] and journal is not None:
+        print(f"Run again with --journal {journal_path} to retry the failed tokens")
+    print(f"🌿 Pinned all data for {stats['tokens']} tokens")
+
+    if journal is not None:
+        journal.close()
+    for client in clients:
+        if client is not minty.ipfs:
+            await client.close()
+    await minty.close()
+
+
 # --- helpers --- #
 
 
+def parse_token_ids(spec):
+    """Parses a list of token ids and ranges like 1-5,7,10-12."""
+    token_ids = []
+    for part in spec.split(","):
+        start, _, end = part.strip().partition("-")
+        token_ids.extend(range(int(start), int(end or start) + 1))
+    return token_ids
+
+
 def align_output(label_value_pairs):
     max_label_length = max(len(label) for label, _ in label_value_pairs)
     for label, value in label_value_pairs:
@@ -0,0 +1,247 @@
+import asyncio
+import os
+import sqlite3
+
+from web3 import Web3
+
+from minty_py.rpc_batch import JSONRPCBatcher, RPCError
+
+DEFAULT_INDEX_DIR = os.path.join(os.path.expanduser("~"), ".cache", "minty_py")
+
+TRANSFER_TOPIC = Web3.keccak(text="Transfer(address,address,uint256)").hex()
+ZERO_ADDRESS = "0x0000000000000000000000000000000000000000"
+
+
+def default_index_path(contract_address):
+    return os.path.join(DEFAULT_INDEX_DIR, f"index-{contract_address.lower()}.sqlite")
+
+
+class TransferIndexer:
+    """
+    Follows a contract's Transfer logs into a local SQLite store, so token ownership
+    and creation info can be answered without scanning the chain.
+
+    Each sync resumes from the stored checkpoint, re-reading the last reorg_depth
+    blocks so that transfers dropped by a reorg are rolled back. Logs are fetched
+    in block ranges that double after each success and halve after each failure
+    (e.g. when a node limits how many results one eth_getLogs can return).
+    """
+
+    def __init__(
+        self,
+        w3,
+        contract_address: str,
+        start_block: int = 0,
+        path: str = None,
+        reorg_depth: int = 12,
+        chunk_size: int = 2000,
+        max_chunk_size: int = 10000,
+    ):
+        self.w3 = w3
+        self.contract_address = contract_address
+        self.start_block = start_block
+        self.path = path or default_index_path(contract_address)
+        self.reorg_depth = reorg_depth
+        self.chunk_size = chunk_size
+        self.max_chunk_size = max_chunk_size
+        self.batcher = JSONRPCBatcher(w3)
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS transfers (
+                block_number INTEGER NOT NULL,
+                log_index INTEGER NOT NULL,
+                token_id INTEGER NOT NULL,
+                from_address TEXT NOT NULL,
+                to_address TEXT NOT NULL,
+                tx_hash TEXT NOT NULL,
+                PRIMARY KEY (block_number, log_index)
+            );
+            CREATE INDEX IF NOT EXISTS transfers_token ON transfers (token_id);
+            CREATE TABLE IF NOT EXISTS tokens (
+                token_id INTEGER PRIMARY KEY,
+                owner TEXT NOT NULL,
+                creator TEXT NOT NULL,
+                mint_block INTEGER NOT NULL,
+                mint_tx TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS tokens_owner ON tokens (owner);
+            CREATE TABLE IF NOT EXISTS checkpoint (
+                id INTEGER PRIMARY KEY CHECK (id = 0),
+                block_number INTEGER NOT NULL
+            );
+            """
+        )
+
+    async def close(self):
+        await self.batcher.close()
+        self._db.close()
+
+    async def sync(self, progress=None):
+        """
+        Indexes every Transfer up to the current head. progress(block_number, head)
+        is called after each chunk. Returns the last indexed block.
+        """
+        head = await self.w3.eth.block_number
+        checkpoint = self.checkpoint()
+
+        if checkpoint is None:
+            from_block = self.start_block
+        else:
+            from_block = max(self.start_block, checkpoint + 1 - self.reorg_depth)
+            await asyncio.to_thread(self._rollback, from_block)
+
+        while from_block <= head:
+            to_block = min(from_block + self.chunk_size - 1, head)
+            try:
+                logs = await self.w3.eth.get_logs(
+                    {
+                        "address": self.contract_address,
+                        "fromBlock": from_block,
+                        "toBlock": to_block,
+                        "topics": [TRANSFER_TOPIC],
+                    }
+                )
+            except Exception:
+                if self.chunk_size == 1:
+                    raise
+                self.chunk_size = max(1, self.chunk_size // 2)
+                continue
+
+            transfers = [self._decode_transfer(log) for log in logs]
+            creators = await self._fetch_creators(transfers)
+            await asyncio.to_thread(self._apply, transfers, creators, to_block)
+
+            if progress:
+                progress(to_block, head)
+            from_block = to_block + 1
+            self.chunk_size = min(self.chunk_size * 2, self.max_chunk_size)
+
+        return self.checkpoint()
+
+    def checkpoint(self):
+        row = self._db.execute("SELECT block_number FROM checkpoint").fetchone()
+        return row[0] if row else None
+
+    def get_token(self, token_id):
+        row = self._db.execute(
+            "SELECT owner, creator, mint_block, mint_tx FROM tokens WHERE token_id = ?",
+            (int(token_id),),
+        ).fetchone()
+        if row is None:
+            return None
+        return {
+            "tokenId": int(token_id),
+            "ownerAddress": row[0],
+            "creatorAddress": row[1],
+            "blockNumber": row[2],
+            "transactionHash": row[3],
+        }
+
+    def tokens_of(self, owner):
+        rows = self._db.execute(
+            "SELECT token_id FROM tokens WHERE owner = ? ORDER BY token_id",
+            (Web3.to_checksum_address(owner),),
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def token_ids(self):
+        rows = self._db.execute("SELECT token_id FROM tokens ORDER BY token_id")
+        return [row[0] for row in rows]
+
+    def _decode_transfer(self, log):
+        # from, to and tokenId are all indexed, so everything is in the topics
+        topics = [bytes(topic) for topic in log["topics"]]
+        return {
+            "block_number": log["blockNumber"],
+            "log_index": log["logIndex"],
+            "token_id": int.from_bytes(topics[3], "big"),
+            "from_address": Web3.to_checksum_address(topics[1][-20:]),
+            "to_address": Web3.to_checksum_address(topics[2][-20:]),
+            "tx_hash": "0x" + bytes(log["transactionHash"]).hex(),
+        }
+
+    async def _fetch_creators(self, transfers):
+        # the creator is whoever sent the minting transaction, which isn't in the log
+        mint_txs = sorted(
+            {t["tx_hash"] for t in transfers if t["from_address"] == ZERO_ADDRESS}
+        )
+        txs = await self.batcher.request_many(
+            "eth_getTransactionByHash", [[tx_hash] for tx_hash in mint_txs]
+        )
+        creators = {}
+        for tx_hash, tx in zip(mint_txs, txs):
+            if isinstance(tx, RPCError):
+                raise tx
+            creators[tx_hash] = Web3.to_checksum_address(tx["from"])
+        return creators
+
+    def _apply(self, transfers, creators, block_number):
+        with self._db:
+            for t in transfers:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO transfers VALUES (?, ?, ?, ?, ?, ?)",
+                    (
+                        t["block_number"],
+                        t["log_index"],
+                        t["token_id"],
+                        t["from_address"],
+                        t["to_address"],
+                        t["tx_hash"],
+                    ),
+                )
+                if t["from_address"] == ZERO_ADDRESS:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO tokens VALUES (?, ?, ?, ?, ?)",
+                        (
+                            t["token_id"],
+                            t["to_address"],
+                            creators[t["tx_hash"]],
+                            t["block_number"],
+                            t["tx_hash"],
+                        ),
+                    )
+                else:
+                    self._db.execute(
+                        "UPDATE tokens SET owner = ? WHERE token_id = ?",
+                        (t["to_address"], t["token_id"]),
+                    )
+            self._db.execute(
+                "INSERT OR REPLACE INTO checkpoint VALUES (0, ?)", (block_number,)
+            )
+
+    def _rollback(self, from_block):
+        """Forgets every transfer from from_block on, restoring the owners before it."""
+        with self._db:
+            token_ids = [
+                row[0]
+                for row in self._db.execute(
+                    "SELECT DISTINCT token_id FROM transfers WHERE block_number >= ?",
+                    (from_block,),
+                )
+            ]
+            self._db.execute(
+                "DELETE FROM transfers WHERE block_number >= ?", (from_block,)
+            )
+            for token_id in token_ids:
+                last = self._db.execute(
+                    """
+                    SELECT to_address FROM transfers WHERE token_id = ?
+                    ORDER BY block_number DESC, log_index DESC LIMIT 1
+                    """,
+                    (token_id,),
+                ).fetchone()
+                if last is None:
+                    self._db.execute(
+                        "DELETE FROM tokens WHERE token_id = ?", (token_id,)
+                    )
+                else:
+                    self._db.execute(
+                        "UPDATE tokens SET owner = ? WHERE token_id = ?",
+                        (last[0], token_id),
+                    )
+            self._db.execute(
+                "INSERT OR REPLACE INTO checkpoint VALUES (0, ?)", (from_block - 1,)
+            )
@@ -1,22 +1,263 @@
-import requests
+import asyncio
+import base64
+import hashlib
+import json
+import os.path
+from contextlib import ExitStack
+
+import aiohttp
+
+from minty_py.metrics import METRICS
 
 
 class IPFSClient:
-    def __init__(self, key: str, secret: str, api_endpoint: str):
+    """
+    Talks to the IPFS HTTP API over one pooled, keep-alive aiohttp session.
+    At most max_concurrency requests are in flight at a time.
+
+    If a CIDCache is given, content that was added before is not uploaded again.
+    If a RateLimiter is given, every request waits for it first; an
+    AdaptiveRateLimiter also backs off and retries when the API pushes back.
+    """
+
+    def __init__(
+        self,
+        key: str,
+        secret: str,
+        api_endpoint: str,
+        max_concurrency: int = 8,
+        keepalive_timeout: float = 60,
+        cache=None,
+        rate_limiter=None,
+    ):
         self.key = key
         self.secret = secret
         self.api_endpoint = api_endpoint
+        self.max_concurrency = max_concurrency
+        self.keepalive_timeout = keepalive_timeout
+        self.cache = cache
+        self.rate_limiter = rate_limiter
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._session = None
+
+    @property
+    def session(self):
+        # created lazily so the client can be built outside of a running event loop
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_concurrency, keepalive_timeout=self.keepalive_timeout
+            )
+            credentials = base64.b64encode(f"{self.key}:{self.secret}".encode())
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers={"Authorization": "Basic " + credentials.decode()},
+            )
+        return self._session
+
+    async def close(self):
+        if self.cache is not None:
+            self.cache.close()
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def add(self, path, content):
+        """
+        Adds content (bytes or str) to IPFS as a file named after path, wrapped in a
+        directory. Returns the CID of the wrapping directory.
+        """
+        if isinstance(content, str):
+            content = content.encode()
+        if self.cache is None:
+            return await self._add(path, content)
+
+        digest = hashlib.sha256(content).hexdigest()
+        cid = await self._cached_cid(digest, path)
+        if cid is not None:
+            METRICS.count("ipfs_cache_hits")
+        else:
+            cid = await self._add(path, content)
+            await self._cache_cid(digest, path, cid)
+        return cid
+
+    async def add_file(self, path, local_path):
+        """
+        Like add, but streams the content from local_path in chunks instead of
+        loading it into memory.
+        """
+        if self.cache is None:
+            return await self._add(path, local_path)
+
+        digest = await asyncio.to_thread(self.cache.file_digest, local_path)
+        cid = await self._cached_cid(digest, path)
+        if cid is not None:
+            METRICS.count("ipfs_cache_hits")
+        else:
+            cid = await self._add(path, local_path)
+            await self._cache_cid(digest, path, cid)
+        return cid
+
+    async def add_many(self, entries):
+        """
+        Adds (path, content) pairs in parallel, returning their CIDs in order.
+        Content that is an os.PathLike is streamed from disk like add_file.
+        """
+
+        async def add_entry(path, content):
+            if isinstance(content, os.PathLike):
+                return await self.add_file(path, content)
+            return await self.add(path, content)
+
+        return await asyncio.gather(
+            *(add_entry(path, content) for path, content in entries)
+        )
+
+    async def add_directory(self, entries):
+        """
+        Adds (name, content) pairs to IPFS as the files of one directory and returns
+        the directory's CID. Content may be bytes, str, or an os.PathLike to stream
+        from disk.
+        """
+        return await self._add_files(
+            [
+                (name, content.encode() if isinstance(content, str) else content)
+                for name, content in entries
+            ]
+        )
+
+    async def dag_import(self, local_path):
+        """
+        Imports the CAR file at local_path in one request, streaming it from disk,
+        and pins its root. Returns the root CID.
+        """
 
-    def add(self, path, content):
-        infura_add_endpoint = self.api_endpoint + "/api/v0/add"
+        def make_form(stack):
+            form = aiohttp.FormData()
+            form.add_field(
+                "file",
+                stack.enter_context(open(local_path, "rb")),
+                filename=os.path.basename(local_path),
+                content_type="application/vnd.ipld.car",
+            )
+            return form
 
-        file_to_add = {"file": open(path, "rb")}
+        size = os.path.getsize(local_path)
+        status, content = await self._post(
+            "/api/v0/dag/import", {"pin-roots": "true"}, make_form
+        )
+        text = content.decode()
+
+        if status != 200:
+            raise Exception(f"Failed to import {local_path} into IPFS: {text}")
+        METRICS.count("ipfs_bytes_uploaded", size)
+        for line in text.splitlines():
+            if line.strip() and "Root" in json.loads(line):
+                return json.loads(line)["Root"]["Cid"]["/"]
+        raise Exception(f"IPFS didn't report a root for {local_path}: {text}")
+
+    async def cat(self, path):
+        """Returns the content at an IPFS path, e.g. <cid>/metadata.json."""
+        status, content = await self._post("/api/v0/cat", {"arg": path})
+
+        if status == 200:
+            return content
+        else:
+            raise Exception(f"Failed to get content from IPFS: {content.decode()}")
+
+    async def pin_add(self, path):
+        """Pins the content at an IPFS path, e.g. <cid>/metadata.json, recursively."""
+        status, content = await self._post("/api/v0/pin/add", {"arg": path})
+
+        if status != 200:
+            raise Exception(f"Failed to pin {path}: {content.decode()}")
+
+    async def pin_ls(self):
+        """Returns the set of every recursively pinned CID, in one request."""
+        status, content = await self._post("/api/v0/pin/ls", {"type": "recursive"})
+
+        if status == 200:
+            return set(json.loads(content).get("Keys") or {})
+        else:
+            raise Exception(f"Failed to list pins: {content.decode()}")
+
+    # the wrapping directory's CID depends on the file name as well as the content,
+    # so cache entries are keyed by both, and by the node the content was added to
 
-        response = requests.post(
-            infura_add_endpoint, files=file_to_add, auth=(self.key, self.secret)
+    async def _cached_cid(self, digest, path):
+        return await asyncio.to_thread(
+            self.cache.get, self.api_endpoint, digest, os.path.basename(path)
         )
 
-        if response.status_code == 200:
-            return response.json()["cid"]
+    async def _cache_cid(self, digest, path, cid):
+        await asyncio.to_thread(
+            self.cache.put, self.api_endpoint, digest, os.path.basename(path), cid
+        )
+
+    async def _add(self, path, payload):
+        return await self._add_files([(os.path.basename(path), payload)])
+
+    async def _add_files(self, files):
+        """
+        Adds (name, bytes or path of a file to stream) pairs in one directory,
+        returns its CID.
+        """
+        size = sum(
+            len(payload) if isinstance(payload, bytes) else os.path.getsize(payload)
+            for _, payload in files
+        )
+
+        def make_form(stack):
+            form = aiohttp.FormData()
+            for name, payload in files:
+                if not isinstance(payload, bytes):
+                    payload = stack.enter_context(open(payload, "rb"))
+                form.add_field(
+                    "file",
+                    payload,
+                    filename=name,
+                    content_type="application/octet-stream",
+                )
+            return form
+
+        params = {"cid-version": 1, "wrap-with-directory": "true"}
+        status, content = await self._post("/api/v0/add", params, make_form)
+        text = content.decode()
+
+        if status == 200:
+            METRICS.count("ipfs_bytes_uploaded", size)
+            # one json object per added entry, the wrapping directory comes last
+            lines = [line for line in text.splitlines() if line.strip()]
+            return json.loads(lines[-1])["Hash"]
         else:
-            raise Exception(f"Failed to add content to IPFS: {response.text}")
+            raise Exception(f"Failed to add content to IPFS: {text}")
+
+    async def _post(self, api_path, params, make_form=None):
+        """
+        Returns the status and content of a request to the API. make_form(stack)
+        builds its form, opening files on stack, and is called again if the request
+        is retried, as aiohttp closes a file payload once it's sent.
+        """
+        stage = "ipfs." + api_path[len("/api/v0/") :].replace("/", "_")
+
+        async def send():
+            with ExitStack() as stack:
+                data = make_form(stack) if make_form is not None else None
+                # timed once it's actually sent, so queueing shows up in the
+                # callers' spans
+                with METRICS.span(stage):
+                    async with self.session.post(
+                        self.api_endpoint + api_path, params=params, data=data
+                    ) as response:
+                        return response.status, response.headers, await response.read()
+
+        async with self._semaphore:
+            if self.rate_limiter is None:
+                status, _, content = await send()
+                return status, content
+            return await self.rate_limiter.request(send)
@@ -0,0 +1,78 @@
+import csv
+import json
+import os.path
+
+from minty_py.minty_types import NFTOptions
+
+ASSET_EXTENSIONS = {
+    ".gif",
+    ".jpeg",
+    ".jpg",
+    ".mp3",
+    ".mp4",
+    ".png",
+    ".svg",
+    ".webm",
+    ".webp",
+}
+
+
+def load_nft_options(source: str, owner: str = None, description: str = ""):
+    """
+    Yields NFTOptions for a batch mint. source may be:
+     - a directory - every asset file in it is minted, named after the file
+     - a .csv file with name, description, owner and image_path columns, and
+       optionally animation_url and JSON encoded attributes and properties
+     - a .jsonl file with one object per line using the same keys
+
+    Relative image paths in a manifest are resolved against the manifest's directory.
+    owner and description are used for entries that don't provide their own.
+    """
+    if os.path.isdir(source):
+        for filename in sorted(os.listdir(source)):
+            name, extension = os.path.splitext(filename)
+            if extension.lower() not in ASSET_EXTENSIONS:
+                continue
+            yield NFTOptions(
+                name=name,
+                description=description,
+                owner=owner,
+                image_path=os.path.join(source, filename),
+            )
+        return
+
+    if source.endswith(".csv"):
+        rows = _read_csv(source)
+    elif source.endswith(".jsonl"):
+        rows = _read_jsonl(source)
+    else:
+        raise ValueError(f"Unsupported manifest type: {source}")
+
+    base_dir = os.path.dirname(source)
+    for entry_number, row in enumerate(rows, start=1):
+        if not row.get("image_path"):
+            raise ValueError(f"{source}: entry {entry_number} is missing image_path")
+        yield NFTOptions(
+            name=row.get("name") or os.path.basename(row["image_path"]),
+            description=row.get("description") or description,
+            owner=row.get("owner") or owner,
+            image_path=os.path.join(base_dir, row["image_path"]),
+            attributes=row.get("attributes"),
+            properties=row.get("properties"),
+            animation_url=row.get("animation_url") or None,
+        )
+
+
+def _read_csv(path):
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            for key in ("attributes", "properties"):
+                row[key] = json.loads(row[key]) if row.get(key) else None
+            yield row
+
+
+def _read_jsonl(path):
+    with open(path, "r") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
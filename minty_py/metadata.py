@@ -0,0 +1,291 @@
+"""
+NFT metadata (the ERC-721 metadata JSON plus OpenSea's attributes), validated
+against a schema compiled once at import, and serialized canonically: sorted
+keys, no whitespace, UTF-8, so the same metadata always gets the same CID.
+orjson is used when it's installed and gives byte for byte the same output.
+"""
+import json
+import math
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+URI_SCHEMES = ("ipfs://", "https://", "http://", "ar://", "data:")
+
+ATTRIBUTE_SCHEMA = {
+    "type": "object",
+    "required": ["value"],
+    "properties": {
+        "trait_type": {"type": "string"},
+        "value": {"type": ["string", "number", "boolean"]},
+        "display_type": {
+            "enum": ["number", "boost_number", "boost_percentage", "date"]
+        },
+        "max_value": {"type": "number"},
+    },
+    "additionalProperties": False,
+}
+
+METADATA_SCHEMA = {
+    "type": "object",
+    "required": ["name", "image"],
+    "properties": {
+        "name": {"type": "string", "minLength": 1},
+        "description": {"type": "string"},
+        "image": {"type": "string", "format": "uri"},
+        "animation_url": {"type": "string", "format": "uri"},
+        "thumbnail": {"type": "string", "format": "uri"},
+        "attributes": {"type": "array", "items": ATTRIBUTE_SCHEMA},
+        "properties": {"type": "object"},
+    },
+    "additionalProperties": False,
+}
+
+
+class MetadataError(ValueError):
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__("Invalid NFT metadata: " + "; ".join(errors))
+
+
+class NFTMetadata:
+    """
+    The metadata JSON of one token. Built from the NFTOptions it was minted with
+    (name, description, attributes, properties, animation_url) and the URIs of its
+    uploaded files.
+    """
+
+    __slots__ = (
+        "name",
+        "description",
+        "image",
+        "animation_url",
+        "thumbnail",
+        "attributes",
+        "properties",
+    )
+
+    def __init__(
+        self,
+        name,
+        image,
+        description="",
+        animation_url=None,
+        thumbnail=None,
+        attributes=None,
+        properties=None,
+    ):
+        self.name = name
+        self.description = description
+        self.image = image
+        self.animation_url = animation_url
+        self.thumbnail = thumbnail
+        self.attributes = attributes
+        self.properties = properties
+
+    @classmethod
+    def from_options(cls, options, image, thumbnail=None):
+        return cls(
+            name=options.name,
+            description=options.description,
+            image=image,
+            animation_url=options.animation_url,
+            thumbnail=thumbnail,
+            attributes=options.attributes,
+            properties=options.properties,
+        )
+
+    def to_dict(self):
+        """Returns the metadata as a dict, leaving out fields that aren't set."""
+        metadata = {}
+        for field in self.__slots__:
+            value = getattr(self, field)
+            if value is not None:
+                metadata[field] = value
+        return metadata
+
+    def validate(self):
+        validate_metadata(self.to_dict())
+        return self
+
+    def to_json(self):
+        return canonical_json(self.to_dict())
+
+
+def validate_metadata(metadata):
+    """Raises a MetadataError listing everything wrong with a metadata dict."""
+    errors = []
+    _validate_metadata(metadata, "metadata", errors)
+    if errors:
+        raise MetadataError(errors)
+
+
+def canonical_json(value):
+    """
+    Serializes value as canonical JSON bytes. Floats must be finite and short
+    enough to write without an exponent, which validate_metadata checks, as the
+    two backends write exponents differently.
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(value, option=orjson.OPT_SORT_KEYS)
+        except TypeError:
+            # e.g. integers over 64 bits, which the json module handles
+            pass
+    return json.dumps(
+        value, sort_keys=True, separators=(",", ":"), ensure_ascii=False
+    ).encode()
+
+
+# --- schema compiler --- #
+
+
+def compile_schema(schema):
+    """
+    Compiles a JSON Schema subset (type, enum, required, properties,
+    additionalProperties, items, minLength and format: uri) into a function
+    validate(value, path, errors) that appends a message to errors for every
+    problem found.
+    """
+    checks = []
+
+    if "type" in schema:
+        types = schema["type"]
+        types = (types,) if isinstance(types, str) else tuple(types)
+        type_checks = [TYPE_CHECKS[name] for name in types]
+        expected = " or ".join(types)
+        if len(type_checks) == 1:
+            is_type = type_checks[0]
+        else:
+
+            def is_type(value):
+                return any(type_check(value) for type_check in type_checks)
+
+        def check_type(value, path, errors):
+            if not is_type(value):
+                errors.append(f"{path} must be a {expected}")
+                return False
+            return True
+
+        checks.append(check_type)
+
+    if "enum" in schema:
+        allowed = schema["enum"]
+
+        def check_enum(value, path, errors):
+            if value not in allowed:
+                errors.append(f"{path} must be one of {', '.join(map(str, allowed))}")
+                return False
+            return True
+
+        checks.append(check_enum)
+
+    if "minLength" in schema:
+        min_length = schema["minLength"]
+
+        def check_min_length(value, path, errors):
+            if len(value) < min_length:
+                errors.append(f"{path} is shorter than {min_length} characters")
+            return True
+
+        checks.append(check_min_length)
+
+    if schema.get("format") == "uri":
+
+        def check_uri(value, path, errors):
+            if not value.startswith(URI_SCHEMES):
+                errors.append(f"{path} must be a URI, e.g. ipfs://<cid>/<name>")
+            return True
+
+        checks.append(check_uri)
+
+    if schema.get("type") == "object":
+        required = schema.get("required", ())
+        properties = {
+            key: compile_schema(subschema)
+            for key, subschema in schema.get("properties", {}).items()
+        }
+        closed = schema.get("additionalProperties", True) is False
+
+        def check_object(value, path, errors):
+            for key in required:
+                if key not in value:
+                    errors.append(f"{path}.{key} is required")
+            for key, item in value.items():
+                validate = properties.get(key)
+                if validate is not None:
+                    validate(item, f"{path}.{key}", errors)
+                elif closed:
+                    errors.append(f"{path}.{key} is not a known field")
+                else:
+                    _check_json(item, f"{path}.{key}", errors)
+            return True
+
+        checks.append(check_object)
+
+    if schema.get("type") == "array" and "items" in schema:
+        validate_item = compile_schema(schema["items"])
+
+        def check_items(value, path, errors):
+            for i, item in enumerate(value):
+                validate_item(item, f"{path}[{i}]", errors)
+            return True
+
+        checks.append(check_items)
+
+    if len(checks) == 1:
+        return checks[0]
+
+    def validate(value, path, errors):
+        # later checks assume the earlier ones passed, e.g. that it's a string
+        for check in checks:
+            if not check(value, path, errors):
+                return
+
+    return validate
+
+
+def _is_number(value):
+    if isinstance(value, bool):
+        return False
+    return isinstance(value, int) or (isinstance(value, float) and _is_canonical(value))
+
+
+def _is_canonical(value):
+    return math.isfinite(value) and "e" not in repr(value)
+
+
+TYPE_CHECKS = {
+    "string": lambda value: isinstance(value, str),
+    "integer": lambda value: isinstance(value, int) and not isinstance(value, bool),
+    "number": _is_number,
+    "boolean": lambda value: isinstance(value, bool),
+    "array": lambda value: isinstance(value, (list, tuple)),
+    "object": lambda value: isinstance(value, dict),
+}
+
+
+def _check_json(value, path, errors):
+    """Checks a free form value (e.g. in properties) serializes canonically."""
+    if value is None or isinstance(value, (str, bool, int)):
+        return
+    if isinstance(value, float):
+        if not _is_canonical(value):
+            errors.append(
+                f"{path} must be a finite number written without an exponent"
+            )
+    elif isinstance(value, (list, tuple)):
+        for i, item in enumerate(value):
+            _check_json(item, f"{path}[{i}]", errors)
+    elif isinstance(value, dict):
+        for key, item in value.items():
+            if not isinstance(key, str):
+                errors.append(f"{path} keys must be strings")
+            _check_json(item, f"{path}.{key}", errors)
+    else:
+        errors.append(f"{path} must be JSON, not a {type(value).__name__}")
+
+
+_validate_metadata = compile_schema(METADATA_SCHEMA)
@@ -0,0 +1,164 @@
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+QUANTILES = (0.5, 0.95, 0.99)
+OPENMETRICS_CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+
+class Metrics:
+    """
+    Process wide counters and per-stage timings. Stages are timed with span (or
+    timed, for an awaitable) and keep their count, total and the last max_samples
+    durations for quantiles. Counters only go up.
+    """
+
+    def __init__(self, prefix: str = "minty", max_samples: int = 1000):
+        self.prefix = prefix
+        self.max_samples = max_samples
+        self.started_at = time.perf_counter()
+        self.counters = {}
+        self.stages = {}  # stage -> [count, total seconds, max seconds, samples]
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self.started_at = time.perf_counter()
+            self.counters = {}
+            self.stages = {}
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            timing = self.stages.get(stage)
+            if timing is None:
+                samples = deque(maxlen=self.max_samples)
+                timing = self.stages[stage] = [0, 0.0, 0.0, samples]
+            timing[0] += 1
+            timing[1] += seconds
+            timing[2] = max(timing[2], seconds)
+            timing[3].append(seconds)
+
+    @contextmanager
+    def span(self, stage):
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started_at)
+
+    async def timed(self, stage, awaitable):
+        with self.span(stage):
+            return await awaitable
+
+    def summary(self):
+        """Returns {stage: {count, total, mean, p50, p95, p99, max}} in seconds."""
+        with self._lock:
+            stages = {
+                stage: (count, total, longest, sorted(samples))
+                for stage, (count, total, longest, samples) in self.stages.items()
+            }
+        return {
+            stage: {
+                "count": count,
+                "total": total,
+                "mean": total / count,
+                **{f"p{int(q * 100)}": _quantile(samples, q) for q in QUANTILES},
+                "max": longest,
+            }
+            for stage, (count, total, longest, samples) in stages.items()
+        }
+
+    def report(self):
+        """Formats the stage timings and counters as a table for --profile."""
+        lines = [
+            f"{'stage':<32}{'calls':>8}{'total s':>10}{'mean ms':>10}"
+            f"{'p95 ms':>10}{'max ms':>10}"
+        ]
+        for stage, timing in sorted(self.summary().items()):
+            lines.append(
+                f"{stage:<32}{timing['count']:>8}{timing['total']:>10.3f}"
+                f"{timing['mean'] * 1000:>10.1f}{timing['p95'] * 1000:>10.1f}"
+                f"{timing['max'] * 1000:>10.1f}"
+            )
+        for name, value in sorted(self.counters.items()):
+            lines.append(f"{name:<32}{value:>8}")
+        lines.append(f"wall time {time.perf_counter() - self.started_at:.3f}s")
+        # concurrent stages overlap, so their totals can add up to more than that
+        return "\n".join(lines)
+
+    def render(self, openmetrics: bool = False):
+        """
+        Renders everything in the Prometheus text format, or in OpenMetrics if
+        openmetrics (as served from /metrics).
+        """
+        lines = []
+        stage_metric = f"{self.prefix}_stage_seconds"
+        lines.append(f"# HELP {stage_metric} Time spent in each stage.")
+        lines.append(f"# TYPE {stage_metric} summary")
+        for stage, timing in sorted(self.summary().items()):
+            label = f'stage="{_escape(stage)}"'
+            for q in QUANTILES:
+                value = timing[f"p{int(q * 100)}"]
+                lines.append(f'{stage_metric}{{{label},quantile="{q}"}} {value}')
+            lines.append(f"{stage_metric}_sum{{{label}}} {timing['total']}")
+            lines.append(f"{stage_metric}_count{{{label}}} {timing['count']}")
+
+        for name, value in sorted(self.counters.items()):
+            metric = f"{self.prefix}_{name}"
+            # OpenMetrics names the counter family without the _total suffix
+            family = metric if openmetrics else metric + "_total"
+            lines.append(f"# TYPE {family} counter")
+            lines.append(f"{metric}_total {value}")
+
+        if openmetrics:
+            lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path):
+        """
+        Writes the Prometheus text format to path, for node_exporter's textfile
+        collector. The file is replaced atomically so it is never read half written.
+        """
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+
+METRICS = Metrics()
+
+
+async def rpc_metrics_middleware(make_request, w3):
+    """web3 middleware counting JSON-RPC requests and timing each as rpc.<method>."""
+
+    async def middleware(method, params):
+        METRICS.count("rpc_calls")
+        with METRICS.span("rpc." + method):
+            return await make_request(method, params)
+
+    return middleware
+
+
+def instrument_web3(w3):
+    """Adds rpc_metrics_middleware to w3, once."""
+    if "minty_metrics" not in w3.middleware_onion:
+        w3.middleware_onion.add(rpc_metrics_middleware, name="minty_metrics")
+
+
+# --- helpers --- #
+
+
+def _quantile(samples, q):
+    if not samples:
+        return 0.0
+    return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
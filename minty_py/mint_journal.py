@@ -0,0 +1,166 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import asdict
+
+# the stages a manifest entry goes through, in order
+NEW = 0
+HASHED = 1
+ASSET_UPLOADED = 2
+METADATA_UPLOADED = 3
+SENT = 4
+CONFIRMED = 5
+
+
+class MintJournal:
+    """
+    Write-ahead record of a batch mint in SQLite, one row per manifest entry with
+    the last stage it finished: hashed (the asset CID is known), asset uploaded,
+    metadata uploaded, sent (with the nonce, transaction and every hash sent for
+    it) and confirmed. A rerun with the same journal skips the finished stages.
+
+    A transaction is recorded after it's signed and before it's sent, so every
+    version that may have been mined is known after a crash, and each entry is
+    minted exactly once. Commits are synced to disk (WAL mode, synchronous=FULL).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(
+            """
+            PRAGMA journal_mode = WAL;
+            PRAGMA synchronous = FULL;
+            CREATE TABLE IF NOT EXISTS entries (
+                entry INTEGER PRIMARY KEY,
+                options TEXT NOT NULL,
+                stage INTEGER NOT NULL,
+                asset_cid TEXT,
+                nft TEXT,
+                nonce INTEGER,
+                transaction_json TEXT,
+                tx_hashes TEXT,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS entries_stage ON entries (stage);
+            """
+        )
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def load(self, options_list):
+        """
+        Returns the row for each of options_list, numbering entries from 1, and
+        adds rows for new entries. Raises if an entry's options changed since it
+        was journaled, as its uploads and mint would no longer match.
+        """
+        with self._lock, self._db:
+            rows = {
+                row["entry"]: row
+                for row in map(
+                    _to_dict, self._db.execute("SELECT * FROM entries").fetchall()
+                )
+            }
+            new_rows = []
+            for entry, options in enumerate(options_list, 1):
+                options_json = json.dumps(asdict(options), sort_keys=True)
+                row = rows.get(entry)
+                if row is None:
+                    new_rows.append((entry, options_json, NEW, time.time()))
+                elif row["options"] != options_json:
+                    raise Exception(
+                        f"Entry {entry} doesn't match the journal {self.path}, was "
+                        "the manifest changed?"
+                    )
+            self._db.executemany(
+                "INSERT INTO entries (entry, options, stage, updated_at) "
+                "VALUES (?, ?, ?, ?)",
+                new_rows,
+            )
+        return [rows.get(entry) for entry in range(1, len(options_list) + 1)]
+
+    def get(self, entry):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT * FROM entries WHERE entry = ?", (entry,)
+            ).fetchone()
+        return _to_dict(row) if row else None
+
+    def sent(self):
+        """Returns the rows whose transactions aren't known to be mined."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT * FROM entries WHERE stage = ? ORDER BY nonce", (SENT,)
+            ).fetchall()
+        return [_to_dict(row) for row in rows]
+
+    def record(self, entry, stage, **fields):
+        """
+        Moves entry to stage, setting any of asset_cid, nft, nonce, transaction
+        and tx_hashes given. Going back before SENT clears the transaction.
+        """
+        columns = {"stage": stage, "updated_at": time.time()}
+        if stage < SENT:
+            columns.update(nonce=None, transaction_json=None, tx_hashes=None)
+        for key, value in fields.items():
+            if key == "asset_cid":
+                columns["asset_cid"] = value
+            elif key == "nonce":
+                columns["nonce"] = value
+            elif key == "transaction":
+                columns["transaction_json"] = json.dumps(value)
+            elif key in ("nft", "tx_hashes"):
+                columns[key] = json.dumps(value)
+            else:
+                raise ValueError(f"Unknown journal field: {key}")
+        assignments = ", ".join(f"{column} = ?" for column in columns)
+        with self._lock, self._db:
+            self._db.execute(
+                f"UPDATE entries SET {assignments} WHERE entry = ?",
+                (*columns.values(), entry),
+            )
+
+    def record_sent(self, entry, transaction, tx_hash):
+        """Records a signed (or re-signed, with higher fees) mint transaction."""
+        with self._lock, self._db:
+            (tx_hashes,) = self._db.execute(
+                "SELECT tx_hashes FROM entries WHERE entry = ?", (entry,)
+            ).fetchone()
+            tx_hashes = json.loads(tx_hashes) if tx_hashes else []
+            tx_hashes.append(tx_hash)
+            self._db.execute(
+                "UPDATE entries SET stage = ?, nonce = ?, transaction_json = ?, "
+                "tx_hashes = ?, updated_at = ? WHERE entry = ?",
+                (
+                    SENT,
+                    transaction["nonce"],
+                    json.dumps(transaction),
+                    json.dumps(tx_hashes),
+                    time.time(),
+                    entry,
+                ),
+            )
+
+
+# --- helpers --- #
+
+
+def _to_dict(row):
+    (entry, options, stage, asset_cid, nft, nonce, transaction, tx_hashes, _) = row
+    return {
+        "entry": entry,
+        "options": options,
+        "stage": stage,
+        "asset_cid": asset_cid,
+        "nft": json.loads(nft) if nft else None,
+        "nonce": nonce,
+        "transaction": json.loads(transaction) if transaction else None,
+        "tx_hashes": json.loads(tx_hashes) if tx_hashes else [],
+    }
@@ -1,55 +1,187 @@
 import asyncio
 import json
-from pathlib import Path
+import os.path
+import pathlib
+import tempfile
 
-import aiofiles
-import aiohttp
-from web3 import AsyncHTTPProvider, AsyncWeb3
+from hexbytes import HexBytes
 
+from minty_py.config import local_info
 from minty_py.config.local_info import (
     INFURA_IPFS_API_KEY,
     INFURA_IPFS_API_KEY_SECRET,
     INFURA_IPFS_ENDPOINT,
-    INFURA_SEPOLIA_URL,
+    SECRET_KEY,
 )
-from minty_py.deploy import load_deployment_info
+from minty_py.car import CARWriter
+from minty_py.cid import (
+    build_directory,
+    build_file,
+    cid_to_str,
+    split_chunks,
+    wrapped_file_cid,
+    wrapped_file_cid_from_path,
+)
+from minty_py.cid_cache import CIDCache
+from minty_py.gateways import GatewayPool, encode_base64_stream
+from minty_py.indexer import TransferIndexer
 from minty_py.ipfs_client import IPFSClient
+from minty_py.metadata import NFTMetadata, canonical_json
+from minty_py.metrics import METRICS, instrument_web3
+from minty_py.mint_journal import ASSET_UPLOADED, CONFIRMED, HASHED, METADATA_UPLOADED
 from minty_py.minty_types import NFTOptions
+from minty_py.ratelimit import shared_limiter
+from minty_py.receipts import ReceiptTracker
+from minty_py.registry import DEFAULT_CONTRACT_NAME, REGISTRY
+from minty_py.rpc_batch import JSONRPCBatcher, RPCError
+from minty_py.signing import WatchOnlyAccount, read_signed, write_unsigned
+from minty_py.ttl_cache import TTLCache
+from minty_py.tx_manager import SendError, TransactionManager
+from minty_py.wallets import WalletPool
+
+IPFS_GATEWAY_URL = "https://ipfs.io/ipfs/"
+IPFS_GATEWAYS = getattr(local_info, "IPFS_GATEWAYS", [IPFS_GATEWAY_URL])
+# keys of the accounts mints are spread over, the first being the main account
+SECRET_KEYS = getattr(local_info, "SECRET_KEYS", None) or [SECRET_KEY]
+ZERO_ADDRESS = "0x0000000000000000000000000000000000000000"
 
+_MISSING = object()
 
-async def make_minty():
-    m = await Minty()
+
+async def make_minty(**kwargs):
+    m = await Minty(**kwargs)
     return m
 
 
 class Minty:
-    def __init__(self):
+    def __init__(
+        self,
+        w3=None,
+        ipfs=None,
+        deploy_info=None,
+        private_key=None,
+        use_cache=True,
+        owner_cache_ttl=15,
+        max_in_flight=4,
+        index_path=None,
+        gateway_urls=None,
+        preprocessor=None,
+        chain_id=None,
+        contract_name=DEFAULT_CONTRACT_NAME,
+        registry=REGISTRY,
+        signer=None,
+        address=None,
+        private_keys=None,
+    ):
+        """
+        Everything is built from minty_py.config.local_info on first await unless
+        passed in, e.g. an AsyncWeb3 connected to a local test chain.
+        use_cache=False disables the on-disk CID cache for uploads.
+        Token owners are cached for owner_cache_ttl seconds, and at most
+        max_in_flight batched RPC requests run at once.
+        index_path overrides where the Transfer index for the contract is stored.
+        gateway_urls are the IPFS gateways metadata and assets are read from,
+        defaulting to local_info.IPFS_GATEWAYS or else the public ipfs.io gateway.
+        With a preprocess.Preprocessor, images are normalized before they're minted.
+        Unless passed in, the w3 and deployment are the registry's (a
+        registry.DeploymentRegistry) for chain_id and contract_name, so every Minty
+        on a network shares one provider and every deployment is read only once.
+        With a signing.SigningPool signer, batches of transactions are signed in
+        parallel. With an address instead of a private key, transactions can only be
+        built and exported, to be signed offline.
+        Mints are spread over the accounts of private_keys (by default
+        local_info.SECRET_KEYS, or just private_key or SECRET_KEY) by a
+        wallets.WalletPool. The first is the main account, which does everything
+        else and is the one signer signs for; the others sign inline.
+        """
         self._initialized = False
+        self.account = None
+        self.address = address
+        self.batcher = None
+        self.chain_id = chain_id
         self.contract = None
-        self.deploy_info = None
-        self.ipfs = None
-        self.w3 = None
+        self.contract_name = contract_name
+        self.deploy_info = deploy_info
+        self.gateway_urls = gateway_urls or IPFS_GATEWAYS
+        self.gateways = None
+        self.index_path = index_path
+        self.indexer = None
+        self.ipfs = ipfs
+        self.ipfs_json = TTLCache()
+        self.max_in_flight = max_in_flight
+        self.minters = None
+        self.owners = TTLCache(ttl=owner_cache_ttl)
+        self.preprocessor = preprocessor
+        self.private_keys = private_keys or (
+            [private_key] if private_key else SECRET_KEYS
+        )
+        self.private_key = self.private_keys[0]
+        self.registry = registry
+        self.signer = signer
+        self.token_uris = TTLCache()
+        self.tx_manager = None
+        self.use_cache = use_cache
+        self.w3 = w3
 
     def __await__(self):
         if self._initialized:
             return
 
         async def closure():
-            self.deploy_info = await load_deployment_info()
+            if self.deploy_info is None:
+                self.deploy_info = await self.registry.deployment(
+                    self.chain_id, self.contract_name
+                )
+            address = self.deploy_info["contract_address"]
 
-            abi, address = (
-                self.deploy_info["abi"],
-                self.deploy_info["contract_address"],
+            if self.w3 is None:
+                self.w3 = await self.registry.web3(self.chain_id)
+            instrument_web3(self.w3)
+            self.contract = self.registry.contract(self.w3, self.deploy_info)
+            self.batcher = JSONRPCBatcher(self.w3, max_in_flight=self.max_in_flight)
+            self.gateways = GatewayPool(self.gateway_urls)
+            self.indexer = TransferIndexer(
+                self.w3,
+                address,
+                start_block=self.deploy_info["tx_receipt"].get("blockNumber", 0),
+                path=self.index_path,
             )
-            self.w3 = AsyncWeb3(AsyncHTTPProvider(INFURA_SEPOLIA_URL))
-            # breakpoint()
-            self.contract = self.w3.eth.contract(abi=abi, address=address)
-
-            self.ipfs = IPFSClient(
-                INFURA_IPFS_API_KEY,
-                INFURA_IPFS_API_KEY_SECRET,
-                INFURA_IPFS_ENDPOINT,
+
+            # every account's receipts are waited for by one tracker
+            receipts = ReceiptTracker(self.w3)
+            if self.address is not None:
+                accounts = [WatchOnlyAccount(self.address)]
+            else:
+                accounts = [
+                    self.w3.eth.account.from_key(private_key)
+                    for private_key in self.private_keys
+                ]
+            self.account = accounts[0]
+            signer_address = getattr(self.signer, "address", None)
+            if signer_address not in (None, self.account.address):
+                raise Exception(
+                    f"The signer signs for {signer_address}, but the main account "
+                    f"is {self.account.address}"
+                )
+            self.minters = WalletPool(
+                TransactionManager(
+                    self.w3,
+                    account,
+                    signer=self.signer if account is self.account else None,
+                    receipts=receipts,
+                )
+                for account in accounts
             )
+            self.tx_manager = self.minters.tx_managers[0]
+
+            if self.ipfs is None:
+                self.ipfs = IPFSClient(
+                    INFURA_IPFS_API_KEY,
+                    INFURA_IPFS_API_KEY_SECRET,
+                    INFURA_IPFS_ENDPOINT,
+                    cache=CIDCache() if self.use_cache else None,
+                    rate_limiter=shared_limiter(INFURA_IPFS_ENDPOINT),
+                )
 
             self._initialized = True
 
@@ -57,60 +189,537 @@ class Minty:
 
         return closure().__await__()
 
+    async def close(self):
+        await self.ipfs.close()
+        await self.batcher.close()
+        await self.gateways.close()
+        await self.indexer.close()
+        await self.minters.close()
+        if self.preprocessor is not None:
+            await asyncio.to_thread(self.preprocessor.close)
+        if self.signer is not None:
+            await asyncio.to_thread(self.signer.close)
+        # another Minty still using one of its providers just opens a new session
+        await self.registry.close()
+
     async def create_nft_from_asset_file(self, options: NFTOptions):
-        async with aiofiles.open(options.image_path, mode="rb") as f:
-            content = await f.read()
-            breakpoint()
-        return await self.create_nft_from_asset_data(content, options)
-
-    async def create_nft_from_asset_data(self, content, options):
-        basename = Path(options.image_path)
-
-        ipfs_path = "/nft/" + basename
-        breakpoint()
-        asset_cid = await self.ipfs.add(
-            {"path": ipfs_path, "content": content}, ipfs_add_options
+        nft = await self.upload_nft_from_asset_file(options)
+        nft["tokenId"] = await self.mint_token(nft["ownerAddress"], nft["metadataURI"])
+        return nft
+
+    async def create_nft_from_asset_data(self, content, options: NFTOptions):
+        nft = await self.upload_nft_data(content, options)
+        nft["tokenId"] = await self.mint_token(nft["ownerAddress"], nft["metadataURI"])
+        return nft
+
+    async def create_nfts(
+        self, options_iter, concurrency: int = 8, journal=None, unsigned_path=None
+    ):
+        """
+        Mints one NFT per NFTOptions in options_iter.
+
+        Asset and metadata uploads run concurrently (at most `concurrency` at a time),
+        then every mintToken transaction is signed and sent back to back with locally
+        assigned nonces, and the receipts are collected together at the end.
+        Results are returned in the same order as options_iter.
+
+        With a mint_journal.MintJournal, each stage a token finishes is recorded, and
+        running again with the same journal and options_iter only does the work that
+        was left unfinished: transactions already sent are reconciled with the chain
+        rather than sent again.
+
+        With unsigned_path, nothing is minted: the mint transactions are written there
+        unsigned instead, to be signed offline with signing.sign_file.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        options_list = list(options_iter)
+        resumed, rows = {}, [None] * len(options_list)
+        if journal is not None:
+            # checks the options match the journal before acting on what it says was
+            # sent, then reads the rows again as reconciling them updates them
+            await asyncio.to_thread(journal.load, options_list)
+            resumed = await self.reconcile_journal(journal)
+            rows = await asyncio.to_thread(journal.load, options_list)
+
+        async def upload(entry, options, row):
+            if row is not None and row["stage"] >= METADATA_UPLOADED:
+                return row["nft"]
+            # preprocessing isn't held to the upload limit, so every core is kept
+            # busy while the images that are done get uploaded
+            processed = await self.preprocess(options)
+            async with semaphore:
+                if processed is not None:
+                    nft = await self.upload_preprocessed_nft(processed, options)
+                else:
+                    asset_cid = row and row["asset_cid"]
+                    if not asset_cid:
+                        asset_cid = await self.asset_file_cid(options)
+                        await _record(journal, entry, HASHED, asset_cid=asset_cid)
+                    nft = await self.upload_nft(
+                        asset_cid, options, journal=journal, entry=entry
+                    )
+            await _record(journal, entry, METADATA_UPLOADED, nft=nft)
+            return nft
+
+        nfts = await asyncio.gather(
+            *(
+                upload(entry, options, row)
+                for entry, (options, row) in enumerate(zip(options_list, rows), 1)
+            )
+        )
+        if unsigned_path is not None:
+            await self.export_mint_transactions(nfts, unsigned_path)
+        else:
+            await self.mint_all(nfts, journal=journal, resumed=resumed)
+        return nfts
+
+    async def create_collection(self, options_iter, car_path=None):
+        """
+        Mints one NFT per NFTOptions in options_iter, like create_nfts, but packs
+        every asset and metadata file into one CAR file that is imported with a
+        single request instead of two uploads per token. In the CAR's root:
+         - assets/<n><ext> is the nth asset, counting from 1 in options_iter order
+         - <n>.json is the nth token's metadata, so its URI is ipfs://<root>/<n>.json
+        The CAR is kept at car_path if given, otherwise it's a temporary file.
+        Each directory is one block of at most car.MAX_BLOCK_SIZE, as they aren't
+        sharded, which limits a collection to about 18,000 tokens.
+        """
+        if car_path is None:
+            fd, path = tempfile.mkstemp(suffix=".car")
+            os.close(fd)
+        else:
+            path = car_path
+        try:
+            with METRICS.span("collection.pack"):
+                root_cid, nfts = await self.pack_collection(options_iter, path)
+            with METRICS.span("upload.car"):
+                imported_cid = await self.ipfs.dag_import(path)
+            verify_cid(root_cid, imported_cid)
+            self.gateways.uploaded.add(root_cid)
+        finally:
+            if car_path is None:
+                os.remove(path)
+
+        await self.mint_all(nfts)
+        return nfts
+
+    async def pack_collection(self, options_iter, car_path):
+        """
+        Writes the CAR for create_collection to car_path, streaming the assets in
+        from disk. Returns the root CID and the NFTs to mint, without tokenIds.
+        """
+        writer = CARWriter(car_path)
+        root = None
+        try:
+            options_list = list(options_iter)
+            asset_names = [
+                f"{n}{os.path.splitext(options.image_path)[1]}"
+                for n, options in enumerate(options_list, 1)
+            ]
+            writer.check_directory(asset_names)
+            writer.check_directory(
+                ["assets"] + [f"{n}.json" for n in range(1, len(options_list) + 1)]
+            )
+
+            def pack_assets():
+                entries = []
+                for name, options in zip(asset_names, options_list):
+                    entries.append((name, writer.add_file(options.image_path)))
+                return entries, writer.add_directory(entries)
+
+            # the assets directory is finished first, as the metadata refers to it
+            asset_entries, assets_node = await asyncio.to_thread(pack_assets)
+            assets_cid = cid_to_str(assets_node.cid)
+
+            default_owner = await self.default_owner_address()
+            nfts, entries = [], [("assets", assets_node)]
+            for n, options in enumerate(options_list, 1):
+                asset_uri = f"ipfs://{assets_cid}/{asset_entries[n - 1][0]}"
+                metadata = await self.make_nft_metadata(asset_uri, options)
+                metadata_json = canonical_json(metadata)
+                entries.append((f"{n}.json", writer.add_bytes(metadata_json)))
+                nfts.append(
+                    {
+                        "ownerAddress": options.owner or default_owner,
+                        "metadata": metadata,
+                        "assetURI": asset_uri,
+                    }
+                )
+            root = writer.add_directory(entries).cid
+        finally:
+            writer.close(root)
+
+        root_cid = cid_to_str(root)
+        for n, nft in enumerate(nfts, 1):
+            nft["metadataURI"] = f"ipfs://{root_cid}/{n}.json"
+            nft["assetGatewayURL"] = self.gateway_url(nft["assetURI"])
+            nft["metadataGatewayURL"] = self.gateway_url(nft["metadataURI"])
+        return root_cid, nfts
+
+    async def mint_all(self, nfts, journal=None, resumed=None):
+        """
+        Sends a mintToken transaction for each uploaded NFT back to back, with
+        locally assigned nonces, spread over the minter accounts, then sets each
+        one's tokenId from its receipt. An NFT whose mint can't be sent or fails
+        gets an "error" entry instead, without holding up the others.
+
+        With a journal, the nth NFT is entry n: its transaction is recorded before
+        it's sent and its tokenId once it's mined. NFTs that already have a tokenId
+        are skipped, and resumed maps entries to the PendingTransactions that
+        reconcile_journal picked up, which are waited on instead of sending again.
+        """
+        resumed = resumed or {}
+
+        async def confirm(entry, nft, pending):
+            receipt = await self.minters.wait(pending)
+            nft["tokenId"] = self.token_id_from_receipt(receipt)
+            await _record(journal, entry, CONFIRMED, nft=nft)
+
+        # waits start as soon as each transaction is sent, which frees its pending
+        # slot in its account's transaction manager once it is mined
+        waits, waited, unsent = [], [], []
+
+        def start_wait(entry, nft, pending):
+            waits.append(asyncio.create_task(confirm(entry, nft, pending)))
+            waited.append(nft)
+
+        async def send(batch):
+            error = None
+            try:
+                pendings = await self.minters.send_many(
+                    [
+                        self.contract.functions.mintToken(
+                            nft["ownerAddress"], nft["metadataURI"]
+                        )
+                        for _, nft in batch
+                    ],
+                    on_signed=[_journal_sent(journal, entry) for entry, _ in batch],
+                )
+            except SendError as e:
+                error, pendings = e, e.pendings
+            except Exception as e:
+                error, pendings = e, [None] * len(batch)
+
+            failed = []
+            for (entry, nft), pending in zip(batch, pendings):
+                if pending is None:
+                    failed.append((entry, nft))
+                else:
+                    start_wait(entry, nft, pending)
+            if error is None:
+                return
+            if len(failed) == 1:
+                failed[0][1]["error"] = str(error)
+                return
+            # one bad mint fails the rest of the send, so find it by sending the ones
+            # that weren't sent one by one
+            for item in failed:
+                await send([item])
+
+        for entry, nft in enumerate(nfts, 1):
+            if journal is not None and "tokenId" in nft:
+                continue
+            if entry in resumed:
+                start_wait(entry, nft, resumed[entry])
+            else:
+                unsent.append((entry, nft))
+
+        # sent in batches that fit the funded minter accounts' free slots, so each
+        # account's share of a batch is signed together; the balances are checked
+        # before each batch is built
+        i = 0
+        while i < len(unsent):
+            room = await self.minters.capacity()
+            in_flight = [wait for wait in waits if not wait.done()]
+            if not room and in_flight:
+                # every funded account is full, so wait for a slot to free up
+                await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                continue
+            batch = unsent[i : i + max(room, 1)]
+            i += len(batch)
+            await send(batch)
+
+        results = await asyncio.gather(*waits, return_exceptions=True)
+        for nft, result in zip(waited, results):
+            if isinstance(result, Exception):
+                nft["error"] = str(result)
+
+    async def export_mint_transactions(self, nfts, path):
+        """
+        Builds a mintToken transaction for each uploaded NFT, with consecutive
+        nonces, and writes them unsigned to path for signing.sign_file.
+        """
+        transactions = []
+        for nft in nfts:
+            transaction = await self.tx_manager.build(
+                self.contract.functions.mintToken(
+                    nft["ownerAddress"], nft["metadataURI"]
+                )
+            )
+            # sent once signed offline, so its nonce mustn't be handed out again
+            await self.tx_manager.nonces.sent(transaction["nonce"])
+            transactions.append(transaction)
+        await asyncio.to_thread(write_unsigned, path, transactions)
+
+    async def send_signed_transactions(self, path):
+        """
+        Sends the transactions in a file written by signing.sign_file and returns
+        their receipts once mined, in nonce order. Each is sent through the
+        transaction manager of the minter account it's from.
+        """
+        signed = await asyncio.to_thread(read_signed, path)
+        tx_managers = [
+            self.minters.tx_manager_for(record["from"]) for record in signed
+        ]
+        waits = []
+        for record, tx_manager in zip(signed, tx_managers):
+            pending = await tx_manager.send_signed(
+                HexBytes(record["raw"]), record["nonce"]
+            )
+            waits.append(asyncio.create_task(tx_manager.wait(pending)))
+        return await asyncio.gather(*waits)
+
+    async def reconcile_journal(self, journal):
+        """
+        Settles the mint transactions an earlier run journaled as sent. Mined ones
+        are recorded as confirmed. Ones that reverted, or whose nonce was taken by
+        another transaction, were never minted and go back to be sent again. The
+        rest are sent again as they were and returned as {entry: PendingTransaction}.
+        """
+        resumed = {}
+        mined_nonces = {}
+        for row in await asyncio.to_thread(journal.sent):
+            entry, transaction = row["entry"], row["transaction"]
+            sender = transaction["from"]
+            if sender not in self.minters.by_address:
+                raise Exception(
+                    f"Entry {entry} of {journal.path} was sent from {sender}, "
+                    "which isn't one of the minter accounts"
+                )
+            tx_manager = self.minters.by_address[sender]
+
+            receipt = await tx_manager.find_receipt(row["tx_hashes"])
+            if receipt is not None and receipt["status"] == 1:
+                nft = row["nft"]
+                nft["tokenId"] = self.token_id_from_receipt(receipt)
+                await _record(journal, entry, CONFIRMED, nft=nft)
+                continue
+            if receipt is None:
+                if sender not in mined_nonces:
+                    mined_nonces[sender] = await self.w3.eth.get_transaction_count(
+                        sender, "latest"
+                    )
+                if row["nonce"] >= mined_nonces[sender]:
+                    resumed[entry] = await tx_manager.resume(
+                        transaction,
+                        row["tx_hashes"],
+                        on_signed=_journal_sent(journal, entry),
+                    )
+                    continue
+            await _record(journal, entry, METADATA_UPLOADED)
+        return resumed
+
+    async def upload_nft_from_asset_file(self, options: NFTOptions):
+        processed = await self.preprocess(options)
+        if processed is not None:
+            return await self.upload_preprocessed_nft(processed, options)
+        return await self.upload_nft(await self.asset_file_cid(options), options)
+
+    async def asset_file_cid(self, options: NFTOptions):
+        basename = os.path.basename(options.image_path)
+        # reading and hashing the file
+        with METRICS.span("asset.hash"):
+            return await asyncio.to_thread(
+                wrapped_file_cid_from_path, basename, options.image_path
+            )
+
+    async def preprocess(self, options: NFTOptions):
+        """
+        Returns the preprocessor's output for options.image_path, or None if there's
+        no preprocessor or the asset isn't an image it can read.
+        """
+        if self.preprocessor is None:
+            return None
+        with METRICS.span("asset.preprocess"):
+            return await self.preprocessor.process(options.image_path)
+
+    async def upload_preprocessed_nft(self, processed, options: NFTOptions):
+        """
+        Uploads a preprocessed asset, its thumbnail and its metadata.json as one
+        directory. The metadata can't name the directory it's in, so it points at
+        the asset and thumbnail by their own CIDs, which are part of it.
+        """
+        asset, thumbnail = processed["asset"], processed["thumbnail"]
+        metadata = await self.make_nft_metadata(
+            cid_to_str(asset["node"].cid),
+            options,
+            thumbnail_uri=cid_to_str(thumbnail["node"].cid),
+        )
+
+        metadata_json = canonical_json(metadata)
+        metadata_node = build_file(split_chunks(metadata_json))
+        directory_cid = cid_to_str(
+            build_directory(
+                [
+                    (asset["name"], asset["node"]),
+                    (thumbnail["name"], thumbnail["node"]),
+                    ("metadata.json", metadata_node),
+                ]
+            ).cid
         )
+        metadata_uri = ensure_ipfs_uri_prefix(directory_cid) + "/metadata.json"
 
+        with METRICS.span("upload.directory"):
+            uploaded_cid = await self.ipfs.add_directory(
+                [
+                    (asset["name"], pathlib.Path(asset["path"])),
+                    (thumbnail["name"], pathlib.Path(thumbnail["path"])),
+                    ("metadata.json", metadata_json),
+                ]
+            )
+        verify_cid(directory_cid, uploaded_cid)
+        self.gateways.uploaded.add(directory_cid)
+
+        owner_address = options.owner
+        if not owner_address:
+            owner_address = await self.default_owner_address()
+
+        return {
+            "ownerAddress": owner_address,
+            "metadata": metadata,
+            "assetURI": metadata["image"],
+            "metadataURI": metadata_uri,
+            "assetGatewayURL": self.gateway_url(metadata["image"]),
+            "metadataGatewayURL": self.gateway_url(metadata_uri),
+        }
+
+    async def upload_nft_data(self, content, options: NFTOptions):
+        basename = os.path.basename(options.image_path)
+        with METRICS.span("asset.hash"):
+            asset_cid = wrapped_file_cid(basename, content)
+        return await self.upload_nft(asset_cid, options, content)
+
+    async def upload_nft(
+        self, asset_cid, options: NFTOptions, content=None, journal=None, entry=None
+    ):
+        """
+        Builds the metadata from the locally computed asset_cid, then uploads the asset
+        and the metadata in parallel, checking both against the local CIDs.
+        The asset is streamed from options.image_path unless content is given.
+        With a journal, the asset upload is recorded for entry, and skipped if an
+        earlier run recorded it.
+        """
+        basename = os.path.basename(options.image_path)
         asset_uri = ensure_ipfs_uri_prefix(asset_cid) + "/" + basename
         metadata = await self.make_nft_metadata(asset_uri, options)
 
-        metadata_cid = await self.ipfs.add(
-            {"path": "/nft/metadata.json", "content": json.dumps(metadata)},
-            ipfs_add_options,
-        )
+        metadata_json = canonical_json(metadata)
+        metadata_cid = wrapped_file_cid("metadata.json", metadata_json)
         metadata_uri = ensure_ipfs_uri_prefix(metadata_cid) + "/metadata.json"
 
-        owner_address = options.get("owner")
+        async def upload_asset():
+            if journal is not None:
+                row = await asyncio.to_thread(journal.get, entry)
+                if row["stage"] >= ASSET_UPLOADED:
+                    return
+            ipfs_path = "/nft/" + basename
+            if content is None:
+                asset_upload = self.ipfs.add_file(ipfs_path, options.image_path)
+            else:
+                asset_upload = self.ipfs.add(ipfs_path, content)
+            verify_cid(asset_cid, await METRICS.timed("upload.asset", asset_upload))
+            self.gateways.uploaded.add(asset_cid)
+            await _record(journal, entry, ASSET_UPLOADED, asset_cid=asset_cid)
+
+        metadata_upload = self.ipfs.add("/nft/metadata.json", metadata_json)
+        _, uploaded_metadata_cid = await asyncio.gather(
+            upload_asset(), METRICS.timed("upload.metadata", metadata_upload)
+        )
+        verify_cid(metadata_cid, uploaded_metadata_cid)
+        self.gateways.uploaded.add(metadata_cid)
+
+        owner_address = options.owner
         if not owner_address:
             owner_address = await self.default_owner_address()
 
-        token_id = await self.mint_token(owner_address, metadata_uri)
-
         return {
-            "tokenId": token_id,
             "ownerAddress": owner_address,
             "metadata": metadata,
             "assetURI": asset_uri,
             "metadataURI": metadata_uri,
-            "assetGatewayURL": make_gateway_url(asset_uri),
-            "metadataGatewayURL": make_gateway_url(metadata_uri),
+            "assetGatewayURL": self.gateway_url(asset_uri),
+            "metadataGatewayURL": self.gateway_url(metadata_uri),
         }
 
-    async def make_nft_metadata(self, asset_uri, options):
-        name, description = options.get("name"), options.get("description")
-        asset_uri = ensure_ipfs_uri_prefix(asset_uri)
-        return {"name": name, "description": description, "image": asset_uri}
+    async def mint_token(self, owner_address, metadata_uri):
+        receipt = await self.minters.transact(
+            self.contract.functions.mintToken(owner_address, metadata_uri)
+        )
+        return self.token_id_from_receipt(receipt)
+
+    async def send_mint_transaction(self, owner_address, metadata_uri, on_signed=None):
+        """
+        Signs and sends a mintToken transaction without waiting for it to be mined.
+        Returns a PendingTransaction to pass to self.minters.wait.
+        """
+        return await self.minters.send(
+            self.contract.functions.mintToken(owner_address, metadata_uri),
+            on_signed=on_signed,
+        )
 
-    async def get_nft(self, token_id, opts):
+    async def transfer_token(self, token_id, to_address):
+        from_address = await self.get_token_owner(token_id)
+        receipt = await self.tx_manager.transact(
+            self.contract.functions.safeTransferFrom(
+                from_address, to_address, int(token_id)
+            )
+        )
+        if receipt["status"] != 1:
+            raise Exception(
+                f"Transfer transaction {receipt['transactionHash'].hex()} failed"
+            )
+        self.owners.set(int(token_id), to_address)
+
+    async def pin_token_data(self, token_id):
         metadata, metadata_uri = await self.get_nft_metadata(token_id)
-        owner_address = await self.get_token_owner(token_id)
-        metadata_gateway_url = make_gateway_url(metadata_uri)
+        asset_uri = metadata["image"]
+
+        await asyncio.gather(
+            self.ipfs.pin_add(strip_ipfs_uri_prefix(asset_uri)),
+            self.ipfs.pin_add(strip_ipfs_uri_prefix(metadata_uri)),
+        )
+        return asset_uri, metadata_uri
+
+    def token_id_from_receipt(self, receipt):
+        if receipt["status"] != 1:
+            raise Exception(f"Mint transaction {receipt['transactionHash'].hex()} failed")
+        transfers = self.contract.events.Transfer().process_receipt(receipt)
+        return transfers[0]["args"]["tokenId"]
+
+    async def default_owner_address(self):
+        return self.account.address
+
+    async def make_nft_metadata(self, asset_uri, options, thumbnail_uri=None):
+        """
+        Returns the metadata dict for options, raising a MetadataError before
+        anything is uploaded or minted if it isn't valid.
+        """
+        if thumbnail_uri is not None:
+            thumbnail_uri = ensure_ipfs_uri_prefix(thumbnail_uri)
+        metadata = NFTMetadata.from_options(
+            options, ensure_ipfs_uri_prefix(asset_uri), thumbnail=thumbnail_uri
+        )
+        return metadata.validate().to_dict()
+
+    async def get_nft(self, token_id, opts):
+        (metadata, metadata_uri), owner_address = await asyncio.gather(
+            self.get_nft_metadata(token_id), self.get_token_owner(token_id)
+        )
         nft = {
             "tokenId": token_id,
             "metadata": metadata,
             "metadataURI": metadata_uri,
-            "metadataGatewayURL": metadata_gateway_url,
+            "metadataGatewayURL": self.gateway_url(metadata_uri),
             "ownerAddress": owner_address,
         }
 
@@ -119,9 +728,215 @@ class Minty:
         )
         if metadata.get("image"):
             nft["assetURI"] = metadata["image"]
-            nft["assetGatewayURL"] = make_gateway_url(metadata["image"])
+            nft["assetGatewayURL"] = self.gateway_url(metadata["image"])
             if fetch_asset:
                 nft["assetDataBase64"] = await self.get_ipfs_base64(metadata["image"])
 
         if fetch_creation_info:
-            nft
+            nft["creationInfo"] = await self.get_creation_info(token_id)
+
+        return nft
+
+    async def get_nfts(self, token_ids, fetch_metadata=True):
+        """
+        Looks up many tokens at once. ownerOf and tokenURI are read with batched RPC
+        calls and metadata is fetched concurrently. Tokens that couldn't be read
+        (e.g. don't exist, or have unreachable metadata) get an "error" entry instead
+        of their details.
+        """
+        token_ids = [int(token_id) for token_id in token_ids]
+        token_uris, owners = await asyncio.gather(
+            self.get_token_uris(token_ids), self.get_token_owners(token_ids)
+        )
+
+        nfts = []
+        for token_id in token_ids:
+            metadata_uri, owner_address = token_uris[token_id], owners[token_id]
+            error = next(
+                (e for e in (metadata_uri, owner_address) if isinstance(e, RPCError)),
+                None,
+            )
+            if error:
+                nfts.append({"tokenId": token_id, "error": str(error)})
+                continue
+            nfts.append(
+                {
+                    "tokenId": token_id,
+                    "metadataURI": metadata_uri,
+                    "metadataGatewayURL": self.gateway_url(metadata_uri),
+                    "ownerAddress": owner_address,
+                }
+            )
+
+        if fetch_metadata:
+            found = [nft for nft in nfts if "error" not in nft]
+            metadata = await asyncio.gather(
+                *(self.get_ipfs_json(nft["metadataURI"]) for nft in found),
+                return_exceptions=True,
+            )
+            for nft, nft_metadata in zip(found, metadata):
+                if isinstance(nft_metadata, Exception):
+                    nft["error"] = f"Can't fetch metadata: {nft_metadata}"
+                    continue
+                nft["metadata"] = nft_metadata
+                if nft_metadata.get("image"):
+                    nft["assetURI"] = nft_metadata["image"]
+                    nft["assetGatewayURL"] = self.gateway_url(nft_metadata["image"])
+
+        return nfts
+
+    async def get_nft_metadata(self, token_id):
+        metadata_uri = (await self.get_token_uris([int(token_id)]))[int(token_id)]
+        if isinstance(metadata_uri, RPCError):
+            raise metadata_uri
+        metadata = await self.get_ipfs_json(metadata_uri)
+        return metadata, metadata_uri
+
+    async def get_token_owner(self, token_id):
+        owner_address = (await self.get_token_owners([int(token_id)]))[int(token_id)]
+        if isinstance(owner_address, RPCError):
+            raise owner_address
+        return owner_address
+
+    async def get_token_uris(self, token_ids):
+        # tokenURIs are never changed once minted, so they are cached forever
+        return await self._read_tokens("tokenURI", "string", token_ids, self.token_uris)
+
+    async def get_token_owners(self, token_ids):
+        return await self._read_tokens("ownerOf", "address", token_ids, self.owners)
+
+    async def _read_tokens(self, fn_name, output_type, token_ids, cache):
+        """
+        Calls a view function taking a token id for every token id that isn't cached,
+        batched, and returns {token_id: value or RPCError}.
+        """
+        # the cached values are read before the batch is awaited, so none can expire
+        # while it runs and be missing from the result
+        values, missing = {}, []
+        for token_id in set(token_ids):
+            value = cache.get(token_id, _MISSING)
+            if value is _MISSING:
+                missing.append(token_id)
+            else:
+                values[token_id] = value
+        function = self.contract.functions[fn_name]
+        calls = [
+            (self.contract.address, function(token_id)._encode_transaction_data())
+            for token_id in missing
+        ]
+        results = await self.batcher.call_many(calls)
+
+        for token_id, result in zip(missing, results):
+            if isinstance(result, RPCError):
+                values[token_id] = result
+            else:
+                value = self.w3.codec.decode([output_type], result)[0]
+                if output_type == "address":
+                    value = self.w3.to_checksum_address(value)
+                values[token_id] = value
+                cache.set(token_id, values[token_id])
+        return values
+
+    async def get_creation_info(self, token_id):
+        indexed = self.indexer.get_token(token_id)
+        if indexed is not None:
+            return {
+                "creatorAddress": indexed["creatorAddress"],
+                "blockNumber": indexed["blockNumber"],
+            }
+
+        # not indexed yet, so fall back to scanning the logs for this token's mint
+        from_block = self.deploy_info["tx_receipt"].get("blockNumber", 0)
+        logs = await self.contract.events.Transfer().get_logs(
+            argument_filters={"from": ZERO_ADDRESS, "tokenId": int(token_id)},
+            fromBlock=from_block,
+        )
+        if not logs:
+            raise Exception(f"No mint found for token {token_id}")
+        tx = await self.w3.eth.get_transaction(logs[0]["transactionHash"])
+        return {"creatorAddress": tx["from"], "blockNumber": logs[0]["blockNumber"]}
+
+    async def get_tokens_of(self, owner_address, sync=True):
+        """Returns the ids of the tokens owned by owner_address, from the local index."""
+        if sync:
+            await self.indexer.sync()
+        return self.indexer.tokens_of(owner_address)
+
+    async def get_ipfs(self, cid_or_uri):
+        # read through the gateway pool and checked against the CID on the way in
+        return await self.gateways.fetch(strip_ipfs_uri_prefix(cid_or_uri))
+
+    async def get_ipfs_json(self, cid_or_uri):
+        # content addressed data never changes, so it can be cached forever
+        metadata = self.ipfs_json.get(cid_or_uri)
+        if metadata is None:
+            metadata = json.loads(await self.get_ipfs(cid_or_uri))
+            self.ipfs_json.set(cid_or_uri, metadata)
+        return metadata
+
+    async def get_ipfs_base64(self, cid_or_uri):
+        # encoded as it streams in, so the raw content is never held in memory whole
+        chunks = self.stream_ipfs(cid_or_uri)
+        return "".join([c.decode() async for c in encode_base64_stream(chunks)])
+
+    def gateway_url(self, ipfs_uri):
+        """Returns a URL for ipfs_uri on the currently best scoring gateway."""
+        return make_gateway_url(ipfs_uri, self.gateways.best())
+
+    def stream_ipfs(self, cid_or_uri, start=None, end=None):
+        """
+        Returns an async iterator over the content at cid_or_uri, fetched in chunks
+        from the best gateway. start and end (inclusive) select a byte range.
+        """
+        return self.gateways.stream(strip_ipfs_uri_prefix(cid_or_uri), start, end)
+
+    async def write_ipfs(self, cid_or_uri, out, start=None, end=None):
+        """Streams the content at cid_or_uri into the binary file object out."""
+        async for chunk in self.stream_ipfs(cid_or_uri, start, end):
+            out.write(chunk)
+
+
+# --- helpers --- #
+
+
+async def _record(journal, entry, stage, **fields):
+    if journal is not None:
+        await asyncio.to_thread(journal.record, entry, stage, **fields)
+
+
+def _journal_sent(journal, entry):
+    """Returns an on_signed callback journaling entry's mint transaction."""
+    if journal is None:
+        return None
+
+    async def on_signed(transaction, tx_hash):
+        await asyncio.to_thread(journal.record_sent, entry, transaction, tx_hash)
+
+    return on_signed
+
+
+def strip_ipfs_uri_prefix(cid_or_uri):
+    if cid_or_uri.startswith("ipfs://"):
+        return cid_or_uri[len("ipfs://") :]
+    return cid_or_uri
+
+
+def ensure_ipfs_uri_prefix(cid_or_uri):
+    uri = str(cid_or_uri)
+    if not uri.startswith("ipfs://"):
+        uri = "ipfs://" + uri
+    # Avoid the Nyan Cat bug (https://github.com/ipfs/go-ipfs/pull/7930)
+    if uri.startswith("ipfs://ipfs/"):
+        uri = uri.replace("ipfs://ipfs/", "ipfs://", 1)
+    return uri
+
+
+def verify_cid(expected_cid, uploaded_cid):
+    if expected_cid != uploaded_cid:
+        raise Exception(
+            f"IPFS returned CID {uploaded_cid}, but the content hashes to {expected_cid}"
+        )
+
+
+def make_gateway_url(ipfs_uri, gateway=IPFS_GATEWAY_URL):
+    return gateway + strip_ipfs_uri_prefix(ipfs_uri)
@@ -1,4 +1,5 @@
 from dataclasses import dataclass
+from typing import Optional
 
 
 @dataclass
@@ -6,4 +7,7 @@ class NFTOptions:
     name: str
     description: str
     owner: str
-    image_path: str
\ No newline at end of file
+    image_path: str
+    attributes: Optional[list] = None
+    properties: Optional[dict] = None
+    animation_url: Optional[str] = None
@@ -0,0 +1,61 @@
+import asyncio
+
+
+class NonceManager:
+    """
+    Hands out nonces for a single account locally, so that transactions can be
+    signed and sent back to back without waiting for the previous one to be mined.
+
+    A nonce is in flight from when it's handed out until it's marked sent, or given
+    back to reset because it wasn't. The node's pending nonce only counts the ones
+    sent, so it's only read again once nothing is in flight; until then the nonces
+    given back are handed out again first, lowest first, so no gap is left.
+    """
+
+    def __init__(self, w3, address: str):
+        self.w3 = w3
+        self.address = address
+        self._next_nonce = None
+        self._in_flight = set()
+        self._returned = set()
+        self._stale = False
+        self._lock = asyncio.Lock()
+
+    async def next_nonce(self):
+        async with self._lock:
+            if self._returned:
+                nonce = min(self._returned)
+                self._returned.discard(nonce)
+            else:
+                if self._next_nonce is None:
+                    self._next_nonce = await self.w3.eth.get_transaction_count(
+                        self.address, "pending"
+                    )
+                nonce = self._next_nonce
+                self._next_nonce += 1
+            self._in_flight.add(nonce)
+            return nonce
+
+    async def sent(self, nonce):
+        """Marks nonce as used by a transaction the node has accepted."""
+        async with self._lock:
+            self._in_flight.discard(nonce)
+            self._resync_if_idle()
+
+    async def reset(self, nonce=None):
+        """
+        Gives back nonce, e.g. after its transaction failed to send, and re-reads
+        the pending nonce from the node once nothing is in flight.
+        """
+        async with self._lock:
+            if nonce in self._in_flight:
+                self._in_flight.discard(nonce)
+                self._returned.add(nonce)
+            self._stale = True
+            self._resync_if_idle()
+
+    def _resync_if_idle(self):
+        if self._stale and not self._in_flight:
+            self._next_nonce = None
+            self._returned.clear()
+            self._stale = False
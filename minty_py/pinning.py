@@ -0,0 +1,154 @@
+import asyncio
+import itertools
+import os
+
+from minty_py.ipfs_client import IPFSClient
+from minty_py.minty import strip_ipfs_uri_prefix
+from minty_py.ratelimit import RateLimiter
+
+
+class PinJournal:
+    """
+    Append-only record of the tokens whose data is pinned on every endpoint, and of
+    the ones that failed, so that an interrupted pin run can pick up where it left
+    off and a finished one can be run again to retry just the failures.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.done = set()
+        self.failed = set()
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                for line in f:
+                    if line.startswith("failed "):
+                        self.failed.add(int(line.split()[1]))
+                    elif line.strip():
+                        self.done.add(int(line))
+        self.failed -= self.done
+        self._file = open(path, "a")
+
+    def record(self, token_id):
+        self._file.write(f"{token_id}\n")
+        self._file.flush()
+        self.done.add(token_id)
+        self.failed.discard(token_id)
+
+    def record_failure(self, token_id):
+        self._file.write(f"failed {token_id}\n")
+        self._file.flush()
+        self.failed.add(token_id)
+
+    def close(self):
+        self._file.close()
+
+
+def make_pinning_clients(default_client):
+    """
+    Builds a client for each entry in local_info.IPFS_PINNING_ENDPOINTS, a list of
+    dicts with api_endpoint, key, secret and optionally rate (requests per second).
+    Without that setting everything is pinned through default_client.
+    """
+    from minty_py.config import local_info
+
+    endpoints = getattr(local_info, "IPFS_PINNING_ENDPOINTS", None)
+    if not endpoints:
+        return [default_client]
+    return [
+        IPFSClient(
+            endpoint["key"],
+            endpoint["secret"],
+            endpoint["api_endpoint"],
+            rate_limiter=RateLimiter(endpoint.get("rate", 10)),
+        )
+        for endpoint in endpoints
+    ]
+
+
+async def pin_tokens(
+    minty, token_ids, clients, journal=None, batch_size: int = 500, progress=None
+):
+    """
+    Pins the asset and metadata of every token in token_ids on every client.
+
+    token_ids may be any iterable and is consumed batch_size tokens at a time. Each
+    batch's CIDs are resolved with batched contract reads, CIDs a client already has
+    pinned (per one pin/ls request up front) are skipped, and the rest are pinned
+    concurrently within each client's own concurrency and rate limits. A CID that
+    several tokens share (e.g. a collection's root) is only pinned once per client,
+    the others waiting on that pin. A token whose CIDs can't be resolved or pinned
+    is counted as failed, and journaled as such, without holding up the rest.
+    progress(stats) is called after each batch.
+    """
+    pinned = await asyncio.gather(*(client.pin_ls() for client in clients))
+    pinning = [{} for _ in clients]  # cid -> pin/add task in flight, per client
+    stats = {"tokens": 0, "pinned": 0, "skipped": 0, "failed": {}}
+
+    async def pin_add(client, client_pins, cid):
+        await client.pin_add(cid)
+        client_pins.add(cid)
+        stats["pinned"] += 1
+
+    async def pin_cid(client, client_pins, client_pinning, cid):
+        if cid in client_pins:
+            stats["skipped"] += 1
+            return
+        task = client_pinning.get(cid)
+        if task is None:
+            task = asyncio.create_task(pin_add(client, client_pins, cid))
+            client_pinning[cid] = task
+            # forgotten once done, so one that failed is tried again by later tokens
+            task.add_done_callback(lambda _: client_pinning.pop(cid, None))
+        else:
+            stats["skipped"] += 1
+        # shielded, so a token that gives up doesn't cancel it for the others
+        await asyncio.shield(task)
+
+    def fail(token_id, error):
+        stats["failed"][token_id] = error
+        if journal is not None:
+            journal.record_failure(token_id)
+
+    async def pin_token(nft):
+        if "error" in nft:
+            fail(nft["tokenId"], nft["error"])
+            return
+        # pinning the wrapping directory pins the file inside it as well
+        cids = {_root_cid(nft["metadataURI"])}
+        if nft.get("assetURI"):
+            cids.add(_root_cid(nft["assetURI"]))
+        try:
+            await asyncio.gather(
+                *(
+                    pin_cid(client, client_pins, client_pinning, cid)
+                    for client, client_pins, client_pinning in zip(
+                        clients, pinned, pinning
+                    )
+                    for cid in cids
+                )
+            )
+        except Exception as e:
+            fail(nft["tokenId"], str(e))
+            return
+        stats["tokens"] += 1
+        if journal is not None:
+            journal.record(nft["tokenId"])
+
+    token_ids = iter(token_ids)
+    while True:
+        batch = list(itertools.islice(token_ids, batch_size))
+        if not batch:
+            break
+        if journal is not None:
+            batch = [token_id for token_id in batch if token_id not in journal.done]
+
+        nfts = await minty.get_nfts(batch)
+        await asyncio.gather(*(pin_token(nft) for nft in nfts))
+        if progress:
+            progress(stats)
+
+    return stats
+
+
+def _root_cid(ipfs_uri):
+    return strip_ipfs_uri_prefix(ipfs_uri).split("/")[0]
@@ -0,0 +1,153 @@
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
+from minty_py.cid import DagNode, build_file, cid_from_str, cid_to_str, read_chunks
+
+DEFAULT_CACHE_DIR = os.path.expanduser("~/.cache/minty_py/preprocessed")
+EXTENSIONS = {"JPEG": "jpg", "PNG": "png", "WEBP": "webp"}
+
+
+class Preprocessor:
+    """
+    Normalizes images before they are minted: applies the EXIF orientation, scales
+    them down to fit max_size, re-encodes them as image_format without EXIF or
+    other metadata, and makes a thumbnail_size thumbnail.
+
+    The work runs in a pool of `workers` processes (one per core by default), and
+    its output is cached in cache_dir by a hash of the input and the settings.
+    Needs Pillow.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 2048,
+        thumbnail_size: int = 256,
+        image_format: str = "WEBP",
+        quality: int = 85,
+        workers: int = None,
+        cache_dir: str = DEFAULT_CACHE_DIR,
+    ):
+        try:
+            import PIL  # noqa: F401
+        except ImportError:
+            raise Exception("Preprocessing images needs Pillow: pip install Pillow")
+        if image_format not in EXTENSIONS:
+            raise ValueError(
+                f"image_format must be one of {', '.join(EXTENSIONS)}, "
+                f"not {image_format}"
+            )
+        self.settings = {
+            "max_size": max_size,
+            "thumbnail_size": thumbnail_size,
+            "image_format": image_format,
+            "quality": quality,
+        }
+        self.workers = workers or os.cpu_count()
+        self.cache_dir = cache_dir
+        self._executor = None
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            # spawned rather than forked, as the parent is running an event loop
+            # and threads that a fork would copy mid-flight
+            self._executor = ProcessPoolExecutor(
+                self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    async def process(self, image_path):
+        """
+        Returns {"asset": file, "thumbnail": file} for the image at image_path,
+        where each file is a dict of name, path and node (its DagNode), or None if
+        Pillow can't read image_path as an image.
+        """
+        result = await asyncio.get_running_loop().run_in_executor(
+            self.executor, _preprocess, image_path, self.cache_dir, self.settings
+        )
+        if result is None:
+            return None
+        for file in result.values():
+            file["node"] = DagNode(cid_from_str(file["cid"]), file["size"], None)
+        return result
+
+
+# --- worker --- #
+
+
+def _preprocess(image_path, cache_dir, settings):
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    digest = hashlib.sha256(json.dumps(settings, sort_keys=True).encode())
+    with open(image_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    out_dir = os.path.join(cache_dir, digest.hexdigest())
+    result_path = os.path.join(out_dir, "result.json")
+    if os.path.exists(result_path):
+        with open(result_path) as f:
+            return _with_paths(json.load(f), out_dir)
+
+    try:
+        image = Image.open(image_path)
+        image.load()
+    except UnidentifiedImageError:
+        return None
+    image = ImageOps.exif_transpose(image)
+    image_format = settings["image_format"]
+    if image_format == "JPEG" and image.mode != "RGB":
+        image = image.convert("RGB")
+    elif image.mode not in ("RGB", "RGBA", "L", "LA"):
+        image = image.convert("RGBA")
+
+    stem = os.path.splitext(os.path.basename(image_path))[0]
+    extension = EXTENSIONS[image_format]
+    names = {"asset": f"{stem}.{extension}", "thumbnail": f"{stem}-thumb.{extension}"}
+    sizes = {"asset": settings["max_size"], "thumbnail": settings["thumbnail_size"]}
+
+    # written next to the cache entry and renamed into place, so a crash or another
+    # process working on the same image never leaves a partial entry behind
+    tmp_dir = f"{out_dir}.{os.getpid()}.tmp"
+    os.makedirs(tmp_dir, exist_ok=True)
+    result = {}
+    for kind, name in names.items():
+        scaled = image.copy()
+        # only ever scales down, keeping the aspect ratio
+        scaled.thumbnail((sizes[kind], sizes[kind]))
+        path = os.path.join(tmp_dir, name)
+        # EXIF and text chunks are left out by not passing them on, the colour
+        # profile is kept so colours don't shift
+        scaled.save(
+            path,
+            image_format,
+            quality=settings["quality"],
+            icc_profile=image.info.get("icc_profile"),
+        )
+        with open(path, "rb") as f:
+            node = build_file(read_chunks(f))
+        result[kind] = {"name": name, "cid": cid_to_str(node.cid), "size": node.size}
+
+    with open(os.path.join(tmp_dir, "result.json"), "w") as f:
+        json.dump(result, f)
+    try:
+        os.rename(tmp_dir, out_dir)
+    except OSError:
+        # another process cached the same image first
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return _with_paths(result, out_dir)
+
+
+def _with_paths(result, out_dir):
+    for file in result.values():
+        file["path"] = os.path.join(out_dir, file["name"])
+    return result
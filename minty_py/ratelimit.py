@@ -0,0 +1,233 @@
+import asyncio
+import ipaddress
+import random
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+from minty_py.metrics import METRICS
+
+# statuses a server sends when it wants us to slow down
+THROTTLE_STATUSES = {429, 503}
+# the JSON-RPC error code of a request refused for going over a rate or quota
+LIMIT_EXCEEDED = -32005
+
+
+class RateLimiter:
+    """
+    Token bucket allowing rate requests per second on average, with bursts of up to
+    burst requests.
+    """
+
+    def __init__(self, rate: float, burst: int = None):
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self._tokens = self.burst
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.burst, self._tokens + (now - self._updated_at) * self.rate
+                )
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    async def request(self, send):
+        """
+        Makes a request once the limit allows. send() makes it and returns
+        (status, response headers, result); this returns (status, result).
+        """
+        await self.acquire()
+        status, _, result = await send()
+        return status, result
+
+    async def __aenter__(self):
+        await self.acquire()
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+
+class AdaptiveRateLimiter(RateLimiter):
+    """
+    A RateLimiter that finds the highest rate a server will take (AIMD):
+     - nothing is limited until the server first pushes back with a 429 or 503,
+       unless a starting rate is given
+     - each push back cuts the rate by the factor decrease, to no less than
+       min_rate, and holds every request for the Retry-After the server sent, or
+       else for base_delay, doubling with each cut in a row
+     - a response saying no requests remain until its rate limit resets holds
+       every request until then
+     - each success raises the rate by increase / rate, i.e. by about increase
+       per second while running at the limit
+
+    request() retries pushed back requests up to max_retries times, after an
+    exponential backoff with full jitter, so clients sharing a limit don't all
+    retry at once.
+    """
+
+    def __init__(
+        self,
+        rate: float = None,
+        min_rate: float = 0.5,
+        increase: float = 1,
+        decrease: float = 0.5,
+        max_retries: int = 5,
+        base_delay: float = 0.5,
+        max_delay: float = 60,
+    ):
+        super().__init__(rate or min_rate)
+        self.rate = rate
+        self.min_rate = min_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.throttled = 0
+        self.retries = 0
+        self._held_until = 0
+        self._cut_at = None
+        self._cuts_in_a_row = 0
+        self._recent = deque()  # when each request of the last second was let through
+
+    @property
+    def held(self):
+        return self._held_until > time.monotonic()
+
+    async def acquire(self):
+        while True:
+            delay = self._held_until - time.monotonic()
+            if delay <= 0:
+                break
+            await asyncio.sleep(delay)
+        if self.rate is not None:
+            await super().acquire()
+
+        now = time.monotonic()
+        self._recent.append(now)
+        while self._recent[0] < now - 1:
+            self._recent.popleft()
+
+    def record(self, status, headers=None):
+        """Adjusts the rate for the response to a request let through."""
+        now = time.monotonic()
+        wait = _retry_after(headers) if headers else None
+        if wait is not None:
+            self._held_until = max(self._held_until, now + min(wait, self.max_delay))
+
+        if status in THROTTLE_STATUSES:
+            self.throttled += 1
+            METRICS.count("rate_limited")
+            # requests sent before a cut come back throttled as well, so only cut
+            # once per second
+            if self._cut_at is None or now - self._cut_at >= 1:
+                self._cut_at = now
+                self._cuts_in_a_row += 1
+                current = self.rate if self.rate is not None else len(self._recent)
+                self._set_rate(current * self.decrease)
+            if wait is None:
+                doublings = min(max(self._cuts_in_a_row - 1, 0), 16)
+                wait = min(self.base_delay * 2**doublings, self.max_delay)
+                self._held_until = max(self._held_until, now + wait)
+        else:
+            self._cuts_in_a_row = 0
+            if self.rate is not None:
+                self._set_rate(self.rate + self.increase / self.rate)
+
+    def backoff(self, attempt):
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+    async def request(self, send):
+        for attempt in range(self.max_retries + 1):
+            await self.acquire()
+            status, headers, result = await send()
+            self.record(status, headers)
+            if status not in THROTTLE_STATUSES or attempt == self.max_retries:
+                break
+            self.retries += 1
+            METRICS.count("rate_limit_retries")
+            await asyncio.sleep(self.backoff(attempt))
+        return status, result
+
+    def metrics(self):
+        return {
+            "rate": self.rate,
+            "throttled": self.throttled,
+            "retries": self.retries,
+            "held": self.held,
+        }
+
+    def _set_rate(self, rate):
+        self.rate = max(self.min_rate, rate)
+        self.burst = max(1, int(self.rate))
+        self._tokens = min(self._tokens, self.burst)
+
+
+# shared by every client of a service, see shared_limiter
+_limiters = {}
+
+
+def shared_limiter(url):
+    """
+    Returns the AdaptiveRateLimiter for the service at url, shared by everything
+    in the process that uses it. Services are told apart by domain, as e.g.
+    Infura's IPFS API and its Ethereum endpoints count against one project's
+    quota; ones on an IP address or localhost are told apart by port as well.
+    """
+    key = _quota_key(url)
+    limiter = _limiters.get(key)
+    if limiter is None:
+        limiter = _limiters[key] = AdaptiveRateLimiter()
+    return limiter
+
+
+# --- helpers --- #
+
+
+def _quota_key(url):
+    parts = urlsplit(url)
+    host = parts.hostname or url
+    try:
+        ipaddress.ip_address(host)
+    except ValueError:
+        if "." in host:
+            return ".".join(host.split(".")[-2:])
+    return f"{host}:{parts.port}"
+
+
+def _retry_after(headers):
+    """
+    Returns how many seconds the server asked us to wait, from a Retry-After
+    header, or else from rate limit headers saying nothing remains until a reset.
+    """
+    value = headers.get("Retry-After")
+    if value:
+        try:
+            return max(0, float(value))
+        except ValueError:
+            try:
+                return max(0, parsedate_to_datetime(value).timestamp() - time.time())
+            except (TypeError, ValueError):
+                return None
+
+    remaining = headers.get("X-RateLimit-Remaining", headers.get("RateLimit-Remaining"))
+    reset = headers.get("X-RateLimit-Reset", headers.get("RateLimit-Reset"))
+    try:
+        if remaining is None or reset is None or float(remaining) > 0:
+            return None
+        reset = float(reset)
+    except ValueError:
+        return None
+    # either seconds until the reset or the time of it
+    if reset > 10**9:
+        reset -= time.time()
+    return max(0, reset)
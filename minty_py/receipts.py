@@ -0,0 +1,205 @@
+import asyncio
+
+from hexbytes import HexBytes
+from web3._utils.method_formatters import receipt_formatter
+from web3.datastructures import AttributeDict
+
+from minty_py.metrics import METRICS
+from minty_py.rpc_batch import JSONRPCBatcher, RPCError
+
+# further behind than this, it's cheaper to look the transactions up than to read
+# every block since
+MAX_CATCH_UP_BLOCKS = 100
+
+
+class ReceiptTracker:
+    """
+    Waits for the receipts of any number of transactions at once. One task follows
+    the chain, reading each new block's receipts once with eth_getBlockReceipts
+    (or, from nodes without it, the block's transaction hashes and then the
+    receipts of the ones waited on) and handing them to every wait they answer,
+    so waiting costs a few requests per block however many transactions are
+    pending.
+
+    Hashes are also looked up directly when first waited on, batched with every
+    other one since the last poll, in case they were mined before the tracker
+    read their block. A receipt is returned once its block is confirmations deep
+    (1 being the head); when that's deeper than 1, it's read again first in case
+    a reorg moved or dropped it meanwhile.
+    """
+
+    def __init__(
+        self,
+        w3,
+        poll_interval: float = 2,
+        confirmations: int = 1,
+        batcher=None,
+    ):
+        self.w3 = w3
+        self.poll_interval = poll_interval
+        self.confirmations = max(1, confirmations)
+        self.batcher = batcher or JSONRPCBatcher(w3)
+        self.blocks_read = 0
+        self._waiters = {}  # tx hash -> futures of the waits on it
+        self._found = {}  # tx hash -> raw receipt, until it's deep enough
+        self._unchecked = set()  # tx hashes to look up directly
+        self._next_block = None
+        self._block_receipts = True  # until the node turns eth_getBlockReceipts down
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.batcher.close()
+
+    async def wait(self, tx_hashes, timeout: float = None):
+        """
+        Returns the receipt of whichever of tx_hashes was mined, or None if none
+        was within timeout seconds.
+        """
+        keys = [_key(tx_hash) for tx_hash in tx_hashes]
+        future = asyncio.get_running_loop().create_future()
+        for key in keys:
+            self._waiters.setdefault(key, set()).add(future)
+        self._unchecked.update(keys)
+        self._wakeup.set()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._follow())
+
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            for key in keys:
+                waiters = self._waiters.get(key)
+                if waiters is None:
+                    continue
+                waiters.discard(future)
+                if not waiters:
+                    del self._waiters[key]
+                    self._found.pop(key, None)
+                    self._unchecked.discard(key)
+
+    # --- helpers --- #
+
+    async def _follow(self):
+        while self._waiters:
+            self._wakeup.clear()
+            try:
+                await self._poll()
+            except Exception:
+                # tried again next poll, and every wait has a timeout of its own
+                METRICS.count("receipt_poll_errors")
+            if not self._waiters:
+                break
+            try:
+                # woken early by a new wait, so it's looked up right away
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _poll(self):
+        head = await self.w3.eth.block_number
+        start = head if self._next_block is None else self._next_block
+        if head - start >= MAX_CATCH_UP_BLOCKS:
+            self._unchecked.update(self._waiters)
+            start = head
+
+        if self._unchecked:
+            keys = list(self._unchecked)
+            for key, receipt in zip(keys, await self._look_up(keys)):
+                if receipt is not None:
+                    self._found[key] = receipt
+            self._unchecked.difference_update(keys)
+
+        if start <= head:
+            for receipt in await self._read_blocks(range(start, head + 1)):
+                self._found[_key(receipt["transactionHash"])] = receipt
+            self._next_block = head + 1
+        await self._settle(head)
+
+    async def _read_blocks(self, numbers):
+        """Returns the raw receipts of the transactions waited on in blocks numbers."""
+        numbers = list(numbers)
+        self.blocks_read += len(numbers)
+        METRICS.count("receipt_blocks_read", len(numbers))
+        receipts = []
+        if self._block_receipts:
+            results = await self.batcher.request_many(
+                "eth_getBlockReceipts", [[hex(number)] for number in numbers]
+            )
+            unread = []
+            for number, result in zip(numbers, results):
+                if isinstance(result, RPCError):
+                    self._block_receipts = False
+                if isinstance(result, RPCError) or result is None:
+                    unread.append(number)
+                    continue
+                receipts.extend(
+                    receipt
+                    for receipt in result
+                    if _key(receipt["transactionHash"]) in self._waiters
+                )
+            numbers = unread
+            if not numbers:
+                return receipts
+
+        blocks = await self.batcher.request_many(
+            "eth_getBlockByNumber", [[hex(number), False] for number in numbers]
+        )
+        keys = []
+        for block in blocks:
+            if isinstance(block, RPCError) or block is None:
+                # the block's transactions are unknown, so look them all up instead
+                self._unchecked.update(self._waiters)
+                continue
+            keys.extend(
+                key for key in map(_key, block["transactions"]) if key in self._waiters
+            )
+        found = await self._look_up(keys)
+        return receipts + [receipt for receipt in found if receipt is not None]
+
+    async def _look_up(self, keys):
+        """Returns the raw receipt of each of keys, or None if it isn't mined."""
+        if not keys:
+            return []
+        results = await self.batcher.request_many(
+            "eth_getTransactionReceipt", [[key] for key in keys]
+        )
+        return [None if isinstance(result, RPCError) else result for result in results]
+
+    async def _settle(self, head):
+        ready = [
+            key
+            for key, receipt in self._found.items()
+            if head - int(receipt["blockNumber"], 16) + 1 >= self.confirmations
+        ]
+        if ready and self.confirmations > 1:
+            current = await self._look_up(ready)
+            for key, receipt in zip(ready, current):
+                if receipt is None:
+                    self._found.pop(key, None)
+                elif key in self._found:
+                    self._found[key] = receipt
+            ready = [
+                key
+                for key, receipt in zip(ready, current)
+                if receipt is not None
+                and head - int(receipt["blockNumber"], 16) + 1 >= self.confirmations
+            ]
+
+        for key in ready:
+            receipt = self._found.pop(key, None)
+            if receipt is None:
+                continue
+            receipt = AttributeDict.recursive(receipt_formatter(receipt))
+            for future in self._waiters.get(key, ()):
+                if not future.done():
+                    future.set_result(receipt)
+
+
+def _key(tx_hash):
+    return "0x" + bytes(HexBytes(tx_hash)).hex()
@@ -0,0 +1,126 @@
+import asyncio
+import os.path
+import weakref
+
+from web3 import AsyncWeb3
+
+from minty_py.config import local_info
+from minty_py.deploy import DEFAULT_DEPLOYMENT_PATH, load_deployment_info
+from minty_py.metrics import instrument_web3
+from minty_py.rpc_provider import RPC_URLS, MultiEndpointProvider
+
+DEFAULT_CONTRACT_NAME = "minty"
+
+
+class DeploymentRegistry:
+    """
+    Deployed contracts keyed by (chain_id, name), so one process can mint into
+    several collections on several chains:
+     - each deployment file is loaded and validated once per process
+     - each network gets one AsyncWeb3, shared by every Minty on it, so they share
+       its pooled HTTP session
+     - contract objects are built once per web3 and address
+
+    networks maps chain ids to an RPC URL or a list of them, which are shared by
+    a rpc_provider.MultiEndpointProvider, and deployments is a list of dicts with
+    chain_id, name and path. They default to local_info.NETWORKS and
+    local_info.DEPLOYMENTS. The chain id None is the default network,
+    local_info.RPC_URLS (or else INFURA_SEPOLIA_URL), and its "minty" contract is
+    the one in minty_py/contracts/minty_py_deployment.json.
+    """
+
+    def __init__(self, deployments=None, networks=None):
+        if deployments is None:
+            deployments = getattr(local_info, "DEPLOYMENTS", [])
+        if networks is None:
+            networks = getattr(local_info, "NETWORKS", {})
+        self.paths = {(None, DEFAULT_CONTRACT_NAME): DEFAULT_DEPLOYMENT_PATH}
+        for deployment in deployments:
+            self.register(
+                deployment["chain_id"], deployment["name"], deployment["path"]
+            )
+        self.networks = {None: RPC_URLS, **networks}
+        self._deployments = {}
+        self._web3s = {}
+        self._connecting = {}
+        self._contracts = weakref.WeakKeyDictionary()
+
+    def register(self, chain_id, name, path):
+        self.paths[(chain_id, name)] = path
+
+    async def deployment(self, chain_id=None, name=DEFAULT_CONTRACT_NAME):
+        path = self.paths.get((chain_id, name))
+        if path is None:
+            raise Exception(
+                f"No deployment of {name} is registered on chain {chain_id}"
+            )
+        deploy_info = await self.load(path)
+        deployed_chain_id = deploy_info.get("chain_id")
+        if None not in (chain_id, deployed_chain_id) and chain_id != deployed_chain_id:
+            raise Exception(f"{path} is a deployment on chain {deployed_chain_id}")
+        return deploy_info
+
+    async def load(self, path):
+        """Returns the deployment info in path, reading it the first time only."""
+        path = os.path.abspath(path)
+        deploy_info = self._deployments.get(path)
+        if deploy_info is None:
+            deploy_info = await load_deployment_info(path)
+            self._deployments[path] = deploy_info
+        return deploy_info
+
+    async def web3(self, chain_id=None):
+        """Returns the shared AsyncWeb3 for chain_id, checking its chain id once."""
+        w3 = self._web3s.get(chain_id)
+        if w3 is not None:
+            return w3
+
+        # concurrent first calls share one connection rather than each making one
+        task = self._connecting.get(chain_id)
+        if task is None:
+            task = asyncio.ensure_future(self._connect(chain_id))
+            self._connecting[chain_id] = task
+            task.add_done_callback(lambda _: self._connecting.pop(chain_id, None))
+        return await asyncio.shield(task)
+
+    async def close(self):
+        """
+        Closes every network's provider, so its session and health checks don't
+        outlive the event loop. A later web3 call connects again.
+        """
+        web3s, self._web3s = self._web3s, {}
+        for w3 in web3s.values():
+            await w3.provider.close()
+
+    def contract(self, w3, deploy_info):
+        contracts = self._contracts.setdefault(w3, {})
+        address = deploy_info["contract_address"]
+        contract = contracts.get(address)
+        if contract is None:
+            contract = w3.eth.contract(abi=deploy_info["abi"], address=address)
+            contracts[address] = contract
+        return contract
+
+    async def _connect(self, chain_id):
+        rpc_urls = self.networks.get(chain_id)
+        if not rpc_urls:
+            raise Exception(f"No RPC URL is configured for chain {chain_id}")
+        provider = MultiEndpointProvider(rpc_urls)
+        w3 = AsyncWeb3(provider)
+        instrument_web3(w3)
+        if chain_id is not None:
+            try:
+                actual_chain_id = await w3.eth.chain_id
+            except Exception:
+                await provider.close()
+                raise
+            if actual_chain_id != chain_id:
+                await provider.close()
+                raise Exception(
+                    f"{provider} is chain {actual_chain_id}, not {chain_id}"
+                )
+        self._web3s[chain_id] = w3
+        return w3
+
+
+REGISTRY = DeploymentRegistry()
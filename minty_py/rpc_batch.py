@@ -0,0 +1,162 @@
+import asyncio
+import json
+from collections.abc import Mapping
+
+import aiohttp
+
+from minty_py.metrics import METRICS
+from minty_py.ratelimit import LIMIT_EXCEEDED, shared_limiter
+
+
+class RPCError(Exception):
+    pass
+
+
+class JSONRPCBatcher:
+    """
+    Runs many eth_call requests as JSON-RPC batches of batch_size calls, with at most
+    max_in_flight batches outstanding at a time.
+
+    Batches go through the provider's make_batch_request where it has one (e.g.
+    rpc_provider.MultiEndpointProvider, which fails over between endpoints), or else
+    straight to its endpoint_uri, under the ratelimit.shared_limiter of its service,
+    which backs off and retries batches the endpoint pushes back on. Providers that
+    aren't reached over HTTP (e.g. eth-tester) can't take batches, so for those the
+    calls are made individually through w3, max_in_flight at a time.
+    """
+
+    def __init__(self, w3, batch_size: int = 100, max_in_flight: int = 4):
+        self.w3 = w3
+        self.batch_size = batch_size
+        self.max_in_flight = max_in_flight
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self._session = None
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def call_many(self, calls):
+        """
+        Takes a list of (to, data) pairs and returns the raw bytes each call returned,
+        in order. Calls that failed (e.g. reverted) get an RPCError in their place.
+        """
+        results = await self.request_many(
+            "eth_call", [[{"to": to, "data": data}, "latest"] for to, data in calls]
+        )
+        return [
+            result if isinstance(result, RPCError) else bytes.fromhex(result[2:])
+            for result in results
+        ]
+
+    async def request_many(self, method, params_list):
+        """
+        Makes one request per entry in params_list and returns the raw JSON-RPC
+        results in order, with an RPCError in place of each request that failed.
+        """
+        if getattr(self.w3.provider, "endpoint_uri", None) is None:
+            return await asyncio.gather(
+                *(self._request_one(method, params) for params in params_list)
+            )
+
+        batches = [
+            params_list[i : i + self.batch_size]
+            for i in range(0, len(params_list), self.batch_size)
+        ]
+        results = await asyncio.gather(
+            *(self._request_batch(method, batch) for batch in batches)
+        )
+        return [result for batch_results in results for result in batch_results]
+
+    async def _request_one(self, method, params):
+        async with self._semaphore:
+            try:
+                result = await self.w3.manager.coro_request(method, params)
+            except Exception as e:
+                return RPCError(str(e))
+        return _to_json(result)
+
+    async def _request_batch(self, method, batch):
+        payload = [
+            {"jsonrpc": "2.0", "id": request_id, "method": method, "params": params}
+            for request_id, params in enumerate(batch)
+        ]
+
+        async with self._semaphore:
+            # these skip w3, so they're counted here rather than by its middleware
+            METRICS.count("rpc_calls", len(batch))
+            METRICS.count("rpc_batches")
+            with METRICS.span("rpc.batch"):
+                responses = await self._post(payload)
+        if not isinstance(responses, list):
+            # the whole batch was turned down, e.g. for being too large, so every
+            # call in it failed
+            if isinstance(responses, dict) and "error" in responses:
+                responses = _error_message(responses["error"])
+            return [RPCError(f"Batch request failed: {responses}") for _ in batch]
+
+        # responses in a batch may come back in any order
+        by_id = {response["id"]: response for response in responses}
+        results = []
+        for request_id in range(len(batch)):
+            response = by_id.get(request_id, {"error": {"message": "no response"}})
+            if "error" in response:
+                results.append(RPCError(_error_message(response["error"])))
+            else:
+                results.append(response["result"])
+        return results
+
+    async def _post(self, payload):
+        provider = self.w3.provider
+        if hasattr(provider, "make_batch_request"):
+            try:
+                return await provider.make_batch_request(payload)
+            except ConnectionError as e:
+                raise RPCError(f"Batch request failed: {e}") from e
+
+        if self._session is None:
+            self._session = aiohttp.ClientSession()
+        rpc_url = provider.endpoint_uri
+
+        async def send():
+            async with self._session.post(rpc_url, json=payload) as response:
+                status, headers = response.status, response.headers
+                content = await response.read()
+            if status != 200:
+                return status, headers, content.decode()
+            responses = json.loads(content)
+            errors = [
+                response.get("error")
+                for response in (responses if isinstance(responses, list) else [])
+            ]
+            if any(
+                isinstance(error, dict) and error.get("code") == LIMIT_EXCEEDED
+                for error in errors
+            ):
+                # over the endpoint's request quota, which is a push back like a 429
+                return 429, headers, responses
+            return status, headers, responses
+
+        status, result = await shared_limiter(rpc_url).request(send)
+        if status != 200:
+            raise RPCError(f"Batch request failed: HTTP {status} {result}")
+        return result
+
+
+def _error_message(error):
+    return error.get("message") if isinstance(error, dict) else str(error)
+
+
+def _to_json(result):
+    # w3 hands back formatted python values, so turn them back into the JSON-RPC
+    # encoding the batched path returns
+    if isinstance(result, (bytes, bytearray)):
+        return "0x" + bytes(result).hex()
+    if isinstance(result, Mapping):
+        return {key: _to_json(value) for key, value in result.items()}
+    if isinstance(result, (list, tuple)):
+        return [_to_json(value) for value in result]
+    if isinstance(result, int) and not isinstance(result, bool):
+        return hex(result)
+    return result
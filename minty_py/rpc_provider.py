@@ -0,0 +1,378 @@
+import asyncio
+import json
+import time
+
+import aiohttp
+from eth_utils import keccak
+from web3.providers.async_base import AsyncJSONBaseProvider
+
+from minty_py.config import local_info
+from minty_py.config.local_info import INFURA_SEPOLIA_URL
+from minty_py.gateways import GatewayStats
+from minty_py.metrics import METRICS
+from minty_py.ratelimit import LIMIT_EXCEEDED, THROTTLE_STATUSES, shared_limiter
+
+# endpoints of the default network, tried in turn if one is down
+RPC_URLS = getattr(local_info, "RPC_URLS", [INFURA_SEPOLIA_URL])
+
+# reads that never change
+IMMUTABLE_METHODS = {"eth_chainId", "net_version"}
+# reads whose result can only change when a block is mined
+BLOCK_SCOPED_METHODS = {
+    "eth_blockNumber",
+    "eth_call",
+    "eth_feeHistory",
+    "eth_gasPrice",
+    "eth_getBalance",
+    "eth_getBlockByNumber",
+    "eth_getCode",
+    "eth_getStorageAt",
+    "eth_maxPriorityFeePerGas",
+}
+# reads that identical calls in flight at the same time can share
+COALESCED_METHODS = (
+    IMMUTABLE_METHODS
+    | BLOCK_SCOPED_METHODS
+    | {
+        "eth_estimateGas",
+        "eth_getBlockReceipts",
+        "eth_getLogs",
+        "eth_getTransactionByHash",
+        "eth_getTransactionCount",
+        "eth_getTransactionReceipt",
+    }
+)
+# how endpoints answer a raw transaction they already have
+ALREADY_KNOWN_ERRORS = ("already known", "known transaction", "already imported")
+
+
+class RateLimited(Exception):
+    pass
+
+
+class MultiEndpointProvider(AsyncJSONBaseProvider):
+    """
+    A web3 provider spreading JSON-RPC requests over several endpoints of one
+    chain:
+     - requests go to the endpoint with the best recent latency and error rate,
+       failing over to the next one on connection errors, timeouts and HTTP
+       error statuses
+     - each endpoint's requests go through its ratelimit.AdaptiveRateLimiter
+       (shared with everything else on its service's quota by default), so an
+       endpoint that pushes back is slowed down and tried after the others; when
+       every endpoint pushes back the request is retried after a jittered backoff,
+       up to max_retries times
+     - every health_interval seconds each endpoint's block number is checked in the
+       background; ones over max_lag blocks behind the others are tried last
+     - identical reads in flight at the same time are sent once and share the
+       response
+     - the chain id is cached for good, and reads against the latest block (gas
+       price, eth_call, balances...) until the block number changes, which is
+       checked at most every head_ttl seconds
+
+    Reads of "pending" state are never cached, and writes are neither cached nor
+    coalesced. A raw transaction sent again after a timeout may already have been
+    passed on by the endpoint that timed out; as it has the same hash wherever it's
+    sent, an endpoint answering that it already knows it counts as it being sent.
+    make_batch_request sends a JSON-RPC batch the same way, with the same
+    failover and rate limits, which is how a rpc_batch.JSONRPCBatcher on this
+    provider sends its batches.
+    """
+
+    def __init__(
+        self,
+        endpoints,
+        timeout: float = 30,
+        head_ttl: float = 1,
+        health_interval: float = 30,
+        max_lag: int = 3,
+        max_retries: int = 5,
+        limiters=None,
+    ):
+        super().__init__()
+        if isinstance(endpoints, str):
+            endpoints = [endpoints]
+        self.endpoints = list(endpoints)
+        if not self.endpoints:
+            raise ValueError("MultiEndpointProvider needs at least one endpoint")
+        self.timeout = timeout
+        self.head_ttl = head_ttl
+        self.health_interval = health_interval
+        self.max_lag = max_lag
+        self.max_retries = max_retries
+        self.limiters = limiters or {
+            endpoint: shared_limiter(endpoint) for endpoint in self.endpoints
+        }
+        self.stats = {endpoint: GatewayStats() for endpoint in self.endpoints}
+        self.lagging = set()
+        self.requests = 0
+        self.cache_hits = 0
+        self.coalesced = 0
+        self.failovers = 0
+        self._session = None
+        self._immutable = {}
+        self._block_cache = {}
+        self._head = None
+        self._head_checked_at = None
+        self._in_flight = {}
+        self._health_checked_at = time.monotonic()
+        self._health_check = None
+
+    def __str__(self):
+        return f"RPC connection {', '.join(self.endpoints)}"
+
+    @property
+    def endpoint_uri(self):
+        return self.ranked()[0]
+
+    @property
+    def session(self):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+        return self._session
+
+    async def close(self):
+        if self._health_check is not None:
+            self._health_check.cancel()
+            self._health_check = None
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def ranked(self):
+        return sorted(
+            self.endpoints,
+            key=lambda endpoint: (
+                self.limiters[endpoint].held,
+                endpoint in self.lagging,
+                self.stats[endpoint].score(),
+            ),
+        )
+
+    async def make_request(self, method, params):
+        self._schedule_health_check()
+        if method not in COALESCED_METHODS:
+            return await self._request(method, params)
+
+        key = (method, json.dumps(params, sort_keys=True, default=repr))
+        cached = self._cached(key)
+        if cached is not None:
+            self.cache_hits += 1
+            METRICS.count("rpc_cache_hits")
+            return cached
+
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._read(key, method, params))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        else:
+            self.coalesced += 1
+            METRICS.count("rpc_coalesced")
+        # shielded, so one caller giving up doesn't cancel it for the others
+        return await asyncio.shield(task)
+
+    async def make_batch_request(self, payload):
+        """
+        Sends payload, a list of JSON-RPC requests, as one batch and returns the
+        list of responses, in whatever order the endpoint sent them.
+        """
+        self._schedule_health_check()
+        methods = sorted({request["method"] for request in payload})
+        return await self._send(
+            json.dumps(payload).encode(), f"a batch of {', '.join(methods)}"
+        )
+
+    async def check_health(self):
+        """
+        Asks every endpoint for its block number, recording how long each took and
+        which are lagging behind the rest.
+        """
+        heads = await asyncio.gather(
+            *(self._endpoint_head(endpoint) for endpoint in self.endpoints)
+        )
+        known = [head for head in heads if head is not None]
+        if not known:
+            return
+        highest = max(known)
+        self.lagging = {
+            endpoint
+            for endpoint, head in zip(self.endpoints, heads)
+            if head is not None and highest - head > self.max_lag
+        }
+        self._observe_head(highest)
+
+    def metrics(self):
+        return {
+            "requests": self.requests,
+            "cache_hits": self.cache_hits,
+            "coalesced": self.coalesced,
+            "failovers": self.failovers,
+            "endpoints": {
+                endpoint: {
+                    "requests": len(stats.recent()),
+                    "latency_p50": stats.percentile(0.5),
+                    "latency_p99": stats.percentile(0.99),
+                    "error_rate": stats.error_rate,
+                    "lagging": endpoint in self.lagging,
+                    "rate_limit": self.limiters[endpoint].metrics(),
+                }
+                for endpoint, stats in self.stats.items()
+            },
+        }
+
+    # --- helpers --- #
+
+    def _cached(self, key):
+        method = key[0]
+        if method in IMMUTABLE_METHODS:
+            return self._immutable.get(key)
+        if method in BLOCK_SCOPED_METHODS and self._head_is_fresh():
+            return self._block_cache.get(key)
+        return None
+
+    async def _read(self, key, method, params):
+        block_scoped = method in BLOCK_SCOPED_METHODS and "pending" not in params
+        if block_scoped:
+            # the head is checked first, so the response is cached under a block
+            # number no later than the one it was read at
+            head = await self._current_head()
+        if method == "eth_blockNumber":
+            response = {"jsonrpc": "2.0", "id": 0, "result": hex(head)}
+        else:
+            response = await self._request(method, params)
+        if "error" in response:
+            return response
+        if method in IMMUTABLE_METHODS:
+            self._immutable[key] = response
+        elif block_scoped and head == self._head:
+            self._block_cache[key] = response
+        elif method == "eth_getTransactionReceipt":
+            # a receipt from a newer block than we knew of means cached reads are
+            # out of date
+            receipt = response.get("result") or {}
+            if receipt.get("blockNumber"):
+                self._observe_head(int(receipt["blockNumber"], 16))
+        return response
+
+    def _head_is_fresh(self):
+        return (
+            self._head_checked_at is not None
+            and time.monotonic() - self._head_checked_at < self.head_ttl
+        )
+
+    async def _current_head(self):
+        if not self._head_is_fresh():
+            task = self._in_flight.get("head")
+            if task is None:
+                task = asyncio.ensure_future(self._request("eth_blockNumber", []))
+                self._in_flight["head"] = task
+                task.add_done_callback(lambda _: self._in_flight.pop("head", None))
+            response = await asyncio.shield(task)
+            if "error" in response:
+                raise Exception(f"Can't read the block number: {response['error']}")
+            self._observe_head(int(response["result"], 16))
+            self._head_checked_at = time.monotonic()
+        return self._head
+
+    def _observe_head(self, head):
+        if self._head is None or head > self._head:
+            self._head = head
+            self._block_cache.clear()
+
+    async def _request(self, method, params):
+        response = await self._send(self.encode_rpc_request(method, params), method)
+        if method == "eth_sendRawTransaction" and _already_known(response):
+            return {
+                "jsonrpc": "2.0",
+                "id": response.get("id"),
+                "result": "0x" + keccak(hexstr=params[0]).hex(),
+            }
+        return response
+
+    async def _send(self, request_data, description):
+        """
+        Sends request_data to each ranked endpoint in turn until one answers,
+        starting over after a backoff if they were all rate limiting us.
+        """
+        for attempt in range(self.max_retries + 1):
+            errors = []
+            rate_limited = True
+            ranked = self.ranked()
+            for i, endpoint in enumerate(ranked):
+                if i:
+                    self.failovers += 1
+                    METRICS.count("rpc_failovers")
+                try:
+                    return await self._post(endpoint, request_data)
+                except RateLimited as e:
+                    errors.append(f"{endpoint}: {e}")
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    errors.append(f"{endpoint}: {e or type(e).__name__}")
+                    rate_limited = False
+            if not rate_limited or attempt == self.max_retries:
+                break
+            await asyncio.sleep(self.limiters[ranked[0]].backoff(attempt))
+        # an OSError, so w3.is_connected() reports False rather than raising
+        raise ConnectionError(
+            f"No RPC endpoint could serve {description}: {'; '.join(errors)}"
+        )
+
+    async def _post(self, endpoint, request_data):
+        limiter = self.limiters[endpoint]
+        await limiter.acquire()
+        self.requests += 1
+        METRICS.count("rpc_requests")
+        started_at = time.monotonic()
+        try:
+            with METRICS.span("rpc.request"):
+                async with self.session.post(
+                    endpoint,
+                    data=request_data,
+                    headers={"Content-Type": "application/json"},
+                ) as response:
+                    status, headers = response.status, response.headers
+                    if status in THROTTLE_STATUSES:
+                        limiter.record(status, headers)
+                        raise RateLimited(f"HTTP {status}")
+                    response.raise_for_status()
+                    decoded = self.decode_rpc_response(await response.read())
+            # a batch comes back as a list of responses
+            for item in decoded if isinstance(decoded, list) else [decoded]:
+                error = item.get("error")
+                if isinstance(error, dict) and error.get("code") == LIMIT_EXCEEDED:
+                    limiter.record(429, headers)
+                    raise RateLimited(error.get("message"))
+        except Exception:
+            self.stats[endpoint].record(time.monotonic() - started_at, error=True)
+            raise
+        limiter.record(status, headers)
+        self.stats[endpoint].record(time.monotonic() - started_at)
+        return decoded
+
+    async def _endpoint_head(self, endpoint):
+        try:
+            response = await self._post(
+                endpoint, self.encode_rpc_request("eth_blockNumber", [])
+            )
+            return int(response["result"], 16)
+        except Exception:
+            return None
+
+    def _schedule_health_check(self):
+        if len(self.endpoints) < 2 or (
+            self._health_check is not None and not self._health_check.done()
+        ):
+            return
+        now = time.monotonic()
+        if now - self._health_checked_at >= self.health_interval:
+            self._health_checked_at = now
+            self._health_check = asyncio.ensure_future(self.check_health())
+
+
+def _already_known(response):
+    error = response.get("error")
+    message = (error.get("message") or "") if isinstance(error, dict) else ""
+    return any(known in message.lower() for known in ALREADY_KNOWN_ERRORS)
@@ -0,0 +1,122 @@
+import asyncio
+import os
+
+from aiohttp import web
+
+from minty_py.daemon import DEFAULT_SOCKET_PATH
+from minty_py.metrics import METRICS, OPENMETRICS_CONTENT_TYPE
+from minty_py.minty import make_minty
+from minty_py.minty_types import NFTOptions
+
+
+def make_app(minty):
+    """
+    Builds the daemon's HTTP API around one long lived Minty instance:
+     - POST /mint        {image_path, name, description, owner}
+     - GET  /nft/{id}    ?creation_info=1
+     - POST /transfer    {token_id, to_address}
+     - POST /pin         {token_id}
+     - GET  /metrics     OpenMetrics for Prometheus
+    """
+    routes = web.RouteTableDef()
+
+    @routes.get("/health")
+    async def health(request):
+        return web.json_response({"ok": True})
+
+    @routes.post("/mint")
+    async def mint(request):
+        options = NFTOptions(**await request.json())
+        return web.json_response(await minty.create_nft_from_asset_file(options))
+
+    @routes.get("/nft/{token_id}")
+    async def show(request):
+        opts = {"fetchCreationInfo": request.query.get("creation_info") == "1"}
+        nft = await minty.get_nft(int(request.match_info["token_id"]), opts)
+        return web.json_response(nft)
+
+    @routes.post("/transfer")
+    async def transfer(request):
+        body = await request.json()
+        await minty.transfer_token(body["token_id"], body["to_address"])
+        return web.json_response({})
+
+    @routes.post("/pin")
+    async def pin(request):
+        body = await request.json()
+        asset_uri, metadata_uri = await minty.pin_token_data(body["token_id"])
+        return web.json_response({"assetURI": asset_uri, "metadataURI": metadata_uri})
+
+    @web.middleware
+    async def errors_as_json(request, handler):
+        try:
+            return await handler(request)
+        except web.HTTPException:
+            raise
+        except Exception as e:
+            return web.json_response({"error": str(e)}, status=500)
+
+    app = web.Application(middlewares=[errors_as_json])
+    app.add_routes(routes)
+    app.router.add_get("/metrics", metrics)
+    return app
+
+
+async def metrics(request):
+    return web.Response(
+        body=METRICS.render(openmetrics=True).encode(),
+        headers={"Content-Type": OPENMETRICS_CONTENT_TYPE},
+    )
+
+
+async def run_server(socket_path: str = DEFAULT_SOCKET_PATH, metrics_port=None):
+    """
+    Serves make_app on socket_path. Prometheus can't scrape a unix socket, so with
+    metrics_port /metrics alone is also served on that port of localhost. Refuses to
+    start if another daemon is already serving on socket_path.
+    """
+    if await _is_serving(socket_path):
+        raise Exception(f"A Minty daemon is already serving on {socket_path}")
+    minty = await make_minty()
+    runner = web.AppRunner(make_app(minty))
+    await runner.setup()
+    metrics_runner = None
+    if metrics_port:
+        metrics_app = web.Application()
+        metrics_app.router.add_get("/metrics", metrics)
+        metrics_runner = web.AppRunner(metrics_app)
+        await metrics_runner.setup()
+        await web.TCPSite(metrics_runner, "127.0.0.1", metrics_port).start()
+
+    os.makedirs(os.path.dirname(socket_path), exist_ok=True)
+    if os.path.exists(socket_path):
+        # nothing answered on it, so it was left behind by a daemon that exited
+        os.remove(socket_path)
+    site = web.UnixSite(runner, socket_path)
+    await site.start()
+    print(f"🌿 Minty is serving on {socket_path}")
+    if metrics_port:
+        print(f"🌿 Metrics are at http://127.0.0.1:{metrics_port}/metrics")
+
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        await minty.close()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+# --- helpers --- #
+
+
+async def _is_serving(socket_path):
+    try:
+        _, writer = await asyncio.open_unix_connection(socket_path)
+    except (FileNotFoundError, ConnectionRefusedError):
+        return False
+    writer.close()
+    await writer.wait_closed()
+    return True
@@ -0,0 +1,168 @@
+"""
+Signs transactions away from the event loop. Signing one takes milliseconds of
+pure CPU (ECDSA and RLP encoding), so sending thousands inline caps throughput
+at one core and stalls I/O meanwhile.
+
+SigningPool signs in a pool of worker processes. For air gapped signing,
+write_unsigned writes built transactions to a file, sign_file signs it on the
+offline machine, and read_signed reads the result back to be sent.
+"""
+import asyncio
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+# the account each worker process signs with, set by _init_worker
+_account = None
+
+
+class SigningPool:
+    """
+    Signs transactions for the account of private_key in `workers` processes (one
+    per core by default). Results come back in the order the transactions were
+    given, as (raw transaction, transaction hash) bytes.
+    """
+
+    def __init__(self, private_key, workers: int = None, batch_size: int = 64):
+        self.private_key = private_key
+        self.workers = workers or os.cpu_count()
+        self.batch_size = batch_size
+        self._executor = None
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            # spawned rather than forked, as the parent is running an event loop;
+            # the key is handed to each worker once rather than with every batch
+            self._executor = ProcessPoolExecutor(
+                self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.private_key,),
+            )
+        return self._executor
+
+    @property
+    def address(self):
+        from eth_account import Account
+
+        return Account.from_key(self.private_key).address
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    async def sign(self, transaction):
+        return (await self.sign_many([transaction]))[0]
+
+    async def sign_many(self, transactions):
+        # batches spread the work over every worker while keeping the per task
+        # overhead of pickling and IPC small
+        transactions = list(transactions)
+        batch_size = max(
+            1, min(self.batch_size, -(-len(transactions) // self.workers))
+        )
+        loop = asyncio.get_running_loop()
+        batches = await asyncio.gather(
+            *(
+                loop.run_in_executor(
+                    self.executor, _sign_batch, transactions[i : i + batch_size]
+                )
+                for i in range(0, len(transactions), batch_size)
+            )
+        )
+        return [signed for batch in batches for signed in batch]
+
+
+def write_unsigned(path, transactions):
+    """Writes built, unsigned transactions to path, one JSON object per line."""
+    with open(path, "w") as f:
+        for transaction in transactions:
+            f.write(json.dumps(transaction, sort_keys=True) + "\n")
+
+
+def read_unsigned(path):
+    with open(path, "r") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def sign_file(unsigned_path, signed_path, private_key, workers: int = None):
+    """
+    Signs every transaction written by write_unsigned, e.g. on an offline machine,
+    and writes them to signed_path in the same order. Returns how many were signed.
+    Raises before signing any if one isn't from private_key's account.
+    """
+    transactions = read_unsigned(unsigned_path)
+    pool = SigningPool(private_key, workers=workers)
+    address = pool.address
+    for transaction in transactions:
+        sender = transaction.get("from") or ""
+        if sender.lower() != address.lower():
+            raise ValueError(
+                f"Transaction {transaction['nonce']} in {unsigned_path} is from "
+                f"{sender or 'no account'}, but the key is for {address}"
+            )
+
+    async def sign_all():
+        try:
+            return await pool.sign_many(transactions)
+        finally:
+            pool.close()
+
+    signed = asyncio.run(sign_all())
+    with open(signed_path, "w") as f:
+        for transaction, (raw_transaction, tx_hash) in zip(transactions, signed):
+            record = {
+                "from": transaction["from"],
+                "nonce": transaction["nonce"],
+                "hash": "0x" + tx_hash.hex(),
+                "raw": "0x" + raw_transaction.hex(),
+            }
+            f.write(json.dumps(record) + "\n")
+    return len(signed)
+
+
+def read_signed(path):
+    """
+    Returns the dicts of from, nonce, hash and raw (the 0x prefixed raw
+    transaction) in a file written by sign_file, in nonce order.
+    """
+    with open(path, "r") as f:
+        signed = [json.loads(line) for line in f if line.strip()]
+    return sorted(signed, key=lambda record: record["nonce"])
+
+
+class WatchOnlyAccount:
+    """
+    An account known only by its address, for building transactions that are
+    signed elsewhere.
+    """
+
+    def __init__(self, address: str):
+        self.address = address
+
+    def sign_transaction(self, transaction):
+        raise Exception(
+            f"{self.address} is watch only, its transactions have to be signed "
+            "offline with sign_file"
+        )
+
+
+# --- worker --- #
+
+
+def _init_worker(private_key):
+    global _account
+    from eth_account import Account
+
+    _account = Account.from_key(private_key)
+
+
+def _sign_batch(transactions):
+    signed = []
+    for transaction in transactions:
+        signed_txn = _account.sign_transaction(transaction)
+        signed.append((bytes(signed_txn.rawTransaction), bytes(signed_txn.hash)))
+    return signed
@@ -0,0 +1,122 @@
+import asyncio
+import csv
+import itertools
+
+from web3 import Web3
+
+from minty_py.rpc_batch import RPCError
+from minty_py.tx_manager import SendError
+
+
+def read_transfers(path):
+    """
+    Yields (line number, token id, recipient) for each row of a .csv file with
+    token_id and to_address columns, reading it as it goes.
+    """
+    with open(path, newline="") as f:
+        reader = csv.DictReader(f)
+        missing = {"token_id", "to_address"} - set(reader.fieldnames or ())
+        if missing:
+            raise ValueError(f"{path} needs a {' and '.join(sorted(missing))} column")
+        for row in reader:
+            line_number = reader.line_num
+            token_id, to_address = row["token_id"], (row["to_address"] or "").strip()
+            try:
+                token_id = int(token_id)
+            except (TypeError, ValueError):
+                raise ValueError(f"{path}:{line_number}: bad token_id {token_id}")
+            if not Web3.is_address(to_address):
+                raise ValueError(f"{path}:{line_number}: bad to_address {to_address}")
+            yield line_number, token_id, Web3.to_checksum_address(to_address)
+
+
+async def transfer_tokens(minty, transfers, batch_size: int = 500, progress=None):
+    """
+    Sends a safeTransferFrom for each (line number, token id, recipient) in
+    transfers, an iterable consumed batch_size rows at a time.
+
+    Each batch's current owners are read with batched ownerOf calls first. Rows
+    whose token already belongs to its recipient (e.g. done by an earlier run) are
+    skipped, and ones that can't succeed (the token doesn't exist, or isn't owned by
+    the sending account) fail without a transaction. The rest are sent max_pending
+    at a time, pipelined with the waits for the ones before them.
+    progress(stats) is called after each batch.
+    """
+    account = minty.account.address
+    tx_manager = minty.tx_manager
+    stats = {"rows": 0, "transferred": 0, "skipped": 0, "failed": {}}
+
+    async def confirm(line_number, token_id, to_address, pending):
+        try:
+            receipt = await tx_manager.wait(pending)
+            if receipt["status"] != 1:
+                raise Exception(
+                    f"Transfer transaction {receipt['transactionHash'].hex()} failed"
+                )
+        except Exception as e:
+            stats["failed"][line_number] = str(e)
+            return
+        minty.owners.set(token_id, to_address)
+        stats["transferred"] += 1
+
+    def transfer_function(token_id, to_address):
+        return minty.contract.functions.safeTransferFrom(account, to_address, token_id)
+
+    async def send(rows, waits):
+        error = None
+        try:
+            pendings = await tx_manager.send_many(
+                [transfer_function(token_id, to) for _, token_id, to in rows]
+            )
+        except SendError as e:
+            error, pendings = e, e.pendings
+        except Exception as e:
+            error, pendings = e, [None] * len(rows)
+
+        unsent = []
+        for row, pending in zip(rows, pendings):
+            if pending is None:
+                unsent.append(row)
+            else:
+                waits.append(asyncio.create_task(confirm(*row, pending)))
+        if error is None:
+            return
+        if len(unsent) == 1:
+            stats["failed"][unsent[0][0]] = str(error)
+            return
+        # one bad row fails the rest of the send, so find it by sending the rows
+        # that weren't sent one by one
+        for row in unsent:
+            await send([row], waits)
+
+    transfers = iter(transfers)
+    while True:
+        batch = list(itertools.islice(transfers, batch_size))
+        if not batch:
+            break
+        stats["rows"] += len(batch)
+        owners = await minty.get_token_owners([token_id for _, token_id, _ in batch])
+
+        to_send, seen = [], set()
+        for line_number, token_id, to_address in batch:
+            owner = owners[token_id]
+            if isinstance(owner, RPCError):
+                stats["failed"][line_number] = f"Can't read the owner: {owner}"
+            elif owner == to_address:
+                stats["skipped"] += 1
+            elif token_id in seen:
+                stats["failed"][line_number] = f"Token {token_id} is in an earlier row"
+            elif owner != account:
+                stats["failed"][line_number] = f"Token {token_id} is owned by {owner}"
+            else:
+                to_send.append((line_number, token_id, to_address))
+                seen.add(token_id)
+
+        waits = []
+        for i in range(0, len(to_send), tx_manager.max_pending):
+            await send(to_send[i : i + tx_manager.max_pending], waits)
+        await asyncio.gather(*waits)
+        if progress:
+            progress(stats)
+
+    return stats
@@ -0,0 +1,36 @@
+import time
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    A dict whose entries expire ttl seconds after they were set.
+    ttl=None keeps entries forever, for values that can't change such as tokenURIs.
+    """
+
+    def __init__(self, ttl: float = None):
+        self.ttl = ttl
+        self._entries = {}
+
+    def get(self, key, default=None):
+        value, expires_at = self._entries.get(key, (_MISSING, None))
+        if value is _MISSING:
+            return default
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._entries[key]
+            return default
+        return value
+
+    def set(self, key, value):
+        expires_at = None if self.ttl is None else time.monotonic() + self.ttl
+        self._entries[key] = (value, expires_at)
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        self._entries.clear()
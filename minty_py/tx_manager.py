@@ -0,0 +1,442 @@
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable
+
+from hexbytes import HexBytes
+from web3.exceptions import TransactionNotFound
+
+from minty_py.metrics import METRICS
+from minty_py.nonce_manager import NonceManager
+from minty_py.receipts import ReceiptTracker
+from minty_py.ttl_cache import TTLCache
+
+DEFAULT_PRIORITY_FEE = 10**9  # 1 gwei
+MIN_FEE_BUMP = 0.125  # nodes require replacements to pay at least 10% more
+
+
+class SendError(Exception):
+    """
+    Raised by TransactionManager.send_many when it fails after sending some of the
+    transactions. pendings has the PendingTransaction of each one sent, which still
+    has to be waited on, and None in place of the rest.
+    """
+
+    def __init__(self, message, pendings):
+        super().__init__(message)
+        self.pendings = pendings
+
+
+@dataclass
+class PendingTransaction:
+    nonce: int
+    transaction: dict
+    tx_hashes: list
+    sent_at: float
+    last_sent_at: float
+    done: bool = field(default=False)
+    on_signed: Callable = field(default=None)
+    # the address it's from, as transaction is None for ones sent already signed
+    sender: str = field(default=None)
+
+    @property
+    def tx_hash(self):
+        return self.tx_hashes[-1]
+
+
+class TransactionManager:
+    """
+    Every write from one account goes through here:
+     - nonces are handed out locally by a NonceManager
+     - EIP-1559 fees are estimated from the recent base fees and priority fees
+       (falling back to gasPrice on chains without a base fee)
+     - transactions still unmined replace_after seconds after they were sent are
+       re-sent with the same nonce and fees raised by fee_bump
+     - at most max_pending transactions are outstanding at a time; send waits for a
+       slot, which is freed when wait returns, so every send must be waited on
+     - transactions are signed inline, or by signer (a signing.SigningPool) in
+       other processes
+     - receipts are waited for together by a receipts.ReceiptTracker, which reads
+       each new block once rather than polling for every transaction, and counts
+       them once their block is confirmations deep
+    """
+
+    def __init__(
+        self,
+        w3,
+        account,
+        max_pending: int = 16,
+        replace_after: float = 120,
+        fee_bump: float = MIN_FEE_BUMP,
+        poll_interval: float = 2,
+        timeout: float = 1800,
+        fee_history_blocks: int = 10,
+        fee_cache_ttl: float = 6,
+        signer=None,
+        confirmations: int = 1,
+        receipts=None,
+    ):
+        self.w3 = w3
+        self.account = account
+        self.max_pending = max_pending
+        self.replace_after = replace_after
+        self.fee_bump = max(fee_bump, MIN_FEE_BUMP)
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.fee_history_blocks = fee_history_blocks
+        self.nonces = NonceManager(w3, account.address)
+        self.signer = signer
+        self.receipts = receipts or ReceiptTracker(
+            w3, poll_interval=poll_interval, confirmations=confirmations
+        )
+        self.confirmation_latencies = deque(maxlen=1000)
+        self.confirmed = 0
+        self.pending = 0
+        self.replacements = 0
+        self._fees = TTLCache(ttl=fee_cache_ttl)
+        self._slots = asyncio.Semaphore(max_pending)
+
+    async def close(self):
+        await self.receipts.close()
+
+    async def transact(self, contract_function):
+        """Sends a call to contract_function and returns its receipt once mined."""
+        return await self.wait(await self.send(contract_function))
+
+    async def send(self, contract_function, on_signed=None):
+        """
+        Signs and sends a call to contract_function (or a contract constructor)
+        without waiting for it to be mined. Returns a PendingTransaction to wait on.
+        on_signed(transaction, tx_hash) is awaited after this and every replacement
+        is signed and before it's sent, e.g. to journal it; if it raises, nothing
+        is sent.
+        """
+        await self._slots.acquire()
+        self.pending += 1
+        try:
+            transaction = await self.build(contract_function)
+            try:
+                tx_hash = await self._sign_and_send(transaction, on_signed)
+            except Exception:
+                # the nonce was never used, so resync with the node before the next send
+                await self.nonces.reset(transaction["nonce"])
+                raise
+        except Exception:
+            self._release_slot()
+            raise
+        await self.nonces.sent(transaction["nonce"])
+
+        now = time.monotonic()
+        return PendingTransaction(
+            transaction["nonce"],
+            transaction,
+            [tx_hash],
+            now,
+            now,
+            on_signed=on_signed,
+            sender=self.account.address,
+        )
+
+    async def send_many(self, contract_functions, on_signed=None):
+        """
+        Like send for each of contract_functions, but they are built concurrently
+        and signed together, which a SigningPool signer spreads over every core,
+        then sent back to back in nonce order. on_signed is a list with a callback
+        (or None) for each. Returns their PendingTransactions in the same order.
+        Takes at most max_pending functions, as none is waited on until all are sent.
+        If it fails after sending some, it raises a SendError with the ones sent.
+        """
+        count = len(contract_functions)
+        if count > self.max_pending:
+            raise ValueError(
+                f"Can send at most {self.max_pending} at once, not {count}"
+            )
+        on_signed = on_signed or [None] * count
+        for _ in range(count):
+            await self._slots.acquire()
+            self.pending += 1
+
+        transactions, tx_hashes = [], [None] * count
+        try:
+            built = await asyncio.gather(
+                *(self.build(function) for function in contract_functions),
+                return_exceptions=True,
+            )
+            # the nonces of the ones that were built are in flight until given back
+            transactions = [t for t in built if not isinstance(t, BaseException)]
+            for result in built:
+                if isinstance(result, BaseException):
+                    raise result
+            signed = await self._sign_many(transactions)
+            order = sorted(range(count), key=lambda i: transactions[i]["nonce"])
+            for i in order:
+                raw_transaction, tx_hash = signed[i]
+                if on_signed[i] is not None:
+                    await on_signed[i](transactions[i], "0x" + bytes(tx_hash).hex())
+                with METRICS.span("tx.send"):
+                    tx_hashes[i] = await self.w3.eth.send_raw_transaction(
+                        raw_transaction
+                    )
+                await self.nonces.sent(transactions[i]["nonce"])
+        except Exception as e:
+            # the nonces from the first unsent one on were never used; the ones sent
+            # keep their slots until they're waited on
+            for transaction, tx_hash in zip(transactions, tx_hashes):
+                if tx_hash is None:
+                    await self.nonces.reset(transaction["nonce"])
+            sent = sum(tx_hash is not None for tx_hash in tx_hashes)
+            for _ in range(count - sent):
+                self._release_slot()
+            if not sent:
+                raise
+            raise SendError(
+                str(e), self._pendings(transactions, tx_hashes, on_signed)
+            ) from e
+
+        return self._pendings(transactions, tx_hashes, on_signed)
+
+    async def send_signed(self, raw_transaction, nonce):
+        """
+        Sends a transaction signed elsewhere, e.g. by signing.sign_file. It can't
+        be replaced with higher fees, so wait only waits for it.
+        """
+        await self._slots.acquire()
+        self.pending += 1
+        try:
+            with METRICS.span("tx.send"):
+                tx_hash = await self.w3.eth.send_raw_transaction(raw_transaction)
+        except Exception:
+            self._release_slot()
+            raise
+        now = time.monotonic()
+        return PendingTransaction(
+            nonce, None, [tx_hash], now, now, sender=self.account.address
+        )
+
+    async def build(self, contract_function):
+        """
+        Builds a call to contract_function with the next nonce and current fees,
+        without signing it. The nonce stays in flight until it's passed to
+        nonces.sent, or to nonces.reset if the transaction isn't sent.
+        """
+        nonce = await self.nonces.next_nonce()
+        try:
+            fees = await self.estimate_fees()
+            with METRICS.span("tx.build"):
+                # gas is estimated without the nonce, which may be ahead of the ones
+                # the node has seen when many are built at once
+                transaction = await contract_function.build_transaction(
+                    {"from": self.account.address, **fees}
+                )
+        except Exception:
+            await self.nonces.reset(nonce)
+            raise
+        transaction["nonce"] = nonce
+        return transaction
+
+    async def resume(self, transaction, tx_hashes, on_signed=None):
+        """
+        Picks up a transaction sent before a restart, whose versions were sent as
+        tx_hashes and the last of which is transaction. That one is sent again in
+        case the node dropped it; wait on the returned PendingTransaction as usual.
+        Resume everything before the first send, so no nonce is handed out twice.
+        """
+        await self._slots.acquire()
+        self.pending += 1
+        try:
+            raw_transaction, _ = (await self._sign_many([transaction]))[0]
+            await self.w3.eth.send_raw_transaction(raw_transaction)
+        except ValueError:
+            # already known to the node, or a version of it was mined
+            pass
+        except Exception:
+            self._release_slot()
+            raise
+        await self.nonces.reset()
+
+        now = time.monotonic()
+        return PendingTransaction(
+            transaction["nonce"],
+            transaction,
+            [HexBytes(tx_hash) for tx_hash in tx_hashes],
+            now,
+            now,
+            on_signed=on_signed,
+            sender=self.account.address,
+        )
+
+    async def wait(self, pending: PendingTransaction):
+        """
+        Returns the receipt of whichever version of the transaction was mined,
+        replacing it with higher fees whenever it has been waiting too long.
+        """
+        try:
+            while True:
+                # until it's time to replace it or give up on it
+                deadline = pending.sent_at + self.timeout
+                if pending.transaction is not None:
+                    deadline = min(deadline, pending.last_sent_at + self.replace_after)
+                receipt = await self.receipts.wait(
+                    pending.tx_hashes, max(0, deadline - time.monotonic())
+                )
+                if receipt is not None:
+                    latency = time.monotonic() - pending.sent_at
+                    self.confirmed += 1
+                    self.confirmation_latencies.append(latency)
+                    METRICS.observe("tx.wait", latency)
+                    METRICS.count("tx_confirmed")
+                    METRICS.count("gas_used", receipt.get("gasUsed", 0))
+                    return receipt
+
+                now = time.monotonic()
+                if now - pending.sent_at >= self.timeout:
+                    raise Exception(
+                        f"Transaction {pending.tx_hash.hex()} was not mined within "
+                        f"{self.timeout} seconds"
+                    )
+                if (
+                    pending.transaction is not None
+                    and now - pending.last_sent_at >= self.replace_after
+                ):
+                    await self._replace(pending)
+        finally:
+            if not pending.done:
+                pending.done = True
+                self._release_slot()
+
+    async def estimate_fees(self):
+        fees = self._fees.get("fees")
+        if fees is None:
+            fees = await self._estimate_fees()
+            self._fees.set("fees", fees)
+        return fees
+
+    def metrics(self):
+        return transaction_metrics([self])
+
+    async def _estimate_fees(self):
+        try:
+            history = await self.w3.eth.fee_history(
+                self.fee_history_blocks, "latest", [50]
+            )
+        except Exception:
+            history = None
+        if not history or not history.get("baseFeePerGas"):
+            return {"gasPrice": await self.w3.eth.gas_price}
+
+        # the last entry is the base fee of the next block
+        next_base_fee = history["baseFeePerGas"][-1]
+        tips = sorted(reward[0] for reward in history.get("reward") or [] if reward)
+        priority_fee = tips[len(tips) // 2] if tips else DEFAULT_PRIORITY_FEE
+        # leaves room for the base fee to double before the transaction is priced out
+        return {
+            "maxFeePerGas": 2 * next_base_fee + priority_fee,
+            "maxPriorityFeePerGas": priority_fee,
+        }
+
+    async def find_receipt(self, tx_hashes):
+        """Returns the receipt of whichever of tx_hashes was mined, if any."""
+        # any of the versions sent with one nonce may be the one that got mined
+        for tx_hash in reversed(tx_hashes):
+            try:
+                return await self.w3.eth.get_transaction_receipt(tx_hash)
+            except TransactionNotFound:
+                continue
+        return None
+
+    async def _replace(self, pending):
+        fees = await self._estimate_fees()
+        transaction = dict(pending.transaction)
+        # the replacement keeps the original's type of fees, each raised by at least
+        # fee_bump, as nodes compare them field by field
+        if "maxFeePerGas" in transaction:
+            estimated = {
+                "maxFeePerGas": fees.get("maxFeePerGas", fees.get("gasPrice")),
+                "maxPriorityFeePerGas": fees.get("maxPriorityFeePerGas", 0),
+            }
+            transaction.pop("gasPrice", None)
+        else:
+            estimated = {"gasPrice": fees.get("gasPrice", fees.get("maxFeePerGas"))}
+            transaction.pop("maxFeePerGas", None)
+            transaction.pop("maxPriorityFeePerGas", None)
+        for key, fee in estimated.items():
+            bumped = int(transaction.get(key, 0) * (1 + self.fee_bump)) + 1
+            transaction[key] = max(bumped, fee)
+        if "maxFeePerGas" in transaction:
+            transaction["maxFeePerGas"] = max(
+                transaction["maxFeePerGas"], transaction["maxPriorityFeePerGas"]
+            )
+
+        pending.last_sent_at = time.monotonic()
+        try:
+            tx_hash = await self._sign_and_send(transaction, pending.on_signed)
+        except ValueError:
+            # most likely "nonce too low", i.e. an earlier version was just mined
+            return
+        pending.transaction = transaction
+        pending.tx_hashes.append(tx_hash)
+        self.replacements += 1
+        METRICS.count("tx_replacements")
+
+    def _pendings(self, transactions, tx_hashes, on_signed):
+        now = time.monotonic()
+        return [
+            None
+            if tx_hash is None
+            else PendingTransaction(
+                transaction["nonce"],
+                transaction,
+                [tx_hash],
+                now,
+                now,
+                on_signed=callback,
+                sender=self.account.address,
+            )
+            for transaction, tx_hash, callback in zip(
+                transactions, tx_hashes, on_signed
+            )
+        ]
+
+    def _release_slot(self):
+        self.pending -= 1
+        self._slots.release()
+
+    async def _sign_many(self, transactions):
+        """Returns (raw transaction, hash) bytes for each of transactions."""
+        with METRICS.span("tx.sign"):
+            if self.signer is not None:
+                return await self.signer.sign_many(transactions)
+            signed = []
+            for transaction in transactions:
+                signed_txn = self.account.sign_transaction(transaction)
+                signed.append((signed_txn.rawTransaction, signed_txn.hash))
+            return signed
+
+    async def _sign_and_send(self, transaction, on_signed=None):
+        raw_transaction, tx_hash = (await self._sign_many([transaction]))[0]
+        if on_signed is not None:
+            await on_signed(transaction, "0x" + bytes(tx_hash).hex())
+        with METRICS.span("tx.send"):
+            return await self.w3.eth.send_raw_transaction(raw_transaction)
+
+
+def transaction_metrics(tx_managers):
+    """Sums up what a list of TransactionManagers have sent and confirmed."""
+    latencies = sorted(
+        latency
+        for tx_manager in tx_managers
+        for latency in tx_manager.confirmation_latencies
+    )
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))]
+
+    return {
+        "confirmed": sum(tx_manager.confirmed for tx_manager in tx_managers),
+        "replaced": sum(tx_manager.replacements for tx_manager in tx_managers),
+        "pending": sum(tx_manager.pending for tx_manager in tx_managers),
+        "latency_p50": percentile(0.5) if latencies else None,
+        "latency_p95": percentile(0.95) if latencies else None,
+        "latency_max": latencies[-1] if latencies else None,
+    }
@@ -0,0 +1,218 @@
+import asyncio
+
+from minty_py.ttl_cache import TTLCache
+from minty_py.tx_manager import SendError, transaction_metrics
+
+
+class WalletPool:
+    """
+    Spreads writes over several minter accounts, each sending through its own
+    TransactionManager, so each has its own nonces and pending slots: N accounts
+    keep N times as many transactions in flight, and a stuck transaction only
+    holds up the ones behind it from the same account.
+
+    Each transaction goes to the funded account with the fewest pending for its
+    size, and no account is given more than it has free pending slots while
+    another funded one has some. An account is funded while its balance (read at
+    most every balance_ttl seconds, counting pending transactions), less what has
+    been dispatched to it since, covers min_balance plus the most the last
+    transaction sent could cost. Sends fail before anything is sent when no account
+    is, and capacity() says how many can be sent without waiting for a slot.
+    """
+
+    def __init__(self, tx_managers, min_balance: int = 0, balance_ttl: float = 30):
+        self.tx_managers = list(tx_managers)
+        if not self.tx_managers:
+            raise ValueError("WalletPool needs at least one TransactionManager")
+        self.by_address = {
+            tx_manager.account.address: tx_manager for tx_manager in self.tx_managers
+        }
+        self.min_balance = min_balance
+        self._balances = TTLCache(ttl=balance_ttl)
+        self._spent = {}  # address -> cost dispatched since the balances were read
+        self._cost = 0  # the most the last transaction sent could cost
+
+    @property
+    def addresses(self):
+        return list(self.by_address)
+
+    @property
+    def max_pending(self):
+        return sum(tx_manager.max_pending for tx_manager in self.tx_managers)
+
+    async def capacity(self):
+        """
+        Returns how many transactions the funded accounts can take without waiting
+        for a pending slot, counting only as many per account as it can pay for.
+        Raises if no account is funded.
+        """
+        balances = await self.balances()
+        estimate = self._cost
+        room = 0
+        for tx_manager in self._funded(balances, estimate):
+            free = max(0, tx_manager.max_pending - tx_manager.pending)
+            if estimate:
+                spare = self._available(tx_manager, balances) - self.min_balance
+                free = min(free, spare // estimate)
+            room += free
+        return room
+
+    async def close(self):
+        for tx_manager in self.tx_managers:
+            await tx_manager.close()
+
+    def tx_manager_for(self, address):
+        tx_manager = self.by_address.get(address)
+        if tx_manager is None:
+            raise Exception(f"{address} isn't one of the minter accounts")
+        return tx_manager
+
+    async def transact(self, contract_function):
+        return await self.wait(await self.send(contract_function))
+
+    async def send(self, contract_function, on_signed=None):
+        return (await self.send_many([contract_function], [on_signed]))[0]
+
+    async def send_many(self, contract_functions, on_signed=None):
+        """
+        Like TransactionManager.send_many, with the functions shared out over the
+        accounts, each account's share sent concurrently. Takes at most the sum of
+        the funded accounts' max_pending; past capacity() it waits for slots. If
+        some were sent before another failed, raises a SendError with every account's
+        sent ones.
+        """
+        count = len(contract_functions)
+        on_signed = on_signed or [None] * count
+        estimate = self._cost
+        balances = await self.balances()
+        funded = self._funded(balances, estimate)
+        limit = sum(tx_manager.max_pending for tx_manager in funded)
+        if count > limit:
+            raise ValueError(
+                f"The funded minter accounts can send at most {limit} at once, "
+                f"not {count}"
+            )
+        shares = {}
+        for i, tx_manager in enumerate(self._assign(count, estimate, balances)):
+            shares.setdefault(tx_manager, []).append(i)
+
+        results = await asyncio.gather(
+            *(
+                tx_manager.send_many(
+                    [contract_functions[i] for i in share],
+                    [on_signed[i] for i in share],
+                )
+                for tx_manager, share in shares.items()
+            ),
+            return_exceptions=True,
+        )
+        pendings = [None] * count
+        error = None
+        for (tx_manager, share), result in zip(shares.items(), results):
+            if isinstance(result, BaseException):
+                error = error or result
+                if not isinstance(result, SendError):
+                    continue
+                result = result.pendings
+            for i, pending in zip(share, result):
+                if pending is None:
+                    continue
+                pendings[i] = pending
+                self._record_cost(tx_manager, pending.transaction, estimate)
+
+        if error is not None:
+            if any(pending is not None for pending in pendings):
+                raise SendError(str(error), pendings) from error
+            raise error
+        return pendings
+
+    async def wait(self, pending):
+        return await self.tx_manager_for(pending.sender).wait(pending)
+
+    async def balances(self):
+        """Returns {address: balance in wei}, including pending transactions."""
+        balances = self._balances.get("balances")
+        if balances is None:
+            values = await asyncio.gather(
+                *(
+                    tx_manager.w3.eth.get_balance(address, "pending")
+                    for address, tx_manager in self.by_address.items()
+                )
+            )
+            balances = dict(zip(self.by_address, values))
+            self._balances.set("balances", balances)
+            self._spent = {}
+        return balances
+
+    def metrics(self):
+        metrics = transaction_metrics(self.tx_managers)
+        metrics["accounts"] = {
+            address: tx_manager.metrics()
+            for address, tx_manager in self.by_address.items()
+        }
+        return metrics
+
+    # --- helpers --- #
+
+    def _assign(self, count, estimate, balances):
+        """
+        Returns the TransactionManager each of count transactions, estimated to
+        cost at most estimate each, should be sent by. Accounts with free slots are
+        filled first, and none gets more than the max_pending its send_many takes.
+        """
+        pending = {tx_manager: tx_manager.pending for tx_manager in self.tx_managers}
+        shares = {tx_manager: 0 for tx_manager in self.tx_managers}
+        assigned = []
+        for _ in range(count):
+            candidates = [
+                tx_manager
+                for tx_manager in self._funded(balances, estimate)
+                if shares[tx_manager] < tx_manager.max_pending
+            ]
+            if not candidates:
+                # the accounts with funds left have all been given their max_pending
+                raise Exception(
+                    f"The minter accounts can only pay for {len(assigned)} of "
+                    f"{count} transactions, fund one of {', '.join(self.addresses)}"
+                )
+            tx_manager = min(
+                candidates,
+                key=lambda tx_manager: (
+                    pending[tx_manager] / tx_manager.max_pending,
+                    -self._available(tx_manager, balances),
+                ),
+            )
+            pending[tx_manager] += 1
+            shares[tx_manager] += 1
+            self._spend(tx_manager, estimate)
+            assigned.append(tx_manager)
+        return assigned
+
+    def _funded(self, balances, estimate):
+        funded = [
+            tx_manager
+            for tx_manager in self.tx_managers
+            if self._available(tx_manager, balances) >= self.min_balance + estimate
+            and balances[tx_manager.account.address] > 0
+        ]
+        if not funded:
+            raise Exception(
+                "None of the minter accounts has the funds for another "
+                f"transaction, fund one of {', '.join(self.addresses)}"
+            )
+        return funded
+
+    def _available(self, tx_manager, balances):
+        address = tx_manager.account.address
+        return balances[address] - self._spent.get(address, 0)
+
+    def _spend(self, tx_manager, cost):
+        address = tx_manager.account.address
+        self._spent[address] = self._spent.get(address, 0) + cost
+
+    def _record_cost(self, tx_manager, transaction, estimate):
+        # estimate was set aside when it was assigned, so only the difference is new
+        fee = transaction.get("maxFeePerGas", transaction.get("gasPrice", 0))
+        cost = transaction.get("gas", 0) * fee + transaction.get("value", 0)
+        self._spend(tx_manager, cost - estimate)
+        self._cost = cost
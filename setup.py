@@ -6,5 +6,12 @@ setup(
     version="0.0.0",
     py_modules=["minty_py"],
     entry_points={"console_scripts": ["minty = minty_py.index:main"]},
-    
+    extras_require={
+        # faster canonical JSON for metadata
+        "fast": ["orjson"],
+        # minty create --preprocess
+        "images": ["Pillow"],
+        # the tests and benchmarks run against an in-process eth-tester chain
+        "test": ["pytest", "web3[tester]"],
+    },
 )
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# the in-process chain and IPFS node the benchmarks run against
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
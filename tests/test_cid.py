@@ -0,0 +1,47 @@
+from minty_py.cid import build_directory, cid_to_str, file_cid
+
+# CIDs `ipfs add` gives each content, as (CIDv0, CIDv1)
+KNOWN_FILES = [
+    (
+        b"",
+        "QmbFMke1KXqnYyBBWxB74N4c5SBnJMVAiMNRcGu6x1AwQH",
+        "bafkreihdwdcefgh4dqkjv67uzcmw7ojee6xedzdetojuzjevtenxquvyku",
+    ),
+    (
+        b"hello world",
+        "Qmf412jQZiuVUtdgnB36FXFX7xg5V6KEbSJ4dpQuhkLyfD",
+        "bafkreifzjut3te2nhyekklss27nh3k72ysco7y32koao5eei66wof36n5e",
+    ),
+    (
+        b"hello world\n",
+        "QmT78zSuBmuS4z925WZfrqQ1qHaJ56DQaTfyMUF7F8ff5o",
+        "bafkreifjjcie6lypi6ny7amxnfftagclbuxndqonfipmb64f2km2devei4",
+    ),
+    # one byte past the first 256KiB chunk
+    (
+        b"\0" * (256 * 1024 + 1),
+        "QmbVuw4C4vcmVKqxoWtgDVobvcHrSn51qsmQmyxjk4sB2Q",
+        "bafybeigllfqgfpqydppr6cmv56g7ax4wyhruzswvcefv6j5kj77nzttfki",
+    ),
+]
+
+
+def test_file_cid_v0():
+    for content, cid_v0, _ in KNOWN_FILES:
+        assert file_cid(content, cid_version=0) == cid_v0
+
+
+def test_file_cid_v1():
+    for content, _, cid_v1 in KNOWN_FILES:
+        assert file_cid(content, cid_version=1) == cid_v1
+
+
+def test_empty_directory():
+    assert (
+        cid_to_str(build_directory([], cid_version=0).cid)
+        == "QmUNLLsPACCz1vLxQVkXqqLX5R1X345qqfHbsf67hvA3Nn"
+    )
+    assert (
+        cid_to_str(build_directory([], cid_version=1).cid)
+        == "bafybeiczsscdsbs7ffqz55asqdf3smv6klcw3gofszvwlyarci47bgf354"
+    )
@@ -0,0 +1,231 @@
+import asyncio
+import time
+
+import pytest
+from aiohttp import web
+
+from minty_py.cid import build_directory, build_file, cid_to_str, file_cid, split_chunks
+from minty_py.gateways import GatewayPool
+
+CONTENT = bytes(range(256)) * 40
+CID = file_cid(CONTENT, 1)
+
+
+def add(content, blocks, chunk_size=1024, cid_version=1):
+    """
+    Lays content out in chunks of chunk_size, unlike `ipfs add`, storing its blocks
+    in blocks. Returns its DagNode.
+    """
+
+    def on_block(cid, block):
+        blocks[cid_to_str(cid)] = block
+
+    return build_file(split_chunks(content, chunk_size), cid_version, on_block)
+
+
+class Gateway:
+    """
+    A local gateway serving files from content, and blocks from blocks for
+    ?format=raw, answering after delay seconds with status, or with the wrong bytes
+    if corrupt. Range headers are honored unless ignore_range.
+    """
+
+    def __init__(self, delay=0, status=200, corrupt=False, ignore_range=False):
+        self.delay = delay
+        self.status = status
+        self.corrupt = corrupt
+        self.ignore_range = ignore_range
+        self.requests = 0
+        self.block_requests = []
+        self.content = {CID: CONTENT}
+        self.blocks = {}
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/ipfs/{path:.*}", self.serve)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}/ipfs/"
+        return self
+
+    async def stop(self):
+        await self._runner.cleanup()
+
+    async def serve(self, request):
+        self.requests += 1
+        await asyncio.sleep(self.delay)
+        if self.status != 200:
+            return web.Response(status=self.status, text="gateway error")
+        if request.query.get("format") == "raw":
+            self.block_requests.append(request.match_info["path"])
+            return web.Response(body=self.blocks[request.match_info["path"]])
+        content = self.content[request.match_info["path"]]
+        if self.corrupt:
+            content = content[::-1]
+        range_header = request.headers.get("Range")
+        if range_header is None or self.ignore_range:
+            return web.Response(body=content)
+        start, end = range_header[len("bytes=") :].split("-")
+        end = int(end) if end else len(content) - 1
+        return web.Response(status=206, body=content[int(start) : end + 1])
+
+
+def with_gateways(*gateways, **pool_kwargs):
+    """Runs test(pool, gateways) against a GatewayPool of the started gateways."""
+
+    def run(test):
+        async def main():
+            for gateway in gateways:
+                await gateway.start()
+            pool = GatewayPool([gateway.url for gateway in gateways], **pool_kwargs)
+            try:
+                await test(pool, gateways)
+            finally:
+                await pool.close()
+                for gateway in gateways:
+                    await gateway.stop()
+
+        asyncio.run(main())
+
+    return run
+
+
+def prime(pool, gateway, latency, samples=20):
+    for _ in range(samples):
+        pool.stats[gateway.url].record(latency)
+
+
+def test_hedges_after_the_best_gateways_p95():
+    async def test(pool, gateways):
+        slow, fast = gateways
+        # the slow one has been the fastest so far, so it's tried first
+        prime(pool, slow, 0.02)
+        prime(pool, fast, 0.05)
+        started_at = time.monotonic()
+        assert await pool.fetch(CID) == CONTENT
+        assert time.monotonic() - started_at < 0.5
+        assert pool.hedged == 1
+        assert slow.requests == fast.requests == 1
+        # the request given up on counts against the slow one
+        assert len(pool.stats[slow.url].recent()) == 21
+        assert pool.stats[slow.url].percentile(0.99) > 0.02
+
+    with_gateways(Gateway(delay=1), Gateway())(test)
+
+
+def test_fails_over_from_gateways_that_error():
+    async def test(pool, gateways):
+        broken, working = gateways
+        prime(pool, broken, 0.01)
+        prime(pool, working, 0.02)
+        # no waiting out the hedge delay once the first one fails
+        started_at = time.monotonic()
+        assert await pool.fetch(CID) == CONTENT
+        assert time.monotonic() - started_at < 1
+        assert pool.hedged == 0
+        assert pool.stats[broken.url].error_rate > 0
+
+    with_gateways(Gateway(status=502), Gateway(), hedge_delay=5)(test)
+
+
+def test_rejects_content_that_does_not_match_its_cid():
+    async def test(pool, gateways):
+        corrupt, honest = gateways
+        prime(pool, corrupt, 0.01)
+        prime(pool, honest, 0.02)
+        assert await pool.fetch(CID) == CONTENT
+        assert pool.stats[corrupt.url].error_rate > 0
+
+        # served as is when not verified
+        pool.stats[honest.url].record(10, error=True)
+        assert await pool.fetch(CID, verify=False) == CONTENT[::-1]
+
+    with_gateways(Gateway(corrupt=True), Gateway())(test)
+
+
+def test_gives_up_when_every_gateway_serves_bad_content():
+    async def test(pool, gateways):
+        with pytest.raises(Exception, match="No gateway could serve"):
+            await pool.fetch(CID)
+
+    with_gateways(Gateway(corrupt=True), Gateway(status=404))(test)
+
+
+@pytest.mark.parametrize("ignore_range", [False, True])
+def test_streams_byte_ranges(ignore_range):
+    async def test(pool, gateways):
+        async def read(start=None, end=None):
+            return b"".join([chunk async for chunk in pool.stream(CID, start, end)])
+
+        assert await read() == CONTENT
+        assert await read(1000, 5000) == CONTENT[1000:5001]
+        assert await read(start=9000) == CONTENT[9000:]
+        assert await read(end=99) == CONTENT[:100]
+        # chunk boundaries at the ends of the range
+        assert await read(1024, 2047) == CONTENT[1024:2048]
+
+    with_gateways(Gateway(ignore_range=ignore_range), chunk_size=1024)(test)
+
+
+@pytest.mark.parametrize("cid_version", [0, 1])
+def test_verifies_content_laid_out_differently_block_by_block(cid_version):
+    async def test(pool, gateways):
+        (gateway,) = gateways
+        cid = cid_to_str(add(CONTENT, gateway.blocks, cid_version=cid_version).cid)
+        gateway.content[cid] = CONTENT
+        assert await pool.fetch(cid) == CONTENT
+        assert set(gateway.block_requests) == set(gateway.blocks)
+
+        # the blocks can't be made to match content that's wrong
+        gateway.corrupt = True
+        with pytest.raises(Exception, match="No gateway could serve"):
+            await pool.fetch(cid)
+
+    with_gateways(Gateway())(test)
+
+
+def test_rejects_mismatches_under_roots_it_uploaded_without_reading_blocks():
+    async def test(pool, gateways):
+        (gateway,) = gateways
+        cid = cid_to_str(add(CONTENT, gateway.blocks).cid)
+        gateway.content[cid] = CONTENT
+        pool.uploaded.add(cid)
+        with pytest.raises(Exception, match="No gateway could serve"):
+            await pool.fetch(cid)
+        assert gateway.block_requests == []
+
+    with_gateways(Gateway())(test)
+
+
+def test_reads_a_directory_block_once_for_every_file_in_it():
+    async def test(pool, gateways):
+        (gateway,) = gateways
+        files = {f"{n}.json": b'{"name": "NFT %d"}' % n for n in range(1, 21)}
+        files["big.bin"] = CONTENT
+        nodes = {
+            name: build_file(split_chunks(content)) for name, content in files.items()
+        }
+        # chunked differently, so only its blocks can vouch for it
+        nodes["odd.bin"] = add(CONTENT, gateway.blocks)
+        files["odd.bin"] = CONTENT
+
+        def on_block(cid, block):
+            gateway.blocks[cid_to_str(cid)] = block
+
+        root = cid_to_str(build_directory(nodes.items(), on_block=on_block).cid)
+        for name, content in files.items():
+            gateway.content[f"{root}/{name}"] = content
+
+        paths = [f"{root}/{name}" for name in files]
+        contents = await asyncio.gather(*(pool.fetch(path) for path in paths * 2))
+        assert contents == [files[name] for name in files] * 2
+        assert gateway.block_requests.count(root) == 1
+
+        gateway.corrupt = True
+        with pytest.raises(Exception, match="No gateway could serve"):
+            await pool.fetch(f"{root}/1.json")
+
+    with_gateways(Gateway())(test)
@@ -0,0 +1,8 @@
+import import_time
+
+
+def test_cli_imports_within_budget():
+    imported, total_us = import_time.measure("minty_py.index")
+    assert total_us <= import_time.BUDGET_MS * 1000
+    for module in import_time.HEAVY_MODULES:
+        assert module not in imported
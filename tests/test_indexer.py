@@ -0,0 +1,143 @@
+import asyncio
+
+from fake_chain import make_chain
+
+from minty_py.indexer import TransferIndexer
+
+
+async def make_indexer(tmp_path, **kwargs):
+    w3, _, deploy_info = await make_chain()
+    contract = w3.eth.contract(
+        address=deploy_info["contract_address"], abi=deploy_info["abi"]
+    )
+    indexer = TransferIndexer(
+        w3,
+        contract.address,
+        start_block=deploy_info["tx_receipt"]["blockNumber"],
+        path=str(tmp_path / "index.sqlite"),
+        **kwargs,
+    )
+    return w3, contract, indexer
+
+
+async def transact(w3, contract_function, sender):
+    tx_hash = await contract_function.transact({"from": sender})
+    return await w3.eth.wait_for_transaction_receipt(tx_hash)
+
+
+async def mint(w3, contract, creator, owner):
+    receipt = await transact(
+        w3, contract.functions.mintToken(owner, "ipfs://token.json"), creator
+    )
+    (transfer,) = contract.events.Transfer().process_receipt(receipt)
+    return transfer["args"]["tokenId"], receipt
+
+
+async def transfer(w3, contract, token_id, sender, to):
+    await transact(w3, contract.functions.transferFrom(sender, to, token_id), sender)
+
+
+def test_indexes_mints_and_transfers(tmp_path):
+    async def main():
+        w3, contract, indexer = await make_indexer(tmp_path)
+        alice, bob, carol = (await w3.eth.accounts)[1:4]
+        try:
+            first, first_receipt = await mint(w3, contract, alice, alice)
+            second, _ = await mint(w3, contract, bob, alice)
+            await transfer(w3, contract, first, alice, carol)
+
+            head = await indexer.sync()
+            assert head == await w3.eth.block_number
+            assert indexer.token_ids() == [first, second]
+            assert indexer.tokens_of(alice) == [second]
+            assert indexer.tokens_of(carol.lower()) == [first]
+            assert indexer.get_token(first) == {
+                "tokenId": first,
+                "ownerAddress": carol,
+                "creatorAddress": alice,
+                "blockNumber": first_receipt["blockNumber"],
+                "transactionHash": first_receipt["transactionHash"].hex(),
+            }
+            assert indexer.get_token(second)["creatorAddress"] == bob
+
+            # picks up from the checkpoint without indexing anything twice
+            await transfer(w3, contract, second, alice, bob)
+            await indexer.sync()
+            assert indexer.tokens_of(alice) == []
+            assert indexer.tokens_of(bob) == [second]
+            assert indexer.token_ids() == [first, second]
+        finally:
+            await indexer.close()
+
+    asyncio.run(main())
+
+
+def test_rolls_back_a_reorg(tmp_path):
+    async def main():
+        w3, contract, indexer = await make_indexer(tmp_path)
+        tester = w3.provider.ethereum_tester
+        alice, bob, carol = (await w3.eth.accounts)[1:4]
+        try:
+            kept, _ = await mint(w3, contract, alice, alice)
+            tester.mine_blocks(5)
+            snapshot = tester.take_snapshot()
+
+            # a transfer and a mint that the reorg drops
+            await transfer(w3, contract, kept, alice, bob)
+            dropped, _ = await mint(w3, contract, alice, bob)
+            await indexer.sync()
+            assert indexer.tokens_of(bob) == [kept, dropped]
+
+            tester.revert_to_snapshot(snapshot)
+            await transfer(w3, contract, kept, alice, carol)
+            tester.mine_blocks(3)
+            await indexer.sync()
+            assert indexer.token_ids() == [kept]
+            assert indexer.get_token(dropped) is None
+            assert indexer.tokens_of(bob) == []
+            assert indexer.tokens_of(carol) == [kept]
+            assert indexer.checkpoint() == await w3.eth.block_number
+        finally:
+            await indexer.close()
+
+    asyncio.run(main())
+
+
+def test_shrinks_log_ranges_the_node_turns_down(tmp_path):
+    async def main():
+        w3, contract, indexer = await make_indexer(
+            tmp_path, chunk_size=64, max_chunk_size=64
+        )
+        alice = (await w3.eth.accounts)[1]
+        token_ids = []
+        for _ in range(6):
+            token_ids.append((await mint(w3, contract, alice, alice))[0])
+            w3.provider.ethereum_tester.mine_blocks(2)
+
+        get_logs = w3.eth.get_logs
+        ranges = []
+
+        async def limited_get_logs(params):
+            # like a node that caps how many blocks one eth_getLogs may cover
+            ranges.append((params["fromBlock"], params["toBlock"]))
+            if params["toBlock"] - params["fromBlock"] >= 4:
+                raise ValueError("query returned more than 10000 results")
+            return await get_logs(params)
+
+        w3.eth.get_logs = limited_get_logs
+        try:
+            progress = []
+            head = await indexer.sync(lambda block, _: progress.append(block))
+            assert head == await w3.eth.block_number
+            assert indexer.token_ids() == token_ids
+            # every block was covered once, in order, by the ranges that succeeded
+            covered = [(start, end) for start, end in ranges if end - start < 4]
+            assert len(covered) < len(ranges)
+            assert covered[0][0] == indexer.start_block
+            for (_, end), (start, _) in zip(covered, covered[1:]):
+                assert start == end + 1
+            assert covered[-1][1] == head == progress[-1]
+        finally:
+            await indexer.close()
+
+    asyncio.run(main())
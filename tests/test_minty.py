@@ -0,0 +1,45 @@
+import asyncio
+
+from fake_chain import make_chain
+
+from minty_py.minty import Minty
+
+
+async def make_minty(tmp_path):
+    w3, private_key, deploy_info = await make_chain()
+    minty = await Minty(
+        w3=w3,
+        deploy_info=deploy_info,
+        private_key=private_key,
+        use_cache=False,
+        index_path=str(tmp_path / "index.sqlite"),
+    )
+    return minty, deploy_info
+
+
+def test_mint_all_reports_failures_per_token(tmp_path):
+    async def main():
+        minty, deploy_info = await make_minty(tmp_path)
+        owner = minty.tx_manager.account.address
+        nfts = [
+            {"ownerAddress": owner, "metadataURI": f"ipfs://token/{n}.json"}
+            for n in range(6)
+        ]
+        # the contract can't receive tokens, so minting to it reverts
+        nfts[3]["ownerAddress"] = deploy_info["contract_address"]
+        try:
+            await minty.mint_all(nfts)
+            for n, nft in enumerate(nfts):
+                if n == 3:
+                    assert "tokenId" not in nft
+                    assert nft["error"]
+                    continue
+                assert "error" not in nft
+                assert await minty.contract.functions.tokenURI(
+                    nft["tokenId"]
+                ).call() == nft["metadataURI"]
+            assert len({nft["tokenId"] for nft in nfts if "tokenId" in nft}) == 5
+        finally:
+            await minty.close()
+
+    asyncio.run(main())
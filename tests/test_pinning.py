@@ -0,0 +1,58 @@
+import asyncio
+
+from fake_chain import make_chain
+from fake_ipfs import FakeIPFS
+
+from minty_py.ipfs_client import IPFSClient
+from minty_py.minty import Minty, strip_ipfs_uri_prefix
+from minty_py.minty_types import NFTOptions
+from minty_py.pinning import PinJournal, pin_tokens
+
+
+def test_pins_shared_cids_once(tmp_path):
+    async def main():
+        # slow enough that every token's pin is in flight at once
+        ipfs_node = await FakeIPFS(latency=0.05).start()
+        w3, private_key, deploy_info = await make_chain()
+        minty = await Minty(
+            w3=w3,
+            ipfs=IPFSClient("", "", ipfs_node.api_endpoint),
+            deploy_info=deploy_info,
+            private_key=private_key,
+            use_cache=False,
+            index_path=str(tmp_path / "index.sqlite"),
+            gateway_urls=[ipfs_node.gateway_url],
+        )
+        try:
+            options = []
+            for n in range(8):
+                path = tmp_path / f"asset-{n}.bin"
+                path.write_bytes(bytes([n]) * 100)
+                options.append(NFTOptions(f"NFT {n}", "pinned", None, str(path)))
+            nfts = await minty.create_collection(options)
+            # every token's metadata is in the root and its asset in the assets
+            # directory, so those are the only two CIDs to pin
+            roots = {
+                strip_ipfs_uri_prefix(nft[key]).split("/")[0]
+                for nft in nfts
+                for key in ("metadataURI", "assetURI")
+            }
+            ipfs_node.pins.clear()
+
+            journal = PinJournal(str(tmp_path / "pins.journal"))
+            token_ids = [nft["tokenId"] for nft in nfts]
+            stats = await pin_tokens(minty, token_ids, [minty.ipfs], journal=journal)
+            journal.close()
+
+            assert sorted(ipfs_node.pin_adds) == sorted(roots)
+            assert stats["tokens"] == len(nfts)
+            assert stats["pinned"] == len(roots) == 2
+            assert not stats["failed"]
+            journal = PinJournal(str(tmp_path / "pins.journal"))
+            assert journal.done == set(token_ids)
+            journal.close()
+        finally:
+            await minty.close()
+            await ipfs_node.stop()
+
+    asyncio.run(main())
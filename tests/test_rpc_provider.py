@@ -0,0 +1,109 @@
+import asyncio
+
+from aiohttp import web
+from eth_account import Account
+from web3 import Web3
+
+from minty_py.rpc_provider import MultiEndpointProvider
+
+
+class Endpoint:
+    """
+    A local JSON-RPC endpoint recording the requests it gets, answering them with
+    error if given, after delay seconds.
+    """
+
+    def __init__(self, delay=0, error=None):
+        self.delay = delay
+        self.error = error
+        self.requests = []
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post("/", self.serve)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}/"
+        return self
+
+    async def stop(self):
+        await self._runner.cleanup()
+
+    async def serve(self, request):
+        body = await request.json()
+        self.requests.append(body)
+        await asyncio.sleep(self.delay)
+        if self.error is not None:
+            return web.json_response(
+                {"jsonrpc": "2.0", "id": body["id"], "error": self.error}
+            )
+        return web.json_response({"jsonrpc": "2.0", "id": body["id"], "result": "0x1"})
+
+
+def signed_transaction():
+    account = Account.from_key("0x" + "22" * 32)
+    return account.sign_transaction(
+        {
+            "to": account.address,
+            "value": 0,
+            "gas": 21000,
+            "gasPrice": 10**9,
+            "nonce": 0,
+            "chainId": 1,
+        }
+    )
+
+
+def run_with_endpoints(test, *endpoints, **provider_kwargs):
+    async def main():
+        for endpoint in endpoints:
+            await endpoint.start()
+        provider = MultiEndpointProvider(
+            [endpoint.url for endpoint in endpoints], **provider_kwargs
+        )
+        try:
+            await test(provider, endpoints)
+        finally:
+            await provider.close()
+            for endpoint in endpoints:
+                await endpoint.stop()
+
+    asyncio.run(main())
+
+
+def test_raw_transaction_already_known_after_a_timeout_counts_as_sent():
+    signed = signed_transaction()
+
+    async def test(provider, endpoints):
+        stalled, backup = endpoints
+        response = await provider.make_request(
+            "eth_sendRawTransaction", [Web3.to_hex(signed.rawTransaction)]
+        )
+        # the stalled endpoint got it before timing out, and passed it on
+        assert len(stalled.requests) == len(backup.requests) == 1
+        assert "error" not in response
+        assert response["result"] == Web3.to_hex(signed.hash)
+
+    run_with_endpoints(
+        test,
+        Endpoint(delay=1),
+        Endpoint(error={"code": -32000, "message": "already known"}),
+        timeout=0.2,
+    )
+
+
+def test_other_raw_transaction_errors_are_returned():
+    signed = signed_transaction()
+
+    async def test(provider, endpoints):
+        response = await provider.make_request(
+            "eth_sendRawTransaction", [Web3.to_hex(signed.rawTransaction)]
+        )
+        assert response["error"]["message"] == "nonce too low"
+
+    run_with_endpoints(
+        test, Endpoint(error={"code": -32000, "message": "nonce too low"})
+    )
@@ -0,0 +1,209 @@
+import asyncio
+
+import pytest
+from fake_chain import make_chain
+
+from minty_py.tx_manager import MIN_FEE_BUMP, SendError, TransactionManager
+
+
+async def make_tx_manager(**kwargs):
+    w3, private_key, deploy_info = await make_chain()
+    contract = w3.eth.contract(
+        address=deploy_info["contract_address"], abi=deploy_info["abi"]
+    )
+    account = w3.eth.account.from_key(private_key)
+    tx_manager = TransactionManager(w3, account, poll_interval=0.01, **kwargs)
+    return w3, contract, tx_manager
+
+
+def mint(contract, tx_manager, uri="ipfs://token.json"):
+    return contract.functions.mintToken(tx_manager.account.address, uri)
+
+
+def test_replaces_unmined_transactions_with_higher_fees():
+    async def main():
+        w3, contract, tx_manager = await make_tx_manager(replace_after=0.05)
+        # the chain holds on to what it's sent, so nothing gets mined
+        w3.provider.ethereum_tester.disable_auto_mine_transactions()
+        signed = []
+
+        async def on_signed(transaction, tx_hash):
+            signed.append((transaction, tx_hash))
+
+        try:
+            pending = await tx_manager.send(mint(contract, tx_manager), on_signed)
+            wait = asyncio.create_task(tx_manager.wait(pending))
+            while tx_manager.replacements < 2:
+                await asyncio.sleep(0.01)
+            wait.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await wait
+
+            sent = [transaction for transaction, _ in signed]
+            tx_hashes = [tx_hash.hex() for tx_hash in pending.tx_hashes]
+            assert tx_hashes == [tx_hash for _, tx_hash in signed][: len(tx_hashes)]
+            assert len(set(tx_hashes)) == len(tx_hashes) > 2
+            for before, after in zip(sent, sent[1:]):
+                assert after["nonce"] == before["nonce"]
+                for key in ("maxFeePerGas", "maxPriorityFeePerGas"):
+                    assert after[key] >= before[key] * (1 + MIN_FEE_BUMP)
+            # its slot is freed even though it was never mined
+            assert tx_manager.pending == 0
+        finally:
+            await tx_manager.close()
+
+    asyncio.run(main())
+
+
+def test_replacing_keeps_legacy_fees_legacy():
+    async def main():
+        w3, contract, tx_manager = await make_tx_manager()
+        w3.provider.ethereum_tester.disable_auto_mine_transactions()
+        try:
+            transaction = await tx_manager.build(mint(contract, tx_manager))
+            for key in ("maxFeePerGas", "maxPriorityFeePerGas"):
+                del transaction[key]
+            transaction["gasPrice"] = 10**9
+            tx_hash = await tx_manager._sign_and_send(transaction)
+            await tx_manager.nonces.sent(transaction["nonce"])
+            pending = tx_manager._pendings([transaction], [tx_hash], [None])[0]
+
+            await tx_manager._replace(pending)
+            assert pending.tx_hashes[0] == tx_hash and len(pending.tx_hashes) == 2
+            assert "maxFeePerGas" not in pending.transaction
+            assert pending.transaction["gasPrice"] >= 10**9 * (1 + MIN_FEE_BUMP)
+        finally:
+            await tx_manager.close()
+
+    asyncio.run(main())
+
+
+def test_resumes_transactions_sent_before_a_restart():
+    async def main():
+        w3, contract, tx_manager = await make_tx_manager()
+        tester = w3.provider.ethereum_tester
+        try:
+            # sent, but not mined yet
+            tester.disable_auto_mine_transactions()
+            unmined = await tx_manager.send(mint(contract, tx_manager))
+            # signed and journaled, but the node never got it
+            dropped = await tx_manager.build(mint(contract, tx_manager))
+            dropped_hash = tx_manager.account.sign_transaction(dropped).hash
+
+            restarted = TransactionManager(
+                w3, tx_manager.account, receipts=tx_manager.receipts
+            )
+            resumed = await restarted.resume(unmined.transaction, unmined.tx_hashes)
+            # the chain only takes a nonce once the one before it was mined
+            tester.enable_auto_mine_transactions()
+            tester.mine_blocks(1)
+            receipts = await asyncio.gather(
+                restarted.wait(resumed),
+                restarted.wait(
+                    await restarted.resume(dropped, [dropped_hash.hex()])
+                ),
+            )
+            assert [receipt["status"] for receipt in receipts] == [1, 1]
+            assert receipts[1]["transactionHash"] == dropped_hash
+
+            # the nonces after the resumed ones are read back from the node
+            pending = await restarted.send(mint(contract, restarted))
+            assert pending.nonce == dropped["nonce"] + 1
+            assert (await restarted.wait(pending))["status"] == 1
+        finally:
+            await tx_manager.close()
+
+    asyncio.run(main())
+
+
+def test_send_many_raises_send_error_with_the_ones_sent():
+    async def main():
+        w3, contract, tx_manager = await make_tx_manager(max_pending=4)
+        signed = []
+
+        async def fail_third(transaction, tx_hash):
+            if len(signed) == 2:
+                raise Exception("journal is full")
+            signed.append(transaction["nonce"])
+
+        try:
+            with pytest.raises(SendError) as raised:
+                await tx_manager.send_many(
+                    [mint(contract, tx_manager, f"ipfs://{n}") for n in range(4)],
+                    [fail_third] * 4,
+                )
+            pendings = raised.value.pendings
+            sent = [pending for pending in pendings if pending is not None]
+            assert [pending.nonce for pending in sent] == signed
+            assert len(sent) == 2
+            # only the ones sent hold a slot
+            assert tx_manager.pending == 2
+            for pending in sent:
+                assert (await tx_manager.wait(pending))["status"] == 1
+            assert tx_manager.pending == 0
+
+            # the nonces that weren't used are handed out again, leaving no gap
+            pending = await tx_manager.send(mint(contract, tx_manager))
+            assert pending.nonce == max(signed) + 1
+            assert (await tx_manager.wait(pending))["status"] == 1
+
+            # nothing is sent if one fails to build, e.g. because it reverts
+            with pytest.raises(Exception) as raised:
+                await tx_manager.send_many(
+                    [
+                        mint(contract, tx_manager),
+                        contract.functions.mintToken(contract.address, "ipfs://"),
+                    ]
+                )
+            assert not isinstance(raised.value, SendError)
+            assert tx_manager.pending == 0
+            pending = await tx_manager.send(mint(contract, tx_manager))
+            assert pending.nonce == max(signed) + 2
+        finally:
+            await tx_manager.close()
+
+    asyncio.run(main())
+
+
+def test_failed_send_does_not_reuse_a_nonce_in_flight():
+    async def main():
+        w3, contract, tx_manager = await make_tx_manager()
+        signing, release = asyncio.Event(), asyncio.Event()
+
+        async def hold(transaction, tx_hash):
+            signing.set()
+            await release.wait()
+
+        async def fail(transaction, tx_hash):
+            raise Exception("journal is full")
+
+        try:
+            # holds its nonce, signed but not sent yet, while another send fails
+            held = asyncio.create_task(
+                tx_manager.send(mint(contract, tx_manager), hold)
+            )
+            await signing.wait()
+            with pytest.raises(Exception, match="journal is full"):
+                await tx_manager.send(mint(contract, tx_manager), fail)
+
+            async def send_after_held(transaction, tx_hash):
+                release.set()
+                await held
+
+            pending = await tx_manager.send(mint(contract, tx_manager), send_after_held)
+            held = await held
+            assert held.nonce != pending.nonce
+            assert pending.nonce == held.nonce + 1
+            receipts = await asyncio.gather(
+                tx_manager.wait(held), tx_manager.wait(pending)
+            )
+            assert [receipt["status"] for receipt in receipts] == [1, 1]
+
+            # with nothing in flight, the next nonce is read back from the node
+            assert tx_manager.nonces._next_nonce is None
+            pending = await tx_manager.send(mint(contract, tx_manager))
+            assert pending.nonce == held.nonce + 2
+        finally:
+            await tx_manager.close()
+
+    asyncio.run(main())
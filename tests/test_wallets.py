@@ -0,0 +1,117 @@
+import asyncio
+
+import pytest
+from fake_chain import make_chain
+
+from minty_py.tx_manager import TransactionManager
+from minty_py.wallets import WalletPool
+
+
+async def make_pool(*balances, **kwargs):
+    """
+    Returns (contract, WalletPool) for the chain's minter, then an account funded
+    with each of balances wei, every account taking at most 2 pending.
+    """
+    w3, private_key, deploy_info = await make_chain()
+    contract = w3.eth.contract(
+        address=deploy_info["contract_address"], abi=deploy_info["abi"]
+    )
+    funder = (await w3.eth.accounts)[0]
+    accounts = [w3.eth.account.from_key(private_key)]
+    for i, balance in enumerate(balances):
+        account = w3.eth.account.from_key("0x" + f"{0x30 + i:02x}" * 32)
+        if balance:
+            tx_hash = await w3.eth.send_transaction(
+                {"from": funder, "to": account.address, "value": balance}
+            )
+            await w3.eth.wait_for_transaction_receipt(tx_hash)
+        accounts.append(account)
+    tx_managers = [
+        TransactionManager(w3, account, max_pending=2, poll_interval=0.01)
+        for account in accounts
+    ]
+    return contract, WalletPool(tx_managers, **kwargs)
+
+
+def mint(contract, pool, uri="ipfs://token.json"):
+    return contract.functions.mintToken(pool.addresses[0], uri)
+
+
+def test_capacity_counts_the_free_slots_funded_accounts_can_pay_for():
+    async def main():
+        contract, pool = await make_pool(10**21, 0)
+        minter, funded, unfunded = pool.tx_managers
+        try:
+            # the unfunded account's slots don't count
+            assert await pool.capacity() == 4
+            pending = await pool.send(mint(contract, pool))
+            assert pool.tx_manager_for(pending.sender) is minter
+            assert await pool.capacity() == 3
+            assert (await pool.wait(pending))["status"] == 1
+            assert await pool.capacity() == 4
+
+            # only as many as an account can pay for count
+            balances = await pool.balances()
+            pool.min_balance = pool._available(funded, balances) - pool._cost
+            assert await pool.capacity() == 1
+
+            pool.min_balance = balances[funded.account.address]
+            with pytest.raises(Exception, match="None of the minter accounts"):
+                await pool.capacity()
+        finally:
+            await pool.close()
+
+    asyncio.run(main())
+
+
+def test_assign_fills_free_slots_first():
+    async def main():
+        contract, pool = await make_pool(10**21, 0)
+        minter, funded, unfunded = pool.tx_managers
+        try:
+            await pool.send(mint(contract, pool))
+            balances = await pool.balances()
+            # the minter has one pending, so the other funded account takes the
+            # first two, and the unfunded account none
+            assert pool._assign(3, 0, balances) == [funded, funded, minter]
+            # no account is given more than its max_pending
+            with pytest.raises(Exception, match="only pay for 4 of 5"):
+                pool._assign(5, 0, balances)
+        finally:
+            await pool.close()
+
+    asyncio.run(main())
+
+
+def test_nothing_is_sent_when_no_account_is_funded():
+    async def main():
+        contract, pool = await make_pool(0, min_balance=10**22)
+        try:
+            with pytest.raises(Exception, match="None of the minter accounts"):
+                await pool.send_many([mint(contract, pool), mint(contract, pool)])
+            for tx_manager in pool.tx_managers:
+                assert tx_manager.pending == 0
+                assert tx_manager.nonces._next_nonce is None
+        finally:
+            await pool.close()
+
+    asyncio.run(main())
+
+
+def test_waits_for_transactions_sent_already_signed():
+    async def main():
+        contract, pool = await make_pool(10**21)
+        funded = pool.tx_managers[1]
+        try:
+            transaction = await funded.build(mint(contract, pool))
+            signed = funded.account.sign_transaction(transaction)
+            pending = await funded.send_signed(
+                signed.rawTransaction, transaction["nonce"]
+            )
+            await funded.nonces.sent(transaction["nonce"])
+            assert pending.transaction is None
+            assert (await pool.wait(pending))["status"] == 1
+        finally:
+            await pool.close()
+
+    asyncio.run(main())